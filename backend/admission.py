@@ -0,0 +1,379 @@
+import asyncio
+import json
+import logging
+import math
+import os
+import time
+from collections import Counter, OrderedDict
+from datetime import datetime
+from typing import Optional
+
+from pymongo import UpdateOne
+
+from config import env_flag
+from metrics import admission_decisions, admission_queue_wait
+from scheduler import PRIORITY_BATCH, PRIORITY_INTERACTIVE, FairScheduler, request_class, reset_request_class, set_request_class
+
+
+logger = logging.getLogger(__name__)
+
+# Token buckets: sustained requests per second and burst size. The per-address limit is off by default:
+# behind a proxy every client shares the proxy's address unless RATE_LIMIT_TRUST_PROXY is set too
+RATE_LIMIT_ENABLED = env_flag('RATE_LIMIT_ENABLED', False)
+# The per-session limit keys on the sessionId, which a proxy does not hide, so it stays on
+RATE_LIMIT_SESSION_ENABLED = env_flag('RATE_LIMIT_SESSION_ENABLED', True)
+RATE_LIMIT_IP_RATE = float(os.environ.get('RATE_LIMIT_IP_RATE', '5'))
+RATE_LIMIT_IP_BURST = float(os.environ.get('RATE_LIMIT_IP_BURST', '30'))
+RATE_LIMIT_SESSION_RATE = float(os.environ.get('RATE_LIMIT_SESSION_RATE', '1'))
+RATE_LIMIT_SESSION_BURST = float(os.environ.get('RATE_LIMIT_SESSION_BURST', '5'))
+RATE_LIMIT_MAX_KEYS = int(os.environ.get('RATE_LIMIT_MAX_KEYS', '100000'))
+# Take the client address from X-Forwarded-For; only enable behind a proxy that sets it
+RATE_LIMIT_TRUST_PROXY = env_flag('RATE_LIMIT_TRUST_PROXY', False)
+# Share bucket usage between workers through MongoDB
+RATE_LIMIT_MONGO = env_flag('RATE_LIMIT_MONGO', False)
+RATE_LIMIT_SYNC_INTERVAL = float(os.environ.get('RATE_LIMIT_SYNC_INTERVAL', '0.5'))
+
+# Concurrent chats per worker, and how many more may wait for a slot and for how long
+CHAT_MAX_CONCURRENCY = int(os.environ.get('CHAT_MAX_CONCURRENCY', '64'))
+CHAT_QUEUE_SIZE = int(os.environ.get('CHAT_QUEUE_SIZE', '128'))
+CHAT_QUEUE_TIMEOUT = float(os.environ.get('CHAT_QUEUE_TIMEOUT', '5'))
+# Fraction of the queue one client address may hold; behind a proxy this needs RATE_LIMIT_TRUST_PROXY
+CHAT_QUEUE_CLIENT_SHARE = float(os.environ.get('CHAT_QUEUE_CLIENT_SHARE', '0.25'))
+# Fraction of the queue batch requests may never take, so interactive chats can always wait for a slot
+CHAT_QUEUE_INTERACTIVE_RESERVE = float(os.environ.get('CHAT_QUEUE_INTERACTIVE_RESERVE', '0.25'))
+
+
+class Rejected(Exception):
+    """Raised when a request is shed by a rate limit or the concurrency cap."""
+
+    def __init__(self, reason: str, retry_after: float):
+        super().__init__(f"{reason}, retry in {retry_after:.1f}s")
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class TokenBuckets:
+    """Per-key token buckets, refilled lazily on access.
+
+    Buckets live in an LRU bounded by `max_keys`; dropping the least
+    recently used one is harmless because an idle bucket refills to a full
+    one anyway. `debit()` lets usage observed on other workers drain the
+    local bucket, which may go negative until it refills.
+    """
+
+    def __init__(self, rate: float, burst: float, max_keys: int = RATE_LIMIT_MAX_KEYS):
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+
+    def take(self, key: str) -> float:
+        """Consume one token; returns 0 when allowed, else seconds until one is available."""
+        tokens = self._refill(key)
+        if tokens >= 1:
+            self._buckets[key][0] = tokens - 1
+            return 0.0
+        return (1 - tokens) / self.rate
+
+    def debit(self, key: str, amount: float):
+        if amount > 0:
+            self._buckets[key][0] = self._refill(key) - amount
+
+    def __len__(self):
+        return len(self._buckets)
+
+    def _refill(self, key: str) -> float:
+        now = time.monotonic()
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = [self.burst, now]
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+            bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+        return bucket[0]
+
+
+class SharedUsage:
+    """Mirrors token consumption between workers through MongoDB.
+
+    Requests are admitted from the local buckets without a round-trip.
+    Every `interval` seconds the tokens taken locally are added to a
+    per-key counter with one bulk write, and whatever other workers took
+    since the previous sync is debited from the local bucket. Workers can
+    therefore overshoot a shared limit by at most one interval's worth.
+
+    Counters are read back for every key this worker used recently, not
+    only those it used in the last interval, so remote usage is debited
+    as it happens rather than all at once when the key is next used
+    here. A key idle for longer than its bucket takes to refill is
+    dropped from tracking, and no single debit exceeds the burst.
+    """
+
+    def __init__(self, collection, buckets: dict, interval: float = RATE_LIMIT_SYNC_INTERVAL):
+        self.collection = collection
+        self.buckets = buckets
+        self.interval = interval
+        self._pending = {}
+        # _id -> [counter value at the last sync, monotonic time this worker last used the key]
+        self._seen = OrderedDict()
+        self._task = None
+        self.stats = {"syncs": 0, "sync_errors": 0, "remote_debits": 0}
+
+    async def ensure_indexes(self):
+        # Counters of keys nobody has used for a day are dropped
+        await self.collection.create_index("updated_at", expireAfterSeconds=86400)
+
+    async def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.sync()
+
+    def record(self, scope: str, key: str):
+        pending_key = (scope, key)
+        self._pending[pending_key] = self._pending.get(pending_key, 0) + 1
+
+    async def sync(self):
+        now = time.monotonic()
+        self._forget_idle(now)
+        if not self._pending and not self._seen:
+            return
+        pending, self._pending = self._pending, {}
+        ids = {_id: (*_id.split(":", 1), 0) for _id in self._seen}
+        ids.update({f"{scope}:{key}": (scope, key, count) for (scope, key), count in pending.items()})
+        updated_at = datetime.utcnow()
+        try:
+            if pending:
+                await self.collection.bulk_write(
+                    [UpdateOne({"_id": _id}, {"$inc": {"used": count}, "$set": {"updated_at": updated_at}}, upsert=True)
+                     for _id, (_, _, count) in ids.items() if count],
+                    ordered=False,
+                )
+            totals = await self.collection.find({"_id": {"$in": list(ids)}}).to_list(len(ids))
+        except Exception as e:
+            # Keep the local counts and try again next interval
+            for (scope, key), count in pending.items():
+                self._pending[(scope, key)] = self._pending.get((scope, key), 0) + count
+            self.stats["sync_errors"] += 1
+            logger.error(f"Rate limit sync failed: {e}")
+            return
+
+        self.stats["syncs"] += 1
+        for doc in totals:
+            scope, key, count = ids[doc["_id"]]
+            seen = self._seen.get(doc["_id"])
+            if seen is None:
+                self._seen[doc["_id"]] = [doc["used"], now]
+                continue
+            remote = doc["used"] - seen[0] - count
+            seen[0] = doc["used"]
+            if count:
+                seen[1] = now
+                self._seen.move_to_end(doc["_id"])
+            if remote > 0:
+                bucket = self.buckets[scope]
+                bucket.debit(key, min(remote, bucket.burst))
+                self.stats["remote_debits"] += remote
+        while len(self._seen) > RATE_LIMIT_MAX_KEYS:
+            self._seen.popitem(last=False)
+
+    def _forget_idle(self, now: float):
+        # Remote usage older than a full refill no longer matters to the local bucket
+        for _id, (_, last_used) in list(self._seen.items()):
+            bucket = self.buckets[_id.split(":", 1)[0]]
+            if now - last_used > bucket.burst / bucket.rate:
+                del self._seen[_id]
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.sync()
+
+
+class ConcurrencyLimiter:
+    """Caps concurrent work and lets a bounded queue wait for a slot.
+
+    Slots are handed out by a FairScheduler, so queued interactive chats
+    go ahead of batch work. The queue itself is bounded per client and
+    per class: one client may hold at most `client_share` of it and batch
+    requests never take the `interactive_reserve` share, so neither a
+    single busy client nor a batch backlog gets everyone else rejected.
+    Requests beyond those bounds, and queued requests that do not get a
+    slot within `queue_timeout`, are rejected rather than piling up behind
+    slow upstream calls.
+    """
+
+    def __init__(self, max_concurrent: int = CHAT_MAX_CONCURRENCY, max_queue: int = CHAT_QUEUE_SIZE,
+                 queue_timeout: float = CHAT_QUEUE_TIMEOUT, client_share: float = CHAT_QUEUE_CLIENT_SHARE,
+                 interactive_reserve: float = CHAT_QUEUE_INTERACTIVE_RESERVE):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.client_limit = max(1, math.ceil(max_queue * client_share))
+        self.batch_limit = max_queue - math.ceil(max_queue * interactive_reserve)
+        self.scheduler = FairScheduler(max_concurrent, "admission")
+        # Counted here rather than from the scheduler's queues, which a waiter only joins once it first runs
+        self.waiting = {priority: Counter() for priority in (PRIORITY_INTERACTIVE, PRIORITY_BATCH)}
+
+    async def acquire(self) -> str:
+        """Wait for a slot for the current request class; returns the class to pass to release()."""
+        if self.scheduler.has_room():
+            return await self.scheduler.acquire()
+        priority, client = request_class()
+        waiting = self.waiting[priority]
+        if self.queued >= self.max_queue:
+            raise Rejected("Too many concurrent requests", 1.0)
+        if priority == PRIORITY_BATCH and sum(waiting.values()) >= self.batch_limit:
+            raise Rejected("Too many queued batch requests", 1.0)
+        if waiting[client] >= self.client_limit:
+            raise Rejected("Too many queued requests from this client", 1.0)
+
+        waiting[client] += 1
+        started = time.perf_counter()
+        try:
+            return await asyncio.wait_for(self.scheduler.acquire(), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            raise Rejected("Timed out waiting for a free slot", 1.0)
+        finally:
+            admission_queue_wait.observe(time.perf_counter() - started)
+            waiting[client] -= 1
+            if not waiting[client]:
+                del waiting[client]
+
+    def release(self, priority: str):
+        self.scheduler.release(priority)
+
+    @property
+    def active(self) -> int:
+        return sum(self.scheduler.active.values())
+
+    @property
+    def queued(self) -> int:
+        return sum(sum(waiting.values()) for waiting in self.waiting.values())
+
+
+class AdmissionController:
+    """Rate limits per client address and per session, plus the concurrency cap."""
+
+    def __init__(self, enabled: bool = RATE_LIMIT_ENABLED, trust_proxy: bool = RATE_LIMIT_TRUST_PROXY,
+                 session_enabled: bool = RATE_LIMIT_SESSION_ENABLED):
+        self.enabled = {"ip": enabled, "session": session_enabled}
+        self.trust_proxy = trust_proxy
+        self.buckets = {
+            "ip": TokenBuckets(RATE_LIMIT_IP_RATE, RATE_LIMIT_IP_BURST),
+            "session": TokenBuckets(RATE_LIMIT_SESSION_RATE, RATE_LIMIT_SESSION_BURST),
+        }
+        self.concurrency = ConcurrencyLimiter()
+        self.shared = None
+
+    def share_through(self, collection):
+        """Sync bucket usage with other workers through `collection`."""
+        self.shared = SharedUsage(collection, self.buckets)
+
+    def client_address(self, scope) -> str:
+        if self.trust_proxy:
+            for name, value in scope.get("headers", []):
+                if name == b"x-forwarded-for":
+                    return value.decode("latin-1").split(",")[0].strip()
+        client = scope.get("client")
+        return client[0] if client else "unknown"
+
+    def check(self, limit: str, key: Optional[str]):
+        """Take a token from the `limit` bucket for `key`; raises Rejected when it is empty."""
+        if not self.enabled[limit] or not key:
+            return
+        retry_after = self.buckets[limit].take(key)
+        if retry_after:
+            admission_decisions.inc(f"{limit}_limited")
+            raise Rejected(f"Rate limit exceeded for this {'client' if limit == 'ip' else 'session'}", retry_after)
+        if self.shared is not None:
+            self.shared.record(limit, key)
+
+    async def acquire_slot(self) -> str:
+        try:
+            priority = await self.concurrency.acquire()
+        except Rejected:
+            admission_decisions.inc("overloaded")
+            raise
+        admission_decisions.inc("admitted")
+        return priority
+
+    def metrics(self) -> dict:
+        metrics = {
+            "active": self.concurrency.active,
+            "queued": self.concurrency.queued,
+            "max_concurrent": self.concurrency.max_concurrent,
+            "max_queue": self.concurrency.max_queue,
+            "max_queue_per_client": self.concurrency.client_limit,
+            "max_queue_batch": self.concurrency.batch_limit,
+            "ip_buckets": len(self.buckets["ip"]),
+            "session_buckets": len(self.buckets["session"]),
+            "shared": self.shared is not None,
+        }
+        metrics.update(self.concurrency.scheduler.metrics())
+        if self.shared is not None:
+            metrics.update(self.shared.stats)
+        return metrics
+
+
+def rejection_headers(retry_after: float) -> dict:
+    return {"Retry-After": str(max(1, math.ceil(retry_after)))}
+
+
+class AdmissionMiddleware:
+    """ASGI middleware applying the per-address limit and concurrency cap to `paths`.
+
+    Runs around the whole response, so a streamed reply keeps its slot until
+    the last chunk is sent, and rejects before anything has been sent.
+    Requests to `batch_paths`, or sent with `X-Priority: batch`, are
+    scheduled as batch work here and for their Agentspace calls; callers
+    can lower their priority this way but not raise it.
+    """
+
+    def __init__(self, app, controller: AdmissionController, paths, batch_paths=()):
+        self.app = app
+        self.controller = controller
+        self.paths = set(paths)
+        self.batch_paths = set(batch_paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST" or scope["path"] not in self.paths:
+            return await self.app(scope, receive, send)
+
+        address = self.controller.client_address(scope)
+        batch = scope["path"] in self.batch_paths or any(
+            name == b"x-priority" and value.strip().lower() == PRIORITY_BATCH.encode("ascii")
+            for name, value in scope.get("headers", [])
+        )
+        request_class_token = set_request_class(PRIORITY_BATCH if batch else PRIORITY_INTERACTIVE, address)
+        try:
+            try:
+                self.controller.check("ip", address)
+                priority = await self.controller.acquire_slot()
+            except Rejected as e:
+                return await self._reject(send, e)
+            try:
+                await self.app(scope, receive, send)
+            finally:
+                self.controller.concurrency.release(priority)
+        finally:
+            reset_request_class(request_class_token)
+
+    async def _reject(self, send, error: Rejected):
+        body = json.dumps({"detail": error.reason}).encode("utf-8")
+        headers = [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode("ascii"))]
+        headers += [(name.lower().encode("latin-1"), value.encode("latin-1"))
+                    for name, value in rejection_headers(error.retry_after).items()]
+        await send({"type": "http.response.start", "status": 429, "headers": headers})
+        await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,377 @@
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime
+from types import SimpleNamespace
+
+from config import env_flag
+from metrics import agentspace_calls, agentspace_resilience_events, agentspace_stage_duration
+from resilience import CircuitBreaker, CircuitOpen, LatencyTracker, RetryBudget, backoff_delay, first_completed
+from scheduler import FairScheduler, request_class
+from tracing import KIND_CLIENT, set_attribute, tracer
+
+
+logger = logging.getLogger(__name__)
+
+# Agentspace call settings
+# AGENTSPACE_ENDPOINT points the client at a plaintext gRPC stand-in (e.g. "localhost:50051")
+AGENTSPACE_ENDPOINT = os.environ.get('AGENTSPACE_ENDPOINT')
+AGENTSPACE_MAX_CONCURRENCY = int(os.environ.get('AGENTSPACE_MAX_CONCURRENCY', '64'))
+AGENTSPACE_TIMEOUT = float(os.environ.get('AGENTSPACE_TIMEOUT', '30'))
+
+# Resilience settings; retries and hedges only apply to new-session calls
+AGENTSPACE_MAX_RETRIES = int(os.environ.get('AGENTSPACE_MAX_RETRIES', '2'))
+AGENTSPACE_RETRY_BASE = float(os.environ.get('AGENTSPACE_RETRY_BASE', '0.1'))
+AGENTSPACE_RETRY_CAP = float(os.environ.get('AGENTSPACE_RETRY_CAP', '2'))
+AGENTSPACE_RETRY_BUDGET_RATIO = float(os.environ.get('AGENTSPACE_RETRY_BUDGET_RATIO', '0.2'))
+AGENTSPACE_HEDGE = env_flag('AGENTSPACE_HEDGE', False)
+AGENTSPACE_HEDGE_MIN_SAMPLES = int(os.environ.get('AGENTSPACE_HEDGE_MIN_SAMPLES', '50'))
+AGENTSPACE_BREAKER_FAILURES = int(os.environ.get('AGENTSPACE_BREAKER_FAILURES', '5'))
+AGENTSPACE_BREAKER_COOLDOWN = float(os.environ.get('AGENTSPACE_BREAKER_COOLDOWN', '30'))
+
+# Pool settings
+AGENTSPACE_CHANNELS = int(os.environ.get('AGENTSPACE_CHANNELS', '4'))
+AGENTSPACE_KEEPALIVE_MS = int(os.environ.get('AGENTSPACE_KEEPALIVE_MS', '30000'))
+AGENTSPACE_TOKEN_REFRESH_MARGIN = float(os.environ.get('AGENTSPACE_TOKEN_REFRESH_MARGIN', '300'))
+# Load the client stack and open channels during startup rather than on the first chat
+AGENTSPACE_PREWARM = env_flag('AGENTSPACE_PREWARM', True)
+
+AGENTSPACE_HOST = "discoveryengine.googleapis.com"
+RPC_ATTRIBUTES = {
+    "rpc.system": "grpc",
+    "rpc.service": "google.cloud.discoveryengine.v1beta.ConversationalSearchService",
+    "rpc.method": "ConverseConversation",
+}
+CLOUD_PLATFORM_SCOPE = "https://www.googleapis.com/auth/cloud-platform"
+
+CHANNEL_OPTIONS = [
+    ("grpc.keepalive_time_ms", AGENTSPACE_KEEPALIVE_MS),
+    ("grpc.keepalive_timeout_ms", 10000),
+    ("grpc.keepalive_permit_without_calls", 1),
+    ("grpc.http2.max_pings_without_data", 0),
+    ("grpc.max_send_message_length", -1),
+    ("grpc.max_receive_message_length", -1),
+]
+
+# Caps the number of in-flight upstream calls per worker; interactive chats
+# go ahead of batch work and clients share the slots fairly
+scheduler = FairScheduler(AGENTSPACE_MAX_CONCURRENCY, "agentspace")
+
+# Discovery Engine client stack, imported on first use by load_stack()
+_stack = None
+_stack_import_seconds = 0.0
+
+
+def load_stack() -> SimpleNamespace:
+    """Import the Discovery Engine client, gRPC and google-auth modules once.
+
+    Together they account for most of the backend's import time, so they
+    are loaded when the pool starts or the first request is built instead
+    of when this module is imported. Blocking; call it off the event loop
+    (see load_stack_async) unless it has already run.
+    """
+    global _stack, _stack_import_seconds
+    if _stack is not None:
+        return _stack
+
+    started = time.perf_counter()
+    import google.auth
+    import grpc
+    from google.api_core import exceptions as core_exceptions
+    from google.auth.transport.requests import Request as AuthRequest
+    from google.cloud import discoveryengine_v1beta as discoveryengine
+    from google.cloud.discoveryengine_v1beta.services.conversational_search_service.transports import (
+        ConversationalSearchServiceGrpcAsyncIOTransport,
+    )
+
+    stack = SimpleNamespace(
+        google_auth=google.auth,
+        grpc=grpc,
+        AuthRequest=AuthRequest,
+        discoveryengine=discoveryengine,
+        Transport=ConversationalSearchServiceGrpcAsyncIOTransport,
+        DeadlineExceeded=core_exceptions.DeadlineExceeded,
+        # Upstream errors worth retrying (and counted by the circuit breaker)
+        retryable_errors=(
+            core_exceptions.ServiceUnavailable,
+            core_exceptions.InternalServerError,
+            core_exceptions.Aborted,
+        ),
+    )
+    _stack_import_seconds = time.perf_counter() - started
+    _stack = stack
+    logger.info(f"Loaded Agentspace client stack in {_stack_import_seconds:.2f}s")
+    return stack
+
+
+async def load_stack_async() -> SimpleNamespace:
+    if _stack is not None:
+        return _stack
+    return await asyncio.to_thread(load_stack)
+
+
+async def conversation_request(conversation_name: str, text: str):
+    """ConverseConversationRequest sending `text` to `conversation_name`."""
+    discoveryengine = (await load_stack_async()).discoveryengine
+    return discoveryengine.ConverseConversationRequest(
+        name=conversation_name,
+        query=discoveryengine.TextInput(input=text),
+    )
+
+
+class AgentspaceTimeout(Exception):
+    """Raised when an Agentspace call does not finish within its deadline."""
+
+
+class AgentspaceBusy(Exception):
+    """Raised when no local Agentspace slot frees up before the deadline.
+
+    Upstream was never called, so this says nothing about its health and
+    does not count against the circuit breaker or the retry budget.
+    """
+
+
+class AgentspacePool:
+    """Process-wide set of Agentspace clients sharing one set of credentials.
+
+    Credentials are loaded once and refreshed ahead of expiry in the
+    background, so requests never pay for token fetches or channel setup.
+    """
+
+    def __init__(self, size: int = AGENTSPACE_CHANNELS, endpoint: str = AGENTSPACE_ENDPOINT):
+        self.size = max(size, 1)
+        self.endpoint = endpoint
+        self._clients = []
+        self._next = 0
+        self._credentials = None
+        self._refresh_task = None
+        self._start_lock = asyncio.Lock()
+        self.stats = {
+            "clients_created": 0,
+            "startup_seconds": 0.0,
+            "acquisitions": 0,
+            "acquire_seconds": 0.0,
+            "token_refreshes": 0,
+            "token_refresh_errors": 0,
+        }
+
+    @property
+    def started(self) -> bool:
+        return bool(self._clients)
+
+    async def start(self):
+        async with self._start_lock:
+            if self.started:
+                return
+            with tracer.span("agentspace.pool_start"):
+                with tracer.span("agentspace.load_stack"):
+                    await load_stack_async()
+                started = time.perf_counter()
+                if not self.endpoint:
+                    with tracer.span("agentspace.load_credentials"):
+                        self._credentials = await asyncio.to_thread(self._load_credentials)
+                self._clients = [self._create_client() for _ in range(self.size)]
+            self.stats["clients_created"] += self.size
+            self.stats["startup_seconds"] += time.perf_counter() - started
+            if self._credentials is not None:
+                self._refresh_task = asyncio.create_task(self._refresh_ahead())
+            logger.info(f"Agentspace pool started with {self.size} channel(s)")
+
+    async def close(self):
+        if self._refresh_task:
+            self._refresh_task.cancel()
+            self._refresh_task = None
+        clients, self._clients = self._clients, []
+        for agentspace_client in clients:
+            await agentspace_client.transport.close()
+
+    async def acquire(self):
+        """Return the next client in round-robin order, starting the pool if needed."""
+        started = time.perf_counter()
+        if not self.started:
+            await self.start()
+        agentspace_client = self._clients[self._next % len(self._clients)]
+        self._next += 1
+        self.stats["acquisitions"] += 1
+        self.stats["acquire_seconds"] += time.perf_counter() - started
+        return agentspace_client
+
+    def metrics(self) -> dict:
+        acquisitions = self.stats["acquisitions"]
+        token_expires_in = None
+        if self._credentials is not None and self._credentials.expiry:
+            token_expires_in = (self._credentials.expiry - datetime.utcnow()).total_seconds()
+        return {
+            "channels": len(self._clients),
+            "clients_created": self.stats["clients_created"],
+            "startup_seconds": self.stats["startup_seconds"],
+            "stack_loaded": _stack is not None,
+            "stack_import_seconds": _stack_import_seconds,
+            "acquisitions": acquisitions,
+            "avg_request_setup_ms": 1000 * self.stats["acquire_seconds"] / acquisitions if acquisitions else 0.0,
+            "token_refreshes": self.stats["token_refreshes"],
+            "token_refresh_errors": self.stats["token_refresh_errors"],
+            "token_expires_in_seconds": token_expires_in,
+        }
+
+    def _load_credentials(self):
+        stack = load_stack()
+        credentials, _ = stack.google_auth.default(scopes=[CLOUD_PLATFORM_SCOPE])
+        credentials.refresh(stack.AuthRequest())
+        return credentials
+
+    def _create_client(self):
+        stack = load_stack()
+        if self.endpoint:
+            channel = stack.grpc.aio.insecure_channel(self.endpoint, options=CHANNEL_OPTIONS)
+        else:
+            channel = stack.Transport.create_channel(
+                AGENTSPACE_HOST,
+                credentials=self._credentials,
+                options=CHANNEL_OPTIONS,
+            )
+        transport = stack.Transport(channel=channel)
+        return stack.discoveryengine.ConversationalSearchServiceAsyncClient(transport=transport)
+
+    async def _refresh_ahead(self):
+        # Refresh the shared token before it expires so the gRPC auth plugin
+        # always finds a valid one and never refreshes inline on a request.
+        while True:
+            expiry = self._credentials.expiry
+            if expiry is None:
+                delay = AGENTSPACE_TOKEN_REFRESH_MARGIN
+            else:
+                delay = (expiry - datetime.utcnow()).total_seconds() - AGENTSPACE_TOKEN_REFRESH_MARGIN
+            await asyncio.sleep(max(delay, 1))
+            try:
+                await asyncio.to_thread(self._credentials.refresh, load_stack().AuthRequest())
+                self.stats["token_refreshes"] += 1
+            except Exception as e:
+                self.stats["token_refresh_errors"] += 1
+                logger.warning(f"Agentspace token refresh failed: {e}")
+                await asyncio.sleep(10)
+
+
+pool = AgentspacePool()
+
+
+breaker = CircuitBreaker(AGENTSPACE_BREAKER_FAILURES, AGENTSPACE_BREAKER_COOLDOWN)
+retry_budget = RetryBudget(AGENTSPACE_RETRY_BUDGET_RATIO)
+latency_tracker = LatencyTracker(min_samples=AGENTSPACE_HEDGE_MIN_SAMPLES)
+
+
+@tracer.traced("agentspace.converse", KIND_CLIENT)
+async def converse(request, timeout=None, idempotent=False):
+    """Send a ConverseConversation request without blocking the event loop.
+
+    The deadline covers queueing, every attempt and the backoff between
+    them. Idempotent calls (new conversations) are retried on transient
+    errors within the retry budget and, with AGENTSPACE_HEDGE, hedged once
+    they run past the recent p95. Raises CircuitOpen without calling
+    upstream while the breaker is open.
+    """
+    timeout = AGENTSPACE_TIMEOUT if timeout is None else timeout
+    retryable_errors = (await load_stack_async()).retryable_errors
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    set_attribute("agentspace.idempotent", idempotent)
+
+    try:
+        breaker.before_call()
+    except CircuitOpen:
+        agentspace_resilience_events.inc("circuit_rejected")
+        raise
+    retry_budget.record_request()
+
+    attempt = 0
+    while True:
+        try:
+            response = await _attempt(request, deadline, hedge=idempotent and AGENTSPACE_HEDGE)
+        except retryable_errors + (AgentspaceTimeout,) as e:
+            set_attribute("agentspace.attempts", attempt + 1)
+            if idempotent and attempt < AGENTSPACE_MAX_RETRIES and not isinstance(e, AgentspaceTimeout):
+                delay = backoff_delay(attempt, AGENTSPACE_RETRY_BASE, AGENTSPACE_RETRY_CAP)
+                if delay >= deadline - loop.time():
+                    agentspace_resilience_events.inc("retry_skipped_deadline")
+                elif not retry_budget.try_withdraw():
+                    agentspace_resilience_events.inc("retry_budget_exhausted")
+                else:
+                    attempt += 1
+                    agentspace_resilience_events.inc("retry")
+                    logger.warning(f"Retrying Agentspace call in {delay:.2f}s after: {e}")
+                    await asyncio.sleep(delay)
+                    continue
+            breaker.record_failure()
+            raise
+        except BaseException:
+            # Client errors, local slot waits and cancellations say nothing about upstream health
+            breaker.release()
+            raise
+        breaker.record_success()
+        set_attribute("agentspace.attempts", attempt + 1)
+        return response
+
+
+def resilience_metrics() -> dict:
+    p95 = latency_tracker.p95()
+    return {
+        "breaker_open": breaker.state == "open",
+        "breaker_half_open": breaker.state == "half_open",
+        "breaker_consecutive_failures": breaker.failures,
+        "breaker_times_opened": breaker.times_opened,
+        "retry_budget_tokens": retry_budget.tokens,
+        "latency_p95_seconds": p95 if p95 is not None else 0.0,
+    }
+
+
+async def _attempt(request, deadline, hedge=False):
+    hedge_after = latency_tracker.p95() if hedge else None
+    if hedge_after is None:
+        return await _converse_once(request, deadline)
+
+    response, hedged, hedge_won = await first_completed(
+        _converse_once(request, deadline), lambda: _converse_once(request, deadline), hedge_after
+    )
+    set_attribute("agentspace.hedged", hedged)
+    if hedged:
+        agentspace_resilience_events.inc("hedge")
+    if hedge_won:
+        agentspace_resilience_events.inc("hedge_won")
+    return response
+
+
+async def _converse_once(request, deadline):
+    loop = asyncio.get_running_loop()
+    with tracer.span("agentspace.attempt") as span:
+        queued = time.perf_counter()
+        try:
+            priority = await asyncio.wait_for(scheduler.acquire(), max(deadline - loop.time(), 0))
+        except asyncio.TimeoutError:
+            agentspace_calls.inc("queue_timeout")
+            raise AgentspaceBusy("Timed out waiting for an Agentspace slot")
+        finally:
+            span.set_attribute("agentspace.queue_wait_ms", round(1000 * (time.perf_counter() - queued), 3))
+            span.set_attribute("agentspace.priority", request_class()[0])
+
+        outcome = "error"
+        try:
+            with agentspace_stage_duration.time("client_setup"), tracer.span("agentspace.acquire_client"):
+                agentspace_client = await pool.acquire()
+            remaining = max(deadline - loop.time(), 0.001)
+            started = time.perf_counter()
+            with agentspace_stage_duration.time("upstream_call"), tracer.span("agentspace.rpc", KIND_CLIENT, RPC_ATTRIBUTES):
+                response = await agentspace_client.converse_conversation(request=request, timeout=remaining)
+            latency_tracker.record(time.perf_counter() - started)
+            outcome = "success"
+            return response
+        except _stack.DeadlineExceeded:
+            outcome = "timeout"
+            raise AgentspaceTimeout("Agentspace call exceeded its deadline")
+        except asyncio.CancelledError:
+            outcome = "cancelled"
+            raise
+        finally:
+            span.set_attribute("agentspace.outcome", outcome)
+            agentspace_calls.inc(outcome)
+            scheduler.release(priority)
@@ -0,0 +1,337 @@
+import asyncio
+import hashlib
+import html
+import json
+import logging
+import os
+import re
+import tempfile
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import List, Optional
+
+from motor.motor_asyncio import AsyncIOMotorGridFSBucket
+
+from metrics import attachment_extract_duration, attachment_upload_bytes, attachment_upload_throughput
+
+try:
+    from python_multipart.multipart import MultipartParser, parse_options_header
+except ImportError:  # python-multipart < 0.0.13
+    from multipart.multipart import MultipartParser, parse_options_header
+
+try:
+    from pypdf import PdfReader
+except ImportError:  # optional: PDFs are stored but not extracted
+    PdfReader = None
+
+
+logger = logging.getLogger(__name__)
+
+# Upload limits
+ATTACHMENT_MAX_BYTES = int(os.environ.get('ATTACHMENT_MAX_BYTES', str(10 * 1024 * 1024)))
+ATTACHMENT_MAX_FILES = int(os.environ.get('ATTACHMENT_MAX_FILES', '5'))
+# GridFS chunk size, also the unit uploads are written in
+ATTACHMENT_CHUNK_SIZE = int(os.environ.get('ATTACHMENT_CHUNK_SIZE', str(255 * 1024)))
+# Threads extracting text; parsing never runs on the event loop
+ATTACHMENT_EXTRACT_WORKERS = int(os.environ.get('ATTACHMENT_EXTRACT_WORKERS', '2'))
+# Extracted text kept per attachment, and how much of it is sent along with a question
+ATTACHMENT_TEXT_MAX_CHARS = int(os.environ.get('ATTACHMENT_TEXT_MAX_CHARS', '100000'))
+ATTACHMENT_CONTEXT_CHARS = int(os.environ.get('ATTACHMENT_CONTEXT_CHARS', '8000'))
+
+TEXT_TYPES = ("text/", "application/json", "application/xml", "application/x-yaml")
+_tags = re.compile(r'<(script|style)\b.*?</\1>|<[^>]+>', re.S | re.I)
+_blank_lines = re.compile(r'\n\s*\n+')
+
+
+class UploadRejected(Exception):
+    """Raised for uploads that break a limit or are not multipart."""
+
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+class AttachmentNotFound(Exception):
+    """Raised when a chat references an attachment id that does not exist."""
+
+
+def extract_text(path: str, content_type: str, filename: str, max_chars: int) -> Optional[str]:
+    """Plain text from a stored upload, or None when the type is not supported.
+
+    Runs in the extraction thread pool and reads the file from disk, so
+    large uploads are never held in memory as a whole.
+    """
+    lowered = filename.lower()
+    if content_type == "application/pdf" or lowered.endswith(".pdf"):
+        if PdfReader is None:
+            return None
+        reader = PdfReader(path)
+        parts, length = [], 0
+        for page in reader.pages:
+            page_text = page.extract_text() or ""
+            parts.append(page_text)
+            length += len(page_text)
+            if length >= max_chars:
+                break
+        return "\n".join(parts)[:max_chars]
+
+    if not (content_type.startswith(TEXT_TYPES) or lowered.endswith((".txt", ".md", ".csv", ".json", ".html", ".htm"))):
+        return None
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        text = f.read(max_chars)
+    if content_type == "text/html" or lowered.endswith((".html", ".htm")):
+        text = _blank_lines.sub("\n\n", html.unescape(_tags.sub(" ", text)))
+    elif content_type == "application/json" or lowered.endswith(".json"):
+        try:
+            text = json.dumps(json.loads(text), indent=1, ensure_ascii=False)[:max_chars]
+        except ValueError:
+            pass
+    return text.strip()
+
+
+class _PartEvents:
+    """Collects python-multipart parser callbacks as events consumed after each feed."""
+
+    def __init__(self):
+        self.events = []
+        self._headers = {}
+        self._field = b""
+        self._value = b""
+
+    def callbacks(self) -> dict:
+        return {
+            "on_part_begin": self._part_begin,
+            "on_header_field": self._header_field,
+            "on_header_value": self._header_value,
+            "on_header_end": self._header_end,
+            "on_headers_finished": self._headers_finished,
+            "on_part_data": self._part_data,
+            "on_part_end": self._part_end,
+        }
+
+    def drain(self) -> list:
+        events, self.events = self.events, []
+        return events
+
+    def _part_begin(self):
+        self._headers = {}
+
+    def _header_field(self, data, start, end):
+        self._field += data[start:end]
+
+    def _header_value(self, data, start, end):
+        self._value += data[start:end]
+
+    def _header_end(self):
+        self._headers[self._field.lower()] = self._value
+        self._field, self._value = b"", b""
+
+    def _headers_finished(self):
+        self.events.append(("begin", self._headers))
+
+    def _part_data(self, data, start, end):
+        self.events.append(("data", bytes(data[start:end])))
+
+    def _part_end(self):
+        self.events.append(("end", None))
+
+
+class _FilePart:
+    """One file being streamed to GridFS and to a temporary file for extraction."""
+
+    def __init__(self, grid_in, filename: str, content_type: str):
+        self.grid_in = grid_in
+        self.filename = filename
+        self.content_type = content_type
+        self.size = 0
+        self.sha256 = hashlib.sha256()
+        self.spool = tempfile.NamedTemporaryFile(prefix="attachment-", delete=False)
+        self.pending = bytearray()
+
+    async def write(self, data: bytes):
+        self.size += len(data)
+        if self.size > ATTACHMENT_MAX_BYTES:
+            raise UploadRejected(413, f"{self.filename} is larger than {ATTACHMENT_MAX_BYTES} bytes")
+        self.sha256.update(data)
+        # Hand GridFS whole chunks so each write is one chunk insert
+        self.pending += data
+        if len(self.pending) >= ATTACHMENT_CHUNK_SIZE:
+            await self._write_chunk()
+
+    async def finish(self):
+        if self.pending:
+            await self._write_chunk()
+        await self.grid_in.close()
+        await asyncio.to_thread(self.spool.close)
+
+    async def _write_chunk(self):
+        chunk = bytes(self.pending)
+        self.pending.clear()
+        # Disk writes can stall on a busy volume; keep them off the event loop
+        await asyncio.to_thread(self.spool.write, chunk)
+        await self.grid_in.write(chunk)
+
+    async def discard(self):
+        self.spool.close()
+        os.unlink(self.spool.name)
+        try:
+            await self.grid_in.abort()
+        except Exception as e:
+            logger.error(f"Failed to abort upload of {self.filename}: {e}")
+
+
+class AttachmentStore:
+    """Uploaded files in GridFS (`attachments` bucket) plus extracted text in `attachment_meta`.
+
+    Uploads are parsed from the raw request stream and written to GridFS
+    chunk by chunk, with a copy spooled to a temporary file that the
+    extraction thread pool reads back; neither side holds a whole file in
+    memory. Chats reference attachments by id.
+    """
+
+    def __init__(self, db):
+        self.bucket = AsyncIOMotorGridFSBucket(db, bucket_name="attachments", chunk_size_bytes=ATTACHMENT_CHUNK_SIZE)
+        self.meta = db.attachment_meta
+        self._executor = None
+        self.stats = {"uploads": 0, "files": 0, "bytes": 0, "rejected": 0, "extracted": 0, "extract_failures": 0}
+
+    def start(self):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=ATTACHMENT_EXTRACT_WORKERS, thread_name_prefix="extract")
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    async def save_upload(self, content_type: str, stream) -> List[dict]:
+        """Store every file part of a multipart body read from `stream`; returns their metadata."""
+        mime, options = parse_options_header(content_type or "")
+        boundary = options.get(b"boundary")
+        if mime != b"multipart/form-data" or not boundary:
+            raise UploadRejected(415, "Expected multipart/form-data")
+
+        events = _PartEvents()
+        parser = MultipartParser(boundary, events.callbacks())
+        started = time.perf_counter()
+        parts, current = [], None
+        try:
+            async for chunk in stream:
+                self._feed(parser, chunk)
+                for kind, value in events.drain():
+                    if kind == "begin":
+                        current = await self._begin_part(value, len(parts))
+                    elif kind == "data" and current is not None:
+                        await current.write(value)
+                    elif kind == "end" and current is not None:
+                        await current.finish()
+                        parts.append(current)
+                        current = None
+            self._feed(parser, None)
+        except BaseException:
+            self.stats["rejected"] += 1
+            if current is not None:
+                await current.discard()
+            for part in parts:
+                os.unlink(part.spool.name)
+                await self.bucket.delete(part.grid_in._id)
+            raise
+        if not parts:
+            raise UploadRejected(400, "No files in upload")
+
+        total_bytes = sum(part.size for part in parts)
+        elapsed = time.perf_counter() - started
+        attachment_upload_bytes.inc(amount=total_bytes)
+        attachment_upload_throughput.observe(total_bytes / max(elapsed, 1e-6))
+        self.stats["uploads"] += 1
+        self.stats["files"] += len(parts)
+        self.stats["bytes"] += total_bytes
+        return await asyncio.gather(*(self._extract_and_record(part) for part in parts))
+
+    async def get(self, attachment_id: str) -> dict:
+        doc = await self.meta.find_one({"_id": attachment_id})
+        if doc is None:
+            raise AttachmentNotFound(attachment_id)
+        return doc
+
+    async def get_many(self, attachment_ids: List[str]) -> List[dict]:
+        docs = {doc["_id"]: doc for doc in await self.meta.find({"_id": {"$in": attachment_ids}}).to_list(None)}
+        missing = [attachment_id for attachment_id in attachment_ids if attachment_id not in docs]
+        if missing:
+            raise AttachmentNotFound(missing[0])
+        return [docs[attachment_id] for attachment_id in attachment_ids]
+
+    async def open_content(self, attachment_id: str):
+        """GridOut for the stored file; iterate it with readchunk()."""
+        doc = await self.get(attachment_id)
+        return doc, await self.bucket.open_download_stream(doc["file_id"])
+
+    def metrics(self) -> dict:
+        return dict(self.stats)
+
+    @staticmethod
+    def _feed(parser, chunk: Optional[bytes]):
+        try:
+            if chunk is None:
+                parser.finalize()
+            else:
+                parser.write(chunk)
+        except ValueError as e:  # python-multipart parse errors
+            raise UploadRejected(400, f"Malformed multipart body: {e}")
+
+    async def _begin_part(self, headers: dict, stored: int) -> Optional[_FilePart]:
+        _, disposition = parse_options_header(headers.get(b"content-disposition", b""))
+        filename = disposition.get(b"filename")
+        if filename is None:
+            return None  # a plain form field, not a file
+        if stored >= ATTACHMENT_MAX_FILES:
+            raise UploadRejected(413, f"At most {ATTACHMENT_MAX_FILES} files per upload")
+        filename = os.path.basename(filename.decode("utf-8", errors="replace")) or "upload"
+        content_type = headers.get(b"content-type", b"application/octet-stream").decode("latin-1").split(";")[0].strip()
+        grid_in = self.bucket.open_upload_stream(filename, metadata={"contentType": content_type})
+        return _FilePart(grid_in, filename, content_type)
+
+    async def _extract_and_record(self, part: _FilePart) -> dict:
+        started = time.perf_counter()
+        try:
+            text = await asyncio.get_running_loop().run_in_executor(
+                self._executor, extract_text, part.spool.name, part.content_type, part.filename, ATTACHMENT_TEXT_MAX_CHARS
+            )
+            status = "ready" if text is not None else "unsupported"
+            if text is not None:
+                self.stats["extracted"] += 1
+        except Exception as e:
+            logger.error(f"Text extraction failed for {part.filename}: {e}")
+            text, status = None, "failed"
+            self.stats["extract_failures"] += 1
+        finally:
+            os.unlink(part.spool.name)
+        attachment_extract_duration.observe(time.perf_counter() - started, status)
+
+        doc = {
+            "_id": uuid.uuid4().hex,
+            "file_id": part.grid_in._id,
+            "filename": part.filename,
+            "content_type": part.content_type,
+            "size": part.size,
+            "sha256": part.sha256.hexdigest(),
+            "status": status,
+            "text": text,
+            "text_chars": len(text or ""),
+            "created_at": datetime.utcnow(),
+        }
+        await self.meta.insert_one(doc)
+        return doc
+
+
+def attachment_context(docs: List[dict], max_chars: int = ATTACHMENT_CONTEXT_CHARS) -> str:
+    """Extracted text of `docs` formatted to follow a question, sharing `max_chars` between them."""
+    usable = [doc for doc in docs if doc.get("text")]
+    if not usable:
+        return ""
+    per_doc = max_chars // len(usable)
+    sections = [f'Attached document "{doc["filename"]}":\n{doc["text"][:per_doc]}' for doc in usable]
+    return "\n\n" + "\n\n".join(sections)
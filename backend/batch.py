@@ -0,0 +1,146 @@
+import asyncio
+import contextlib
+import os
+import time
+import uuid
+from datetime import datetime
+from typing import List, Optional
+
+from pymongo import ASCENDING, DESCENDING
+
+from cache import normalize_query
+
+# Batch chat settings
+BATCH_MAX_ITEMS = int(os.environ.get('BATCH_MAX_ITEMS', '500'))
+BATCH_CONCURRENCY = int(os.environ.get('BATCH_CONCURRENCY', '4'))
+BATCH_MAX_CONCURRENCY = int(os.environ.get('BATCH_MAX_CONCURRENCY', '16'))
+BATCH_RETENTION_DAYS = int(os.environ.get('BATCH_RETENTION_DAYS', '90'))
+# Results are written in chunks of this many documents while a run progresses
+BATCH_WRITE_CHUNK = 50
+
+
+async def run_bounded(items: list, answer, concurrency: int, key=None):
+    """Run `answer(item)` for every item with at most `concurrency` in flight.
+
+    Items for which `key(item)` returns the same value (e.g. turns of one
+    conversation) run one after another in list order; a None key runs
+    independently. Yields (index, reply, error, seconds) in completion
+    order; `error` is the exception raised for that item, if any. Items
+    still running when the consumer stops iterating are cancelled.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    # Tasks are created in list order, and a Lock hands itself out in the order it was asked for
+    ordered = {}
+
+    async def one(index, item):
+        item_key = key(item) if key is not None else None
+        lock = ordered.setdefault(item_key, asyncio.Lock()) if item_key is not None else None
+        async with lock or contextlib.nullcontext():
+            async with semaphore:
+                started = time.perf_counter()
+                try:
+                    reply = await answer(item)
+                    return index, reply, None, time.perf_counter() - started
+                except Exception as e:
+                    return index, None, e, time.perf_counter() - started
+
+    tasks = [asyncio.create_task(one(index, item)) for index, item in enumerate(items)]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+class BatchStore:
+    """Batch runs (`chat_batch_runs`) and their per-question results (`chat_batch_results`).
+
+    Results are keyed by the normalized question so two runs over the same
+    question list can be diffed even if the order or spacing changed.
+    """
+
+    def __init__(self, db):
+        self.runs = db.chat_batch_runs
+        self.results = db.chat_batch_results
+
+    async def ensure_indexes(self):
+        retention = BATCH_RETENTION_DAYS * 86400
+        await self.runs.create_index("created_at", expireAfterSeconds=retention)
+        await self.results.create_index("created_at", expireAfterSeconds=retention)
+        await self.results.create_index([("run_id", ASCENDING), ("index", ASCENDING)])
+
+    async def start_run(self, label: Optional[str], total: int, bypass_cache: bool) -> dict:
+        run = {
+            "_id": uuid.uuid4().hex,
+            "label": label,
+            "status": "running",
+            "total": total,
+            "succeeded": 0,
+            "failed": 0,
+            "bypass_cache": bypass_cache,
+            "created_at": datetime.utcnow(),
+            "finished_at": None,
+        }
+        await self.runs.insert_one(run)
+        return run
+
+    async def add_results(self, run_id: str, results: List[dict]):
+        if results:
+            await self.results.insert_many([{**result, "run_id": run_id} for result in results], ordered=False)
+
+    async def finish_run(self, run: dict, status: str):
+        run["status"] = status
+        run["finished_at"] = datetime.utcnow()
+        await self.runs.update_one(
+            {"_id": run["_id"]},
+            {"$set": {key: run[key] for key in ("status", "succeeded", "failed", "finished_at")}},
+        )
+
+    async def list_runs(self, limit: int) -> List[dict]:
+        return await self.runs.find().sort("created_at", DESCENDING).limit(limit).to_list(limit)
+
+    async def get_run(self, run_id: str) -> Optional[dict]:
+        return await self.runs.find_one({"_id": run_id})
+
+    async def list_results(self, run_id: str) -> List[dict]:
+        return await self.results.find({"run_id": run_id}, {"_id": 0}).sort("index", ASCENDING).to_list(None)
+
+    async def diff(self, base_id: str, target_id: str) -> dict:
+        """Compare two runs question by question."""
+        base = {doc["key"]: doc for doc in await self.list_results(base_id)}
+        target = {doc["key"]: doc for doc in await self.list_results(target_id)}
+
+        changed, unchanged = [], 0
+        for key in base.keys() & target.keys():
+            before, after = base[key], target[key]
+            if before["status"] == after["status"] and before.get("reply") == after.get("reply"):
+                unchanged += 1
+                continue
+            changed.append({
+                "message": after["message"],
+                "before": before.get("reply") or before.get("error"),
+                "after": after.get("reply") or after.get("error"),
+                "beforeStatus": before["status"],
+                "afterStatus": after["status"],
+            })
+        changed.sort(key=lambda entry: entry["message"])
+        return {
+            "unchanged": unchanged,
+            "changed": changed,
+            "onlyInBase": sorted(base[key]["message"] for key in base.keys() - target.keys()),
+            "onlyInTarget": sorted(target[key]["message"] for key in target.keys() - base.keys()),
+        }
+
+
+def result_document(index: int, message: str, reply: Optional[str], error: Optional[str], seconds: float) -> dict:
+    return {
+        "index": index,
+        "message": message,
+        "key": normalize_query(message),
+        "status": "error" if error else "ok",
+        "reply": reply,
+        "error": error,
+        "latency_ms": round(1000 * seconds, 1),
+        "created_at": datetime.utcnow(),
+    }
@@ -0,0 +1,129 @@
+import asyncio
+import logging
+import os
+
+from pymongo.errors import BulkWriteError
+from pymongo.write_concern import WriteConcern
+
+from config import env_flag
+from tracing import db_span
+
+
+logger = logging.getLogger(__name__)
+
+# Write-behind settings for POST /api/status
+STATUS_WRITE_BEHIND = env_flag('STATUS_WRITE_BEHIND', False)
+STATUS_BATCH_SIZE = int(os.environ.get('STATUS_BATCH_SIZE', '500'))
+STATUS_FLUSH_INTERVAL = float(os.environ.get('STATUS_FLUSH_INTERVAL', '0.25'))
+# Documents kept for retry while MongoDB is unreachable; the oldest are dropped beyond this
+STATUS_MAX_BUFFER = int(os.environ.get('STATUS_MAX_BUFFER', '50000'))
+# "majority", or a node count such as "1"; "0" means unacknowledged writes
+STATUS_WRITE_CONCERN = os.environ.get('STATUS_WRITE_CONCERN', '1')
+
+
+def parse_write_concern(value: str) -> WriteConcern:
+    return WriteConcern(w=int(value) if value.isdigit() else value)
+
+
+class WriteBehindBuffer:
+    """Coalesces single inserts into insert_many batches.
+
+    A batch is flushed once it reaches `batch_size` documents or when
+    `flush_interval` seconds have passed, whichever comes first. Call
+    close() on shutdown to flush whatever is still buffered. `on_flushed`,
+    if given, is called with the documents of each batch that were stored.
+
+    Writes are acknowledged before they reach MongoDB, so a batch that
+    fails as a whole (MongoDB unreachable, a timeout) goes back to the
+    front of the buffer and is retried on the next flush. Only when the
+    buffer grows past `max_buffer` are the oldest documents dropped.
+    """
+
+    def __init__(self, collection, batch_size: int = STATUS_BATCH_SIZE, flush_interval: float = STATUS_FLUSH_INTERVAL,
+                 on_flushed=None, max_buffer: int = STATUS_MAX_BUFFER):
+        self.collection = collection
+        self.on_flushed = on_flushed
+        self.batch_size = max(batch_size, 1)
+        self.flush_interval = flush_interval
+        self.max_buffer = max(max_buffer, self.batch_size)
+        self._buffer = []
+        self._wake = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._task = None
+        self._closing = False
+        self.stats = {"buffered": 0, "flushed": 0, "batches": 0, "failed": 0, "requeued": 0, "dropped": 0}
+
+    async def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    def add(self, document: dict):
+        self._buffer.append(document)
+        self.stats["buffered"] += 1
+        self._trim()
+        if len(self._buffer) >= self.batch_size:
+            self._wake.set()
+
+    async def flush(self):
+        async with self._flush_lock:
+            while self._buffer:
+                batch = self._buffer[:self.batch_size]
+                del self._buffer[:self.batch_size]
+                stored = batch
+                try:
+                    with db_span(self.collection.name, "insert_many") as span:
+                        span.set_attribute("db.mongodb.documents", len(batch))
+                        await self.collection.insert_many(batch, ordered=False)
+                    self.stats["flushed"] += len(batch)
+                except BulkWriteError as e:
+                    # Duplicate keys are documents a requeued batch had already stored
+                    failed_indexes = {error["index"] for error in e.details.get("writeErrors", []) if error.get("code") != 11000}
+                    stored = [doc for index, doc in enumerate(batch) if index not in failed_indexes]
+                    self.stats["flushed"] += len(stored)
+                    self.stats["failed"] += len(failed_indexes)
+                    logger.error(f"Write-behind batch partially failed: {len(failed_indexes)} of {len(batch)} documents")
+                except Exception as e:
+                    # Keep the batch for the next flush rather than retrying against a failing server now
+                    self._buffer[:0] = batch
+                    self.stats["requeued"] += len(batch)
+                    dropped = self._trim()
+                    logger.error(f"Write-behind batch of {len(batch)} documents failed, will retry: {e}"
+                                 + (f" ({dropped} oldest dropped, buffer full)" if dropped else ""))
+                    return
+                self.stats["batches"] += 1
+                if stored and self.on_flushed is not None:
+                    # The documents are stored either way; a failing callback must not stop later flushes
+                    try:
+                        self.on_flushed(stored)
+                    except Exception as e:
+                        logger.error(f"Write-behind on_flushed callback failed: {e}")
+
+    async def close(self):
+        # Let an in-progress flush finish rather than cancelling it mid-batch
+        self._closing = True
+        self._wake.set()
+        if self._task is not None:
+            await self._task
+            self._task = None
+        await self.flush()
+
+    def metrics(self) -> dict:
+        return {**self.stats, "pending": len(self._buffer)}
+
+    def _trim(self) -> int:
+        """Drop the oldest documents beyond `max_buffer`; returns how many."""
+        overflow = len(self._buffer) - self.max_buffer
+        if overflow <= 0:
+            return 0
+        del self._buffer[:overflow]
+        self.stats["dropped"] += overflow
+        return overflow
+
+    async def _run(self):
+        while not self._closing:
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            await self.flush()
@@ -0,0 +1,188 @@
+import asyncio
+import hashlib
+import logging
+import os
+import re
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Optional
+
+from config import env_flag
+
+
+logger = logging.getLogger(__name__)
+
+# Answer cache settings
+ANSWER_CACHE_TTL = float(os.environ.get('ANSWER_CACHE_TTL', '3600'))
+ANSWER_CACHE_SIZE = int(os.environ.get('ANSWER_CACHE_SIZE', '1024'))
+ANSWER_CACHE_MONGO = env_flag('ANSWER_CACHE_MONGO', False)
+
+# How concurrent questions are matched for coalescing: "normalized", "casefold" or "exact"
+SINGLEFLIGHT_KEY_MODE = os.environ.get('SINGLEFLIGHT_KEY_MODE', 'normalized')
+
+_whitespace = re.compile(r'\s+')
+_edge_punctuation = re.compile(r'^[\W_]+|[\W_]+$')
+
+
+def normalize_query(text: str) -> str:
+    """Fold case, collapse whitespace and drop leading/trailing punctuation."""
+    text = _whitespace.sub(' ', text.casefold()).strip()
+    return _edge_punctuation.sub('', text)
+
+
+class AnswerCache:
+    """TTL + LRU cache of Agentspace replies keyed by normalized query text.
+
+    An optional MongoDB collection acts as a second tier shared by all
+    workers; its documents expire through a TTL index on `expires_at`.
+    """
+
+    def __init__(self, ttl: float = ANSWER_CACHE_TTL, max_entries: int = ANSWER_CACHE_SIZE, collection=None):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.collection = collection
+        self._entries = OrderedDict()
+        self.stats = {
+            "hits": 0,
+            "mongo_hits": 0,
+            "misses": 0,
+            "bypassed": 0,
+            "evictions": 0,
+            "expirations": 0,
+            "stale_hits": 0,
+        }
+
+    @staticmethod
+    def key_for(query: str) -> str:
+        return normalize_query(query)
+
+    async def ensure_indexes(self):
+        if self.collection is not None:
+            await self.collection.create_index("expires_at", expireAfterSeconds=0)
+
+    async def get(self, key: str) -> Optional[str]:
+        entry = self._entries.get(key)
+        if entry is not None:
+            reply, expires_at = entry
+            if expires_at > time.monotonic():
+                self._entries.move_to_end(key)
+                self.stats["hits"] += 1
+                return reply
+            # Expired entries stay until LRU eviction so get_stale() can use them
+            self.stats["expirations"] += 1
+
+        if self.collection is not None:
+            try:
+                doc = await self.collection.find_one(
+                    {"_id": self._mongo_id(key), "expires_at": {"$gt": datetime.utcnow()}},
+                    {"reply": 1, "expires_at": 1},
+                )
+            except Exception as e:
+                logger.warning(f"Answer cache lookup failed: {e}")
+                doc = None
+            if doc:
+                self.stats["mongo_hits"] += 1
+                remaining = (doc["expires_at"] - datetime.utcnow()).total_seconds()
+                self._remember(key, doc["reply"], remaining)
+                return doc["reply"]
+
+        self.stats["misses"] += 1
+        return None
+
+    async def set(self, key: str, reply: str):
+        self._remember(key, reply, self.ttl)
+        if self.collection is not None:
+            try:
+                await self.collection.replace_one(
+                    {"_id": self._mongo_id(key)},
+                    {"query": key, "reply": reply, "expires_at": datetime.utcnow() + timedelta(seconds=self.ttl)},
+                    upsert=True,
+                )
+            except Exception as e:
+                logger.warning(f"Answer cache write failed: {e}")
+
+    def get_stale(self, key: str) -> Optional[str]:
+        """Return an in-memory reply even if expired; for when the upstream is down."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        self.stats["stale_hits"] += 1
+        return entry[0]
+
+    def record_bypass(self):
+        self.stats["bypassed"] += 1
+
+    def metrics(self) -> dict:
+        lookups = self.stats["hits"] + self.stats["mongo_hits"] + self.stats["misses"]
+        hits = self.stats["hits"] + self.stats["mongo_hits"]
+        return {
+            **self.stats,
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl,
+            "mongo_tier": self.collection is not None,
+            "hit_ratio": hits / lookups if lookups else 0.0,
+        }
+
+    def _remember(self, key: str, reply: str, ttl: float):
+        self._entries[key] = (reply, time.monotonic() + ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    @staticmethod
+    def _mongo_id(key: str) -> str:
+        return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+
+class SingleFlight:
+    """Collapses concurrent calls with the same key into one upstream call.
+
+    The first caller for a key starts the call; callers arriving while it
+    is in flight wait for the same result. The shared call runs in its own
+    task so a disconnecting leader does not cancel it for everyone else.
+    """
+
+    KEY_MODES = {
+        "normalized": normalize_query,
+        "casefold": lambda text: text.casefold().strip(),
+        "exact": lambda text: text,
+    }
+
+    def __init__(self, key_mode: str = SINGLEFLIGHT_KEY_MODE):
+        if key_mode not in self.KEY_MODES:
+            raise ValueError(f"Unknown single-flight key mode: {key_mode}")
+        self.key_mode = key_mode
+        self._key_func = self.KEY_MODES[key_mode]
+        self._calls = {}
+        self.stats = {"leaders": 0, "followers": 0}
+
+    def key_for(self, query: str) -> str:
+        return self._key_func(query)
+
+    async def do(self, key: str, fn):
+        """Await `fn()` or join an identical in-flight call; returns (result, shared)."""
+        task = self._calls.get(key)
+        shared = task is not None
+        if shared:
+            self.stats["followers"] += 1
+        else:
+            self.stats["leaders"] += 1
+            task = asyncio.ensure_future(fn())
+            self._calls[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+        return await asyncio.shield(task), shared
+
+    def metrics(self) -> dict:
+        return {
+            "key_mode": self.key_mode,
+            "in_flight": len(self._calls),
+            "upstream_calls": self.stats["leaders"],
+            "upstream_calls_saved": self.stats["followers"],
+        }
+
+    def _forget(self, key: str, task):
+        if self._calls.get(key) is task:
+            del self._calls[key]
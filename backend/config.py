@@ -0,0 +1,9 @@
+import os
+
+
+def env_flag(name: str, default: bool) -> bool:
+    """On/off setting from the environment: "1", "true" or "yes" (any case) mean on."""
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ('1', 'true', 'yes')
@@ -0,0 +1,88 @@
+import uuid
+from datetime import datetime, timedelta
+from typing import List, Optional, Tuple
+
+from pymongo import ASCENDING, DESCENDING
+
+
+class ConversationStore:
+    """Append-only chat history keyed by the Agentspace conversation name.
+
+    Every message is its own document in `chat_messages`, so recording a
+    turn is two small inserts and reading history is an indexed range scan
+    on (session_id, timestamp, id). `conversations` keeps one summary
+    document per session, listed only for session ids the caller holds.
+    """
+
+    def __init__(self, db):
+        self.messages = db.chat_messages
+        self.conversations = db.conversations
+
+    async def ensure_indexes(self):
+        await self.messages.create_index([("session_id", ASCENDING), ("timestamp", ASCENDING), ("id", ASCENDING)])
+        await self.conversations.create_index("session_id", unique=True)
+        await self.conversations.create_index([("updated_at", DESCENDING)])
+
+    async def append_turn(self, session_id: str, user_message: str, reply: str, asked_at: datetime,
+                          attachment_ids: Optional[List[str]] = None):
+        # Mongo stores milliseconds; keep the reply strictly after the question
+        answered_at = max(datetime.utcnow(), asked_at + timedelta(milliseconds=1))
+        question = {"id": str(uuid.uuid4()), "session_id": session_id, "role": "user", "content": user_message, "timestamp": asked_at}
+        if attachment_ids:
+            # Referenced by id; the files and their text stay in the attachment store
+            question["attachment_ids"] = attachment_ids
+        await self.messages.insert_many([
+            question,
+            {"id": str(uuid.uuid4()), "session_id": session_id, "role": "bot", "content": reply, "timestamp": answered_at},
+        ])
+        await self.conversations.update_one(
+            {"session_id": session_id},
+            {
+                "$setOnInsert": {"session_id": session_id, "title": user_message[:80], "created_at": asked_at},
+                "$set": {"updated_at": answered_at, "last_message": reply[:100]},
+                "$inc": {"message_count": 2},
+            },
+            upsert=True,
+        )
+
+    async def list_messages(
+        self,
+        session_id: str,
+        limit: int,
+        before: Optional[Tuple[datetime, str]] = None,
+        after: Optional[Tuple[datetime, str]] = None,
+    ) -> Tuple[List[dict], bool]:
+        """Return up to `limit` messages in chronological order and whether more exist.
+
+        With `after`, the page starts right after that position (new
+        messages). Otherwise it is the newest `limit` messages, optionally
+        older than `before`.
+        """
+        query = {"session_id": session_id}
+        if after:
+            query["$or"] = [
+                {"timestamp": {"$gt": after[0]}},
+                {"timestamp": after[0], "id": {"$gt": after[1]}},
+            ]
+            sort = [("timestamp", ASCENDING), ("id", ASCENDING)]
+        else:
+            if before:
+                query["$or"] = [
+                    {"timestamp": {"$lt": before[0]}},
+                    {"timestamp": before[0], "id": {"$lt": before[1]}},
+                ]
+            sort = [("timestamp", DESCENDING), ("id", DESCENDING)]
+
+        docs = await self.messages.find(query, {"_id": 0}).sort(sort).limit(limit + 1).to_list(limit + 1)
+        has_more = len(docs) > limit
+        docs = docs[:limit]
+        if not after:
+            docs.reverse()
+        return docs, has_more
+
+    async def list_conversations(self, session_ids: List[str]) -> List[dict]:
+        """Summaries of the given sessions only, most recently updated first."""
+        session_ids = list(dict.fromkeys(session_ids))
+        return await self.conversations.find({"session_id": {"$in": session_ids}}, {"_id": 0}) \
+            .sort("updated_at", DESCENDING) \
+            .to_list(len(session_ids))
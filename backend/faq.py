@@ -0,0 +1,308 @@
+import asyncio
+import logging
+import math
+import os
+import re
+import time
+from collections import Counter
+from datetime import datetime
+from typing import Callable, List, Optional, Tuple
+
+import numpy as np
+from pymongo import ReturnDocument
+
+from config import env_flag
+from metrics import faq_lookup_duration
+
+
+logger = logging.getLogger(__name__)
+
+# Answer session-less chats from curated HR FAQs when a question matches closely enough
+FAQ_INDEX = env_flag('FAQ_INDEX', False)
+# Cosine similarity (0-1) a question needs to be answered locally instead of by Agentspace
+FAQ_MIN_SCORE = float(os.environ.get('FAQ_MIN_SCORE', '0.8'))
+# Seconds between checks for added, edited or retired entries
+FAQ_REFRESH_INTERVAL = float(os.environ.get('FAQ_REFRESH_INTERVAL', '30'))
+
+_word = re.compile(r"[^\W_]+(?:'[^\W_]+)?")
+
+# Words that say nothing about which policy is being asked about
+STOP_WORDS = frozenset("""
+a about am an and any are as at be been but by can could do does for from get got had has have how i if in is it
+its me my of on or our please should so than that the their them there these they this to up us was we were what
+when where which who why will with would you your
+""".split())
+
+
+def terms(text: str) -> Counter:
+    """Word and word-pair counts of `text`, case-folded and without stop words."""
+    words = [word for word in _word.findall(text.casefold()) if word not in STOP_WORDS]
+    counts = Counter(words)
+    counts.update(f"{first} {second}" for first, second in zip(words, words[1:]))
+    return counts
+
+
+class TfidfIndex:
+    """Immutable TF-IDF index over FAQ question variants.
+
+    Stored as postings (CSC-style arrays sorted by term) with rows
+    L2-normalised, so scoring a question is one gather and a bincount
+    over the postings of its terms, and memory grows with the text
+    indexed rather than with rows times vocabulary. A new index is built
+    on every change and swapped in whole, so lookups never need a lock.
+    """
+
+    def __init__(self, rows: List[Tuple[str, Counter]]):
+        self.faq_ids = [faq_id for faq_id, _ in rows]
+        self.vocabulary = {}
+        term_ids, row_ids, counts = [], [], []
+        for row, (_, row_terms) in enumerate(rows):
+            for term, count in row_terms.items():
+                term_ids.append(self.vocabulary.setdefault(term, len(self.vocabulary)))
+                row_ids.append(row)
+                counts.append(count)
+
+        term_ids = np.array(term_ids, dtype=np.int64)
+        row_ids = np.array(row_ids, dtype=np.int64)
+        document_frequency = np.bincount(term_ids, minlength=len(self.vocabulary))
+        # Smoothed idf, as scikit-learn computes it
+        self.idf = np.log((1 + len(rows)) / (1 + document_frequency)) + 1
+        self.max_idf = float(self.idf.max()) if len(self.idf) else 1.0
+        weights = (1 + np.log(np.array(counts, dtype=np.float64))) * self.idf[term_ids]
+        norms = np.sqrt(np.bincount(row_ids, weights=weights ** 2, minlength=len(rows)))
+        weights /= np.maximum(norms[row_ids], 1e-12)
+
+        order = np.argsort(term_ids, kind="stable")
+        self.rows = row_ids[order]
+        self.weights = weights[order]
+        self.offsets = np.concatenate(([0], np.cumsum(document_frequency)))
+        # Each FAQ has a row per question variant; scores are reported per FAQ
+        unique_ids = sorted(set(self.faq_ids))
+        position = {faq_id: n for n, faq_id in enumerate(unique_ids)}
+        self.unique_ids = unique_ids
+        self.row_faq = np.array([position[faq_id] for faq_id in self.faq_ids], dtype=np.int64)
+
+    def __len__(self):
+        return len(self.faq_ids)
+
+    def search(self, text: str, limit: int = 1) -> List[Tuple[str, float]]:
+        """The `limit` best-matching FAQ ids with their cosine similarity, best first."""
+        known, unknown_weight = [], 0.0
+        for term, count in terms(text).items():
+            term_id = self.vocabulary.get(term)
+            if term_id is None:
+                # Terms no FAQ uses are as rare as they get; they dilute the match
+                unknown_weight += ((1 + math.log(count)) * self.max_idf) ** 2
+            else:
+                known.append((term_id, count))
+        if not known or not len(self):
+            return []
+
+        term_ids = np.array([term_id for term_id, _ in known], dtype=np.int64)
+        query = (1 + np.log(np.array([count for _, count in known], dtype=np.float64))) * self.idf[term_ids]
+        query_norm = math.sqrt(float(query @ query) + unknown_weight)
+        starts, ends = self.offsets[term_ids], self.offsets[term_ids + 1]
+        postings = np.concatenate([np.arange(start, end) for start, end in zip(starts, ends)])
+        row_scores = np.bincount(
+            self.rows[postings],
+            weights=self.weights[postings] * np.repeat(query / query_norm, ends - starts),
+            minlength=len(self),
+        )
+        faq_scores = np.zeros(len(self.unique_ids))
+        np.maximum.at(faq_scores, self.row_faq, row_scores)
+        best = np.argsort(-faq_scores)[:limit]
+        return [(self.unique_ids[n], float(faq_scores[n])) for n in best if faq_scores[n] > 0]
+
+
+class FaqIndex:
+    """Curated HR answers from the `hr_faqs` collection, matched locally by TF-IDF.
+
+    Each document has a `question`, optional alternative phrasings in
+    `variants`, the `answer`, an `active` flag and `updated_at`. Every
+    `refresh_interval` seconds only documents updated since the last
+    refresh are fetched and re-tokenised; the index is then rebuilt from
+    the cached term counts (idf depends on every entry) off the event
+    loop. Entries are retired by clearing `active`; documents deleted
+    outright are noticed by a count check and trigger a full reload.
+    """
+
+    def __init__(self, collection, min_score: float = FAQ_MIN_SCORE, refresh_interval: float = FAQ_REFRESH_INTERVAL,
+                 upstream_latency: Optional[Callable[[], Optional[float]]] = None):
+        self.collection = collection
+        self.min_score = min_score
+        self.refresh_interval = refresh_interval
+        self.upstream_latency = upstream_latency
+        self.index = TfidfIndex([])
+        self._entries = {}
+        # updated_at of every document seen, retired and invalid ones included
+        self._known = {}
+        self._watermark = None
+        self._refresh_lock = asyncio.Lock()
+        self._task = None
+        self.stats = {
+            "lookups": 0,
+            "hits": 0,
+            "misses": 0,
+            "near_misses": 0,
+            "lookup_seconds": 0.0,
+            "latency_saved_seconds": 0.0,
+            "reindexes": 0,
+            "full_reloads": 0,
+            "refresh_errors": 0,
+            "last_reindex_seconds": 0.0,
+        }
+
+    async def ensure_indexes(self):
+        await self.collection.create_index("updated_at")
+
+    async def start(self):
+        try:
+            await self.refresh(full=True)
+        except Exception as e:
+            # Chats go to Agentspace until a later refresh succeeds
+            logger.error(f"Loading HR FAQs failed: {e}")
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def match(self, question: str) -> Optional[dict]:
+        """The FAQ entry answering `question`, or None if none scores at least `min_score`."""
+        started = time.perf_counter()
+        best = self.index.search(question, limit=1)
+        entry = self._entries.get(best[0][0]) if best else None
+        hit = entry is not None and best[0][1] >= self.min_score
+        seconds = time.perf_counter() - started
+
+        self.stats["lookups"] += 1
+        self.stats["lookup_seconds"] += seconds
+        faq_lookup_duration.observe(seconds, "hit" if hit else "miss")
+        if not hit:
+            self.stats["misses"] += 1
+            if best and best[0][1] >= self.min_score * 0.75:
+                self.stats["near_misses"] += 1
+            return None
+        self.stats["hits"] += 1
+        upstream = self.upstream_latency() if self.upstream_latency else None
+        if upstream:
+            self.stats["latency_saved_seconds"] += max(upstream - seconds, 0.0)
+        return {**entry["doc"], "score": best[0][1]}
+
+    def search(self, question: str, limit: int) -> List[dict]:
+        """Best candidates with their scores, whether or not they clear the threshold."""
+        return [
+            {"id": faq_id, "question": self._entries[faq_id]["doc"]["question"], "score": score}
+            for faq_id, score in self.index.search(question, limit)
+            if faq_id in self._entries
+        ]
+
+    async def list(self) -> List[dict]:
+        return await self.collection.find({}).sort("_id", 1).to_list(None)
+
+    async def upsert(self, faq_id: str, question: str, answer: str, variants: List[str], active: bool = True) -> dict:
+        now = datetime.utcnow()
+        doc = await self.collection.find_one_and_update(
+            {"_id": faq_id},
+            {
+                "$set": {"question": question, "answer": answer, "variants": variants, "active": active, "updated_at": now},
+                "$setOnInsert": {"created_at": now},
+            },
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+        await self.refresh()
+        return doc
+
+    async def retire(self, faq_id: str) -> bool:
+        result = await self.collection.update_one(
+            {"_id": faq_id, "active": True}, {"$set": {"active": False, "updated_at": datetime.utcnow()}}
+        )
+        await self.refresh()
+        return result.modified_count > 0
+
+    async def refresh(self, full: bool = False):
+        """Apply entries changed since the last refresh (all of them with `full`) and rebuild the index."""
+        async with self._refresh_lock:
+            entries = None
+            if not full and self._watermark is not None:
+                entries = await self._changed_entries(full=False)
+                if entries is None and await self.collection.estimated_document_count() != len(self._known):
+                    # Documents were deleted (or written without updated_at); only a full reload finds them
+                    self.stats["full_reloads"] += 1
+                    full = True
+            if full or self._watermark is None:
+                entries = await self._changed_entries(full=True)
+            if entries is None:
+                return
+
+            started = time.perf_counter()
+            rows = [(faq_id, row_terms) for faq_id, entry in entries.items() for row_terms in entry["rows"]]
+            self.index = await asyncio.to_thread(TfidfIndex, rows)
+            self._entries = entries
+            self.stats["reindexes"] += 1
+            self.stats["last_reindex_seconds"] = time.perf_counter() - started
+            logger.info(f"HR FAQ index rebuilt: {len(entries)} entries, {len(rows)} questions, "
+                        f"{len(self.index.vocabulary)} terms in {self.stats['last_reindex_seconds'] * 1000:.1f}ms")
+
+    def metrics(self) -> dict:
+        lookups = self.stats["lookups"]
+        return {
+            **self.stats,
+            "enabled": FAQ_INDEX,
+            "entries": len(self._entries),
+            "questions": len(self.index),
+            "terms": len(self.index.vocabulary),
+            "min_score": self.min_score,
+            "hit_ratio": self.stats["hits"] / lookups if lookups else 0.0,
+        }
+
+    async def _changed_entries(self, full: bool) -> Optional[dict]:
+        """Entries after applying changed documents, or None if nothing changed."""
+        query = {} if full else {"updated_at": {"$gte": self._watermark}}
+        docs = await self.collection.find(query).sort("updated_at", 1).to_list(None)
+        if full:
+            entries, self._known = {}, {}
+        else:
+            entries = dict(self._entries)
+        changed = full
+        for doc in docs:
+            faq_id = str(doc["_id"])
+            if not full and faq_id in self._known and self._known[faq_id] == doc.get("updated_at"):
+                # Applied last time; the watermark query is inclusive
+                continue
+            changed = True
+            self._known[faq_id] = doc.get("updated_at")
+            if doc.get("active", True) and doc.get("question") and doc.get("answer"):
+                entries[faq_id] = self._entry(doc)
+            else:
+                entries.pop(faq_id, None)
+        stamps = [doc["updated_at"] for doc in docs if doc.get("updated_at")]
+        if stamps:
+            self._watermark = max(stamps)
+        elif full:
+            self._watermark = datetime.min
+        return entries if changed else None
+
+    @staticmethod
+    def _entry(doc: dict) -> dict:
+        questions = [doc["question"]] + [variant for variant in doc.get("variants", []) if variant]
+        return {
+            "doc": {"id": str(doc["_id"]), "question": doc["question"], "answer": doc["answer"]},
+            "rows": [terms(question) for question in questions],
+        }
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            try:
+                await self.refresh()
+            except Exception as e:
+                self.stats["refresh_errors"] += 1
+                logger.error(f"HR FAQ refresh failed: {e}")
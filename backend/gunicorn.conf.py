@@ -0,0 +1,40 @@
+"""
+Production server settings: N uvicorn workers under gunicorn.
+
+    cd backend && gunicorn server:app
+
+gunicorn picks this file up from the working directory. Every worker runs
+the FastAPI lifespan on its own, so MongoDB clients, Agentspace channels and
+in-process caches are created after the fork and never shared. State that
+must be consistent across workers (sessions, chat history, optionally the
+answer cache via ANSWER_CACHE_MONGO) lives in MongoDB.
+
+On SIGTERM the master stops accepting connections and signals the workers;
+each one fails its readiness check, refuses new chats with 503 and gives
+in-flight chats DRAIN_TIMEOUT seconds before cancelling them, then flushes
+buffers and closes its connections. graceful_timeout leaves room for that.
+"""
+
+import multiprocessing
+import os
+
+bind = os.environ.get('BIND', '0.0.0.0:8001')
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count()))
+worker_class = "uvicorn.workers.UvicornWorker"
+
+# Resources are opened per worker in the lifespan, so the app must not be preloaded
+preload_app = False
+
+# Seconds a silent worker may take before the master restarts it
+timeout = int(os.environ.get('WORKER_TIMEOUT', '60'))
+keepalive = int(os.environ.get('KEEPALIVE', '5'))
+
+# Drain window for in-flight chats plus time to flush and close connections
+graceful_timeout = int(float(os.environ.get('DRAIN_TIMEOUT', '40'))) + 15
+
+# Recycle workers now and then to bound memory growth, staggered so they do not restart together
+max_requests = int(os.environ.get('MAX_REQUESTS', '0'))
+max_requests_jitter = max_requests // 10
+
+accesslog = os.environ.get('ACCESS_LOG') or None
+errorlog = "-"
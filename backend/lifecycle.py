@@ -0,0 +1,119 @@
+import asyncio
+import logging
+import os
+import signal
+import threading
+from contextlib import contextmanager
+
+
+logger = logging.getLogger(__name__)
+
+# Seconds in-flight chats get to finish after SIGTERM before they are cancelled.
+# Keep gunicorn's graceful_timeout above this so shutdown hooks still run.
+DRAIN_TIMEOUT = float(os.environ.get('DRAIN_TIMEOUT', '40'))
+
+
+class Draining(Exception):
+    """Raised for new work that arrives after shutdown has started."""
+
+
+class Lifecycle:
+    """Per-process readiness and graceful drain state.
+
+    The process is ready once startup has finished and stops being ready as
+    soon as SIGTERM (or SIGINT) arrives. From then on new chats are refused
+    and in-flight ones get up to `drain_timeout` seconds before they are
+    cancelled, so the lifespan shutdown (flushing buffers, closing
+    connections) always runs before the process manager gives up on us.
+    """
+
+    def __init__(self, drain_timeout: float = DRAIN_TIMEOUT):
+        self.drain_timeout = drain_timeout
+        self.ready = False
+        self.draining = False
+        self._in_flight = set()
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._drain_task = None
+        self.stats = {"drained": 0, "cancelled": 0, "refused": 0}
+
+    def mark_ready(self):
+        self.ready = True
+
+    def check_accepting(self):
+        if self.draining:
+            self.stats["refused"] += 1
+            raise Draining()
+
+    @contextmanager
+    def track(self):
+        """Count the current task as an in-flight chat until the block exits."""
+        task = asyncio.current_task()
+        self._in_flight.add(task)
+        self._idle.clear()
+        try:
+            yield
+        finally:
+            self._in_flight.discard(task)
+            if not self._in_flight:
+                self._idle.set()
+
+    async def tracked(self, stream):
+        """Pass through an async iterator (e.g. a streaming body) as an in-flight chat."""
+        with self.track():
+            async for item in stream:
+                yield item
+
+    def install_signal_handlers(self):
+        """Start draining on SIGTERM/SIGINT without replacing the server's own shutdown.
+
+        Runs during lifespan startup, after the server has set up its own
+        handling, and hands every signal on to the handler that was there
+        before. uvicorn 0.25 registers with loop.add_signal_handler, which
+        leaves a no-op Python-level handler and is driven by the wakeup fd,
+        so its callback runs either way; newer uvicorn and gunicorn workers
+        install a plain signal.signal handler, which is called from ours.
+        tests/test_lifecycle.py covers both.
+        """
+        if threading.current_thread() is not threading.main_thread():
+            # Signals can only be handled on the main thread (e.g. not under TestClient)
+            return
+        loop = asyncio.get_running_loop()
+
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            previous = signal.getsignal(sig)
+
+            def handle(signum, frame, previous=previous):
+                loop.call_soon_threadsafe(self.begin_drain)
+                if callable(previous):
+                    previous(signum, frame)
+
+            signal.signal(sig, handle)
+
+    def begin_drain(self):
+        if self.draining:
+            return
+        self.draining = True
+        self.ready = False
+        logger.info(f"Draining {len(self._in_flight)} in-flight chat(s), up to {self.drain_timeout:.0f}s")
+        self._drain_task = asyncio.create_task(self._drain())
+
+    async def wait_drained(self):
+        if self._drain_task is not None:
+            await self._drain_task
+
+    async def _drain(self):
+        in_flight = len(self._in_flight)
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout=self.drain_timeout)
+            self.stats["drained"] += in_flight
+        except asyncio.TimeoutError:
+            remaining = list(self._in_flight)
+            logger.warning(f"Drain timeout exceeded, cancelling {len(remaining)} chat(s)")
+            self.stats["drained"] += in_flight - len(remaining)
+            self.stats["cancelled"] += len(remaining)
+            for task in remaining:
+                task.cancel()
+
+    def metrics(self) -> dict:
+        return {**self.stats, "ready": self.ready, "draining": self.draining, "in_flight": len(self._in_flight)}
@@ -0,0 +1,255 @@
+import bisect
+import threading
+import time
+
+from pymongo import monitoring
+
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(label_names, label_values) -> str:
+    if not label_names:
+        return ""
+    pairs = ",".join(f'{name}="{_escape(value)}"' for name, value in zip(label_names, label_values))
+    return "{" + pairs + "}"
+
+
+class Counter:
+    metric_type = "counter"
+
+    def __init__(self, name: str, documentation: str, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount: float = 1.0):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0.0) + amount
+
+    def render(self):
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} {self.metric_type}"
+        for label_values, value in list(self._values.items()):
+            yield f"{self.name}{_format_labels(self.label_names, label_values)} {value}"
+
+
+class Gauge(Counter):
+    metric_type = "gauge"
+
+    def set(self, value: float, *label_values):
+        with self._lock:
+            self._values[label_values] = value
+
+    def dec(self, *label_values, amount: float = 1.0):
+        self.inc(*label_values, amount=-amount)
+
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                # per-bucket counts (last slot is +Inf), sum
+                series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def time(self, *label_values):
+        return _Timer(self, label_values)
+
+    def render(self):
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} histogram"
+        for label_values, (counts, total) in list(self._series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                labels = _format_labels(self.label_names + ("le",), label_values + (le,))
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            labels = _format_labels(self.label_names, label_values)
+            yield f"{self.name}_sum{labels} {total}"
+            yield f"{self.name}_count{labels} {cumulative}"
+
+
+class _Timer:
+    __slots__ = ("histogram", "label_values", "started")
+
+    def __init__(self, histogram, label_values):
+        self.histogram = histogram
+        self.label_values = label_values
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.started, *self.label_values)
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+        self._collectors = {}
+
+    def counter(self, *args, **kwargs) -> Counter:
+        return self._add(Counter(*args, **kwargs))
+
+    def gauge(self, *args, **kwargs) -> Gauge:
+        return self._add(Gauge(*args, **kwargs))
+
+    def histogram(self, *args, **kwargs) -> Histogram:
+        return self._add(Histogram(*args, **kwargs))
+
+    def add_collector(self, prefix: str, collect):
+        """Expose the numeric values of `collect()` (a dict) as gauges named `<prefix>_<key>`.
+
+        Registering the same prefix again replaces the earlier collector.
+        """
+        self._collectors[prefix] = collect
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for prefix, collect in self._collectors.items():
+            for key, value in collect().items():
+                if isinstance(value, bool):
+                    value = int(value)
+                if isinstance(value, (int, float)):
+                    lines.append(f"# TYPE {prefix}_{key} gauge")
+                    lines.append(f"{prefix}_{key} {value}")
+        return "\n".join(lines) + "\n"
+
+    def _add(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+
+registry = Registry()
+
+http_request_duration = registry.histogram(
+    "http_request_duration_seconds", "HTTP request latency by route", labels=("method", "route", "status"),
+)
+http_requests_in_flight = registry.gauge("http_requests_in_flight", "HTTP requests currently being served")
+agentspace_stage_duration = registry.histogram(
+    "agentspace_stage_duration_seconds",
+    "Time spent per chat stage: client_setup, upstream_call, serialize",
+    labels=("stage",),
+)
+agentspace_calls = registry.counter("agentspace_calls_total", "Agentspace calls by outcome", labels=("outcome",))
+agentspace_resilience_events = registry.counter(
+    "agentspace_resilience_events_total",
+    "Retries, hedges and breaker rejections on the Agentspace call path",
+    labels=("event",),
+)
+admission_decisions = registry.counter(
+    "admission_decisions_total", "Chat admission outcomes: admitted, ip_limited, session_limited, overloaded",
+    labels=("decision",),
+)
+admission_queue_wait = registry.histogram(
+    "admission_queue_wait_seconds", "Time chats spent queued for a concurrency slot",
+)
+attachment_upload_bytes = registry.counter("attachment_upload_bytes_total", "Bytes of attachments stored")
+attachment_upload_throughput = registry.histogram(
+    "attachment_upload_throughput_bytes_per_second",
+    "Per-request upload throughput, from the first body chunk to the last byte stored",
+    buckets=(64e3, 256e3, 1e6, 4e6, 16e6, 64e6, 256e6, 1e9),
+)
+attachment_extract_duration = registry.histogram(
+    "attachment_extract_duration_seconds", "Text extraction time per attachment by outcome", labels=("status",),
+)
+response_body_bytes = registry.counter(
+    "http_response_body_bytes_total", "Bytes of non-streamed response bodies sent, by content encoding",
+    labels=("encoding",),
+)
+response_compression_saved = registry.counter(
+    "http_response_compression_saved_bytes_total", "Bytes saved by compressing response bodies", labels=("encoding",),
+)
+response_compression_duration = registry.histogram(
+    "http_response_compression_seconds", "Time spent compressing a response body", labels=("encoding",),
+    buckets=(0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05),
+)
+scheduler_queue_depth = registry.gauge(
+    "scheduler_queue_depth", "Requests waiting for a slot, by scheduler (admission, agentspace) and priority class",
+    labels=("scheduler", "priority"),
+)
+scheduler_queue_wait = registry.histogram(
+    "scheduler_queue_wait_seconds", "Time requests waited for a slot, by scheduler and priority class",
+    labels=("scheduler", "priority"),
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+)
+faq_lookup_duration = registry.histogram(
+    "faq_lookup_duration_seconds", "Time to match a chat question against the HR FAQ index, by hit or miss",
+    labels=("outcome",), buckets=(0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01),
+)
+mongo_command_duration = registry.histogram(
+    "mongo_command_duration_seconds", "MongoDB command latency", labels=("collection", "command", "outcome"),
+)
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording per-route latency and in-flight requests."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        http_requests_in_flight.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            http_requests_in_flight.dec()
+            # The router stores the matched route on the scope; use its template
+            # so path parameters don't explode the label cardinality
+            route = scope.get("route")
+            route_path = getattr(route, "path_format", None) or "unmatched"
+            http_request_duration.observe(time.perf_counter() - started, scope["method"], route_path, status["code"])
+
+
+class MongoCommandTimer(monitoring.CommandListener):
+    """pymongo command listener feeding mongo_command_duration_seconds."""
+
+    def __init__(self):
+        self._collections = {}
+
+    def started(self, event):
+        collection = event.command.get(event.command_name)
+        self._collections[event.request_id] = collection if isinstance(collection, str) else ""
+
+    def succeeded(self, event):
+        self._observe(event, "success")
+
+    def failed(self, event):
+        self._observe(event, "failure")
+
+    def _observe(self, event, outcome):
+        collection = self._collections.pop(event.request_id, "")
+        mongo_command_duration.observe(event.duration_micros / 1e6, collection, event.command_name, outcome)
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Roll up existing status_checks history and turn on retention.
+
+    cd backend && python migrate_status_rollups.py
+    cd backend && python migrate_status_rollups.py --since 2025-01-01 --no-retention
+
+Run it once after deploying the version that maintains status_rollups.
+Buckets for every closed hour (from the oldest check, or --since, up to the
+start of the current hour) are rebuilt from raw checks; the server keeps the
+current hour up to date as checks arrive. The backfill replaces buckets
+rather than adding to them, so it is safe to re-run, for example an hour
+later to fill in the hour the deploy happened in.
+
+A running server still holds the last few seconds of checks in memory, and
+would add them again to a bucket the backfill has just replaced. --until is
+therefore never later than the start of the hour that was current
+SETTLE_MINUTES ago. If the servers' write-behind buffers have fallen further
+behind (after a MongoDB outage, say), stop the write path before backfilling.
+
+Once the backfill has finished, status_checks gets its TTL index
+(STATUS_RETENTION_DAYS); until then the server leaves existing history alone.
+"""
+
+import argparse
+import asyncio
+import os
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+
+load_dotenv(Path(__file__).parent / '.env')
+
+from rollups import STATUS_RETENTION_DAYS, StatusRollups, bucket_start  # noqa: E402
+
+# Longer than a server keeps stored checks in memory before adding them to their buckets
+SETTLE_MINUTES = 5
+
+
+def latest_until(now: datetime) -> datetime:
+    """The last bucket boundary no running server still adds counts before."""
+    return bucket_start(now - timedelta(minutes=SETTLE_MINUTES), "hour")
+
+
+async def migrate(since, until, step_hours: int, retention: bool, dry_run: bool):
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+    try:
+        db = client[os.environ['DB_NAME']]
+        rollups = StatusRollups(db)
+
+        if since is None:
+            oldest = await db.status_checks.find({}, {"timestamp": 1}).sort("timestamp", 1).limit(1).to_list(1)
+            if not oldest:
+                print("status_checks is empty; nothing to roll up")
+                since = until
+            else:
+                since = oldest[0]["timestamp"]
+        since = bucket_start(since, "hour")
+        total = await db.status_checks.count_documents({"timestamp": {"$gte": since, "$lt": until}})
+        print(f"Rolling up {total} status checks from {since:%Y-%m-%d %H:%M} to {until:%Y-%m-%d %H:%M}")
+        if dry_run:
+            return
+
+        await rollups.ensure_indexes()
+        started = time.perf_counter()
+        step = timedelta(hours=step_hours)
+        window_start, rolled_up = since, 0
+        while window_start < until:
+            window_end = min(window_start + step, until)
+            rolled_up += await rollups.backfill(window_start, window_end, step=step)
+            elapsed = time.perf_counter() - started
+            print(f"  up to {window_end:%Y-%m-%d %H:%M}: {rolled_up} checks ({rolled_up / max(elapsed, 1e-6):.0f}/s)")
+            window_start = window_end
+        await rollups.mark_backfilled(until)
+        print(f"Backfill done in {time.perf_counter() - started:.1f}s")
+
+        if retention and STATUS_RETENTION_DAYS:
+            await rollups.apply_retention(STATUS_RETENTION_DAYS)
+            print(f"status_checks now expire after {STATUS_RETENTION_DAYS} days")
+    finally:
+        client.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backfill status_rollups and enable status_checks retention")
+    parser.add_argument("--since", type=datetime.fromisoformat, help="Start of the backfill (default: oldest check)")
+    parser.add_argument("--until", type=datetime.fromisoformat,
+                        help="End of the backfill, exclusive (default and latest: start of the current hour)")
+    parser.add_argument("--step-hours", type=int, default=24, help="Hours of raw checks aggregated at a time")
+    parser.add_argument("--no-retention", action="store_true", help="Do not create the TTL index on status_checks")
+    parser.add_argument("--dry-run", action="store_true", help="Only report how many checks would be rolled up")
+    args = parser.parse_args()
+
+    latest = latest_until(datetime.utcnow())
+    until = bucket_start(args.until, "hour") if args.until else latest
+    if until > latest:
+        print(f"--until moved back to {latest:%Y-%m-%d %H:%M}: servers may still be adding to later buckets")
+        until = latest
+    asyncio.run(migrate(args.since, until, args.step_hours, not args.no_retention, args.dry_run))
+
+
+if __name__ == "__main__":
+    main()
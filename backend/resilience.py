@@ -0,0 +1,146 @@
+import asyncio
+import random
+import time
+from collections import deque
+
+
+class CircuitOpen(Exception):
+    """Raised instead of calling an upstream that the breaker considers unhealthy."""
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"Circuit open, retry in {retry_after:.1f}s")
+        self.retry_after = retry_after
+
+
+class RetryBudget:
+    """Caps retries at a fraction of recent request volume.
+
+    Every request deposits `ratio` tokens and every retry withdraws one, so
+    retries can never amplify load by more than `ratio` during an outage.
+    The budget starts with `min_tokens` so a quiet worker can still retry.
+    """
+
+    def __init__(self, ratio: float = 0.2, min_tokens: float = 10, max_tokens: float = 100):
+        self.ratio = ratio
+        self.max_tokens = max_tokens
+        self.tokens = min_tokens
+
+    def record_request(self):
+        self.tokens = min(self.tokens + self.ratio, self.max_tokens)
+
+    def try_withdraw(self) -> bool:
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+
+class LatencyTracker:
+    """Rolling window of successful call latencies with a cached percentile."""
+
+    def __init__(self, window: int = 500, min_samples: int = 50):
+        self.samples = deque(maxlen=window)
+        self.min_samples = min_samples
+        self._cached = None
+        self._dirty = 0
+
+    def record(self, seconds: float):
+        self.samples.append(seconds)
+        self._dirty += 1
+
+    def p95(self):
+        """95th percentile, or None until enough samples exist. Re-sorted every 20 samples."""
+        if len(self.samples) < self.min_samples:
+            return None
+        if self._cached is None or self._dirty >= 20:
+            ordered = sorted(self.samples)
+            self._cached = ordered[int(0.95 * (len(ordered) - 1))]
+            self._dirty = 0
+        return self._cached
+
+    def mean(self):
+        """Mean of the window, or None before the first sample."""
+        return sum(self.samples) / len(self.samples) if self.samples else None
+
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker with a single half-open probe.
+
+    closed     calls flow; `failure_threshold` consecutive failures open it
+    open       calls fail fast with CircuitOpen for `cooldown` seconds
+    half_open  one probe call is let through; success closes, failure reopens
+    """
+
+    def __init__(self, failure_threshold: int = 5, cooldown: float = 30):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.times_opened = 0
+        self._probe_in_flight = False
+
+    def before_call(self):
+        if self.state == "open":
+            remaining = self.opened_at + self.cooldown - time.monotonic()
+            if remaining > 0:
+                raise CircuitOpen(remaining)
+            self.state = "half_open"
+        if self.state == "half_open":
+            if self._probe_in_flight:
+                raise CircuitOpen(1.0)
+            self._probe_in_flight = True
+
+    def record_success(self):
+        self.failures = 0
+        self._probe_in_flight = False
+        self.state = "closed"
+
+    def record_failure(self):
+        self._probe_in_flight = False
+        self.failures += 1
+        if self.state == "half_open" or self.failures >= self.failure_threshold:
+            if self.state != "open":
+                self.times_opened += 1
+            self.state = "open"
+            self.opened_at = time.monotonic()
+
+    def release(self):
+        """Forget a half-open probe that ended without a verdict (e.g. cancelled)."""
+        self._probe_in_flight = False
+
+
+def backoff_delay(attempt: int, base: float, cap: float) -> float:
+    """Full-jitter exponential backoff."""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+async def first_completed(primary, start_hedge, hedge_after: float):
+    """Await `primary`; if it is still running after `hedge_after` seconds,
+    start a second attempt and return whichever finishes successfully first.
+
+    Returns (result, hedged, hedge_won). Attempts still running when this
+    returns or is cancelled are cancelled.
+    """
+    primary_task = asyncio.ensure_future(primary)
+    tasks = [primary_task]
+    try:
+        done, _ = await asyncio.wait(tasks, timeout=hedge_after)
+        if done:
+            return primary_task.result(), False, False
+
+        hedge_task = asyncio.ensure_future(start_hedge())
+        tasks.append(hedge_task)
+        pending = set(tasks)
+        error = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            succeeded = [task for task in done if task.exception() is None]
+            if succeeded:
+                return succeeded[0].result(), True, succeeded[0] is hedge_task
+            error = next(iter(done)).exception()
+        raise error
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
@@ -0,0 +1,151 @@
+import gzip
+import json
+import os
+import time
+from functools import lru_cache
+from typing import Optional
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, Response
+from pydantic import TypeAdapter
+from starlette.datastructures import Headers, MutableHeaders
+
+from config import env_flag
+from metrics import response_body_bytes, response_compression_duration, response_compression_saved
+
+try:
+    import orjson
+except ImportError:  # falls back to the standard library encoder
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # optional: gzip only
+    brotli = None
+
+
+# Compress complete responses of at least this many bytes
+RESPONSE_COMPRESSION = env_flag('RESPONSE_COMPRESSION', True)
+COMPRESSION_MIN_BYTES = int(os.environ.get('COMPRESSION_MIN_BYTES', '1024'))
+# Fast settings suited to dynamic content; higher values cost CPU for a few more percent
+GZIP_LEVEL = int(os.environ.get('GZIP_LEVEL', '5'))
+BROTLI_QUALITY = int(os.environ.get('BROTLI_QUALITY', '4'))
+
+# Streams must reach the client event by event, so they are never compressed
+STREAMING_TYPES = ("text/event-stream", "application/x-ndjson")
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse encoded with orjson, which also handles datetimes natively.
+
+    Content may therefore be raw MongoDB documents (minus ObjectIds) with
+    no per-field conversion beforehand. Without orjson the standard
+    encoder is used, with FastAPI's encoder for non-JSON types.
+    """
+
+    def render(self, content) -> bytes:
+        if orjson is not None:
+            return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+        return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":"),
+                          default=jsonable_encoder).encode("utf-8")
+
+
+@lru_cache(maxsize=None)
+def _adapter(annotation) -> TypeAdapter:
+    return TypeAdapter(annotation)
+
+
+def model_response(content, annotation, status_code: int = 200, headers: Optional[dict] = None) -> Response:
+    """Response whose body pydantic-core serializes straight to JSON bytes.
+
+    Skips FastAPI's response_model pass (validate, dump to dicts, encode),
+    so `content` must already match `annotation`, e.g. a model or a list
+    of models. Routes keep response_model for the OpenAPI schema.
+    """
+    return Response(_adapter(annotation).dump_json(content), status_code=status_code,
+                    headers=headers, media_type="application/json")
+
+
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    """Best content coding offered in an Accept-Encoding header: br, then gzip."""
+    accepted = set()
+    for part in accept_encoding.lower().split(","):
+        name, _, params = part.partition(";")
+        params = params.replace(" ", "")
+        try:
+            quality = float(params[2:]) if params.startswith("q=") else 1.0
+        except ValueError:
+            quality = 1.0
+        if quality > 0:  # q=0 means "not acceptable"
+            accepted.add(name.strip())
+    if brotli is not None and ("br" in accepted or "*" in accepted):
+        return "br"
+    if "gzip" in accepted or "*" in accepted:
+        return "gzip"
+    return None
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+class CompressionMiddleware:
+    """ASGI middleware compressing complete responses with brotli or gzip.
+
+    Only bodies sent in a single message and of at least `minimum_size`
+    bytes are compressed. SSE and NDJSON streams, chunked downloads and
+    already-encoded responses pass through untouched, so streamed events
+    are never held back in a compressor buffer.
+    """
+
+    def __init__(self, app, minimum_size: int = COMPRESSION_MIN_BYTES, enabled: bool = RESPONSE_COMPRESSION):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.enabled = enabled
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.enabled:
+            return await self.app(scope, receive, send)
+        encoding = choose_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        held = None
+
+        async def send_wrapper(message):
+            nonlocal held
+            if message["type"] == "http.response.start":
+                headers = Headers(raw=message["headers"])
+                if "content-encoding" in headers or headers.get("content-type", "").startswith(STREAMING_TYPES):
+                    await send(message)
+                else:
+                    # Wait for the body to decide; the size is only known then
+                    held = message
+                return
+            if message["type"] != "http.response.body" or held is None:
+                return await send(message)
+
+            start, held = held, None
+            body = message.get("body", b"")
+            if message.get("more_body", False) or len(body) < self.minimum_size:
+                response_body_bytes.inc("identity", amount=len(body))
+                await send(start)
+                return await send(message)
+
+            headers = MutableHeaders(raw=start["headers"])
+            headers.add_vary_header("Accept-Encoding")
+            if encoding is None:
+                response_body_bytes.inc("identity", amount=len(body))
+                await send(start)
+                return await send(message)
+
+            started = time.perf_counter()
+            compressed = compress(body, encoding)
+            response_compression_duration.observe(time.perf_counter() - started, encoding)
+            response_body_bytes.inc(encoding, amount=len(compressed))
+            response_compression_saved.inc(encoding, amount=len(body) - len(compressed))
+            headers["Content-Encoding"] = encoding
+            headers["Content-Length"] = str(len(compressed))
+            await send(start)
+            await send({"type": "http.response.body", "body": compressed})
+
+        await self.app(scope, receive, send_wrapper)
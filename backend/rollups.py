@@ -0,0 +1,267 @@
+import asyncio
+import logging
+import os
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+from pymongo import ASCENDING, ReplaceOne, UpdateOne
+from pymongo.errors import OperationFailure
+
+
+logger = logging.getLogger(__name__)
+
+# Raw status checks are deleted this many days after their timestamp; 0 keeps them forever
+STATUS_RETENTION_DAYS = int(os.environ.get('STATUS_RETENTION_DAYS', '30'))
+# Retention of the pre-aggregated buckets, per granularity
+STATUS_ROLLUP_MINUTE_DAYS = int(os.environ.get('STATUS_ROLLUP_MINUTE_DAYS', '14'))
+STATUS_ROLLUP_HOUR_DAYS = int(os.environ.get('STATUS_ROLLUP_HOUR_DAYS', '400'))
+# Seconds between writes of the counts accumulated in memory
+STATUS_ROLLUP_FLUSH_INTERVAL = float(os.environ.get('STATUS_ROLLUP_FLUSH_INTERVAL', '1'))
+
+GRANULARITIES = ("minute", "hour")
+TTL_INDEX_NAME = "timestamp_ttl"
+BACKFILL_MARKER = "status_rollups_backfill"
+
+
+def bucket_start(timestamp: datetime, granularity: str) -> datetime:
+    if granularity == "minute":
+        return timestamp.replace(second=0, microsecond=0)
+    return timestamp.replace(minute=0, second=0, microsecond=0)
+
+
+def rollup_id(granularity: str, client_name: str, bucket: datetime) -> str:
+    return f"{granularity}:{client_name}:{bucket:%Y%m%d%H%M}"
+
+
+def _expires_at(granularity: str, bucket: datetime) -> datetime:
+    days = STATUS_ROLLUP_MINUTE_DAYS if granularity == "minute" else STATUS_ROLLUP_HOUR_DAYS
+    return bucket + timedelta(days=days)
+
+
+def bucket_expression(granularity: str) -> dict:
+    # $dateFromParts rather than $dateTrunc, which needs MongoDB 5.0
+    parts = {
+        "year": {"$year": "$timestamp"},
+        "month": {"$month": "$timestamp"},
+        "day": {"$dayOfMonth": "$timestamp"},
+        "hour": {"$hour": "$timestamp"},
+    }
+    if granularity == "minute":
+        parts["minute"] = {"$minute": "$timestamp"}
+    return {"$dateFromParts": parts}
+
+
+class StatusRollups:
+    """Per-client status check counts and last-seen times by minute and hour.
+
+    Buckets live in `status_rollups`, one document per granularity, client
+    and bucket start, so dashboards read a few hundred documents instead
+    of scanning raw history. Written checks are counted in memory and
+    merged into the buckets with one bulk upsert every `flush_interval`
+    seconds. `backfill()` rebuilds buckets from raw `status_checks` for
+    a time range; raw checks expire after STATUS_RETENTION_DAYS once the
+    history they cover has been rolled up.
+    """
+
+    def __init__(self, db, flush_interval: float = STATUS_ROLLUP_FLUSH_INTERVAL):
+        self.raw = db.status_checks
+        self.collection = db.status_rollups
+        self.migrations = db.migrations
+        self.flush_interval = flush_interval
+        self._pending = {}
+        self._flush_lock = asyncio.Lock()
+        self._task = None
+        self.stats = {"recorded": 0, "flushes": 0, "flush_errors": 0, "buckets_written": 0}
+
+    async def ensure_indexes(self):
+        await self.collection.create_index([("granularity", ASCENDING), ("bucket", ASCENDING), ("client_name", ASCENDING)])
+        await self.collection.create_index([("granularity", ASCENDING), ("client_name", ASCENDING), ("bucket", ASCENDING)])
+        await self.collection.create_index("expires_at", expireAfterSeconds=0)
+
+    async def ensure_retention(self) -> bool:
+        """Expire raw status checks after STATUS_RETENTION_DAYS.
+
+        Only applied once existing history has been rolled up (see
+        migrate_status_rollups.py), or when there is none, so enabling
+        retention never loses data the rollups do not cover yet.
+        """
+        if not STATUS_RETENTION_DAYS:
+            return False
+        if not await self.backfilled():
+            if await self.raw.estimated_document_count() > 0:
+                logger.warning("status_checks retention not applied: run migrate_status_rollups.py to roll up existing history first")
+                return False
+            await self.mark_backfilled(None)
+        await self.apply_retention(STATUS_RETENTION_DAYS)
+        return True
+
+    async def apply_retention(self, days: int):
+        seconds = days * 86400
+        try:
+            await self.raw.create_index("timestamp", expireAfterSeconds=seconds, name=TTL_INDEX_NAME)
+        except OperationFailure as e:
+            if e.code not in (85, 86):  # IndexOptionsConflict, IndexKeySpecsConflict
+                raise
+            # The TTL index exists with another retention; change it in place
+            await self.raw.database.command(
+                "collMod", self.raw.name, index={"name": TTL_INDEX_NAME, "expireAfterSeconds": seconds}
+            )
+
+    async def backfilled(self) -> bool:
+        return await self.migrations.find_one({"_id": BACKFILL_MARKER}) is not None
+
+    async def mark_backfilled(self, until: Optional[datetime]):
+        await self.migrations.update_one(
+            {"_id": BACKFILL_MARKER},
+            {"$set": {"completed_at": datetime.utcnow(), "until": until}},
+            upsert=True,
+        )
+
+    async def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    def record(self, documents: List[dict]):
+        """Count stored status checks towards their minute and hour buckets."""
+        for doc in documents:
+            for granularity in GRANULARITIES:
+                key = (granularity, doc["client_name"], bucket_start(doc["timestamp"], granularity))
+                pending = self._pending.get(key)
+                if pending is None:
+                    self._pending[key] = [1, doc["timestamp"]]
+                else:
+                    pending[0] += 1
+                    pending[1] = max(pending[1], doc["timestamp"])
+        self.stats["recorded"] += len(documents)
+
+    async def flush(self):
+        async with self._flush_lock:
+            if not self._pending:
+                return
+            pending, self._pending = self._pending, {}
+            operations = [
+                UpdateOne(
+                    {"_id": rollup_id(granularity, client_name, bucket)},
+                    {
+                        "$inc": {"count": count},
+                        "$max": {"last_seen": last_seen},
+                        "$setOnInsert": {
+                            "granularity": granularity,
+                            "client_name": client_name,
+                            "bucket": bucket,
+                            "expires_at": _expires_at(granularity, bucket),
+                        },
+                    },
+                    upsert=True,
+                )
+                for (granularity, client_name, bucket), (count, last_seen) in pending.items()
+            ]
+            try:
+                await self.collection.bulk_write(operations, ordered=False)
+            except Exception as e:
+                # Keep the counts and merge them into the next flush
+                for key, (count, last_seen) in pending.items():
+                    current = self._pending.setdefault(key, [0, last_seen])
+                    current[0] += count
+                    current[1] = max(current[1], last_seen)
+                self.stats["flush_errors"] += 1
+                logger.error(f"Status rollup flush failed: {e}")
+                return
+            self.stats["flushes"] += 1
+            self.stats["buckets_written"] += len(operations)
+
+    async def backfill(self, since: datetime, until: datetime, step: timedelta = timedelta(days=1)) -> int:
+        """Rebuild the buckets in [since, until) from raw status checks.
+
+        Both bounds should fall on hour boundaries so no bucket is only
+        partly rebuilt. Buckets are replaced rather than incremented, so the
+        backfill can be re-run over the same range. Works through `step`
+        at a time to bound the size of each aggregation. Returns the
+        number of raw documents rolled up.
+
+        Counts this instance holds in memory are flushed first, since the
+        replaced buckets already include their checks. Counts held by other
+        processes are not: a server that flushes into a bucket after it was
+        replaced counts those checks twice. Only backfill hours no server
+        writes to any more (see migrate_status_rollups.py), or stop the
+        write path while the backfill runs.
+        """
+        await self.flush()
+        rolled_up = 0
+        window_start = since
+        while window_start < until:
+            window_end = min(window_start + step, until)
+            for granularity in GRANULARITIES:
+                pipeline = [
+                    {"$match": {"timestamp": {"$gte": window_start, "$lt": window_end}}},
+                    {"$group": {
+                        "_id": {"client_name": "$client_name", "bucket": bucket_expression(granularity)},
+                        "count": {"$sum": 1},
+                        "last_seen": {"$max": "$timestamp"},
+                    }},
+                ]
+                operations = []
+                async for group in self.raw.aggregate(pipeline, allowDiskUse=True):
+                    client_name, bucket = group["_id"]["client_name"], group["_id"]["bucket"]
+                    if granularity == "hour":
+                        rolled_up += group["count"]
+                    operations.append(ReplaceOne(
+                        {"_id": rollup_id(granularity, client_name, bucket)},
+                        {
+                            "granularity": granularity,
+                            "client_name": client_name,
+                            "bucket": bucket,
+                            "count": group["count"],
+                            "last_seen": group["last_seen"],
+                            "expires_at": _expires_at(granularity, bucket),
+                        },
+                        upsert=True,
+                    ))
+                    if len(operations) >= 1000:
+                        await self.collection.bulk_write(operations, ordered=False)
+                        operations = []
+                if operations:
+                    await self.collection.bulk_write(operations, ordered=False)
+            window_start = window_end
+        return rolled_up
+
+    async def buckets(self, granularity: str, since: datetime, until: datetime,
+                      client_name: Optional[str], limit: int) -> List[dict]:
+        match = {"granularity": granularity, "bucket": {"$gte": bucket_start(since, granularity), "$lt": until}}
+        if client_name:
+            match["client_name"] = client_name
+        pipeline = [
+            {"$match": match},
+            {"$sort": {"bucket": 1, "client_name": 1}},
+            {"$limit": limit},
+            {"$project": {"_id": 0, "clientName": "$client_name", "bucket": 1, "count": 1, "lastSeen": "$last_seen"}},
+        ]
+        return await self.collection.aggregate(pipeline).to_list(limit)
+
+    async def clients(self, granularity: str, since: datetime, until: datetime) -> List[dict]:
+        """Per-client totals and last-seen time over [since, until) from `granularity` buckets."""
+        pipeline = [
+            {"$match": {"granularity": granularity, "bucket": {"$gte": bucket_start(since, granularity), "$lt": until}}},
+            {"$group": {"_id": "$client_name", "count": {"$sum": "$count"}, "lastSeen": {"$max": "$last_seen"}}},
+            {"$sort": {"count": -1, "_id": 1}},
+            {"$project": {"_id": 0, "clientName": "$_id", "count": 1, "lastSeen": 1}},
+        ]
+        return await self.collection.aggregate(pipeline).to_list(None)
+
+    def metrics(self) -> dict:
+        return {**self.stats, "pending_buckets": len(self._pending)}
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
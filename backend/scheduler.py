@@ -0,0 +1,188 @@
+import asyncio
+import contextvars
+import heapq
+import itertools
+import logging
+import math
+import os
+import time
+from typing import Optional, Tuple
+
+from metrics import scheduler_queue_depth, scheduler_queue_wait
+
+
+logger = logging.getLogger(__name__)
+
+PRIORITY_INTERACTIVE = "interactive"
+PRIORITY_BATCH = "batch"
+PRIORITIES = (PRIORITY_INTERACTIVE, PRIORITY_BATCH)
+
+# Share of freed slots interactive work gets over batch work while both are waiting
+SCHEDULER_INTERACTIVE_WEIGHT = float(os.environ.get('SCHEDULER_INTERACTIVE_WEIGHT', '9'))
+SCHEDULER_BATCH_WEIGHT = float(os.environ.get('SCHEDULER_BATCH_WEIGHT', '1'))
+# Fraction of slots batch work may never occupy, so interactive requests rarely wait at all
+SCHEDULER_INTERACTIVE_RESERVE = float(os.environ.get('SCHEDULER_INTERACTIVE_RESERVE', '0.25'))
+# Per-client weights within a class, e.g. "10.0.0.7=4,10.0.0.9=0.5"; everyone else has weight 1
+SCHEDULER_CLIENT_WEIGHTS = os.environ.get('SCHEDULER_CLIENT_WEIGHTS', '')
+
+_request_class = contextvars.ContextVar("request_class", default=(PRIORITY_INTERACTIVE, "-"))
+
+
+def parse_client_weights(value: str) -> dict:
+    weights = {}
+    for item in value.split(","):
+        if item.strip():
+            client, _, weight = item.rpartition("=")
+            weights[client.strip()] = float(weight)
+    return weights
+
+
+def set_request_class(priority: str, client: str):
+    """Schedule upstream work started from the current context as `priority` on behalf of `client`."""
+    return _request_class.set((priority, client))
+
+
+def reset_request_class(token):
+    _request_class.reset(token)
+
+
+def request_class() -> Tuple[str, str]:
+    return _request_class.get()
+
+
+class FairScheduler:
+    """Hands out `max_concurrent` slots by priority class and per-client fairness.
+
+    Waiting interactive and batch requests share freed slots in the
+    ratio of their class weights, and batch requests never hold more than
+    `max_concurrent` minus the interactive reserve. Within a class,
+    clients are served by start-time fair queueing: each request is
+    tagged max(class virtual time, the client's previous finish tag) and
+    advances the client's finish tag by 1/weight, so one client queueing
+    hundreds of requests only delays others by its fair share.
+    """
+
+    def __init__(self, max_concurrent: int, name: str,
+                 interactive_weight: float = SCHEDULER_INTERACTIVE_WEIGHT, batch_weight: float = SCHEDULER_BATCH_WEIGHT,
+                 interactive_reserve: float = SCHEDULER_INTERACTIVE_RESERVE,
+                 client_weights: Optional[dict] = None):
+        self.max_concurrent = max_concurrent
+        self.name = name
+        self.batch_limit = max(1, max_concurrent - math.ceil(max_concurrent * interactive_reserve))
+        self.client_weights = parse_client_weights(SCHEDULER_CLIENT_WEIGHTS) if client_weights is None else client_weights
+        self.active = {priority: 0 for priority in PRIORITIES}
+        self._stride = {PRIORITY_INTERACTIVE: 1 / interactive_weight, PRIORITY_BATCH: 1 / batch_weight}
+        self._pass = {priority: 0.0 for priority in PRIORITIES}
+        self._class_clock = 0.0
+        self._queues = {priority: [] for priority in PRIORITIES}
+        self._virtual_time = {priority: 0.0 for priority in PRIORITIES}
+        self._finish_tags = {priority: {} for priority in PRIORITIES}
+        self._sequence = itertools.count()
+        self.stats = {"granted_interactive": 0, "granted_batch": 0, "queued_interactive": 0, "queued_batch": 0,
+                      "abandoned": 0}
+
+    async def acquire(self) -> str:
+        """Wait for a slot for the current request class; returns the class to pass to release()."""
+        priority, client = request_class()
+        tag = self._tag(priority, client)
+        started = time.perf_counter()
+        if not self._queues[priority] and self._has_room(priority):
+            self._grant(priority, tag)
+            scheduler_queue_wait.observe(0.0, self.name, priority)
+            return priority
+
+        waiter = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._queues[priority], (tag, next(self._sequence), waiter, client))
+        self.stats[f"queued_{priority}"] += 1
+        self._update_depth(priority)
+        try:
+            await asyncio.shield(waiter)
+        except asyncio.CancelledError:
+            self._abandon(waiter, priority)
+            raise
+        finally:
+            scheduler_queue_wait.observe(time.perf_counter() - started, self.name, priority)
+        return priority
+
+    def release(self, priority: str):
+        self.active[priority] -= 1
+        self._dispatch()
+
+    def has_room(self) -> bool:
+        """Whether acquire() would return at once for the current request class."""
+        priority = request_class()[0]
+        return not self._queues[priority] and self._has_room(priority)
+
+    @property
+    def queued(self) -> int:
+        return sum(len(queue) for queue in self._queues.values())
+
+    def metrics(self) -> dict:
+        metrics = {
+            "max_concurrent": self.max_concurrent,
+            "batch_limit": self.batch_limit,
+            **self.stats,
+        }
+        for priority in PRIORITIES:
+            metrics[f"active_{priority}"] = self.active[priority]
+            metrics[f"waiting_{priority}"] = len(self._queues[priority])
+            metrics[f"waiting_clients_{priority}"] = len({entry[3] for entry in self._queues[priority]})
+        return metrics
+
+    def _tag(self, priority: str, client: str) -> float:
+        finish_tags = self._finish_tags[priority]
+        start = max(self._virtual_time[priority], finish_tags.get(client, 0.0))
+        finish_tags[client] = start + 1 / self.client_weights.get(client, 1.0)
+        return start
+
+    def _has_room(self, priority: str) -> bool:
+        if sum(self.active.values()) >= self.max_concurrent:
+            return False
+        return priority != PRIORITY_BATCH or self.active[PRIORITY_BATCH] < self.batch_limit
+
+    def _grant(self, priority: str, tag: float):
+        self.active[priority] += 1
+        self.stats[f"granted_{priority}"] += 1
+        self._virtual_time[priority] = max(self._virtual_time[priority], tag)
+        # Clients whose finish tag has fallen behind virtual time are idle; forget them
+        finish_tags = self._finish_tags[priority]
+        if len(finish_tags) > 2 * len(self._queues[priority]) + 64:
+            virtual_time = self._virtual_time[priority]
+            for client in [client for client, finish in finish_tags.items() if finish <= virtual_time]:
+                del finish_tags[client]
+        # Stride scheduling between the classes
+        start = max(self._pass[priority], self._class_clock)
+        self._pass[priority] = start + self._stride[priority]
+        self._class_clock = start
+
+    def _dispatch(self):
+        while True:
+            candidates = [priority for priority in PRIORITIES if self._queues[priority] and self._has_room(priority)]
+            if not candidates:
+                return
+            priority = min(candidates, key=lambda p: max(self._pass[p], self._class_clock))
+            tag, _, waiter, _ = heapq.heappop(self._queues[priority])
+            self._update_depth(priority)
+            if waiter.done():
+                continue  # cancelled while queued
+            self._grant(priority, tag)
+            waiter.set_result(None)
+
+    def _abandon(self, waiter, priority: str):
+        self.stats["abandoned"] += 1
+        if waiter.done() and not waiter.cancelled():
+            # The slot was handed over just as the caller gave up; pass it on
+            self.release(priority)
+            return
+        waiter.cancel()
+        queue = self._queues[priority]
+        for n, entry in enumerate(queue):
+            if entry[2] is waiter:
+                queue[n] = queue[-1]
+                queue.pop()
+                heapq.heapify(queue)
+                break
+        self._update_depth(priority)
+
+    def _update_depth(self, priority: str):
+        scheduler_queue_depth.set(len(self._queues[priority]), self.name, priority)
@@ -1,21 +1,47 @@
-from fastapi import FastAPI, APIRouter, HTTPException
+from fastapi import FastAPI, APIRouter, Depends, HTTPException, Header, Query, Request
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
-from google.cloud.discoveryengine_v1beta import ConversationalSearchServiceClient
-from google.cloud import discoveryengine_v1beta as discoveryengine
 import os
+import re
+import json
+import secrets
+import base64
+import math
+import asyncio
+import time
 import logging
+from contextlib import aclosing, asynccontextmanager
 from pathlib import Path
 from pydantic import BaseModel, Field
-from typing import List, Optional
+from typing import List, Optional, Tuple
 import uuid
-from datetime import datetime
+import unicodedata
+from urllib.parse import quote
+from datetime import datetime, timedelta
 
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
+# Local modules read their settings from the environment, so import them after .env is loaded
+import agentspace  # noqa: E402
+from resilience import CircuitOpen  # noqa: E402
+from admission import RATE_LIMIT_MONGO, AdmissionController, AdmissionMiddleware, Rejected, rejection_headers  # noqa: E402
+from sessions import SessionNotFound, SessionRegistry, is_legacy_session  # noqa: E402
+from batching import STATUS_WRITE_BEHIND, STATUS_WRITE_CONCERN, WriteBehindBuffer, parse_write_concern  # noqa: E402
+from attachments import ATTACHMENT_MAX_BYTES, ATTACHMENT_MAX_FILES, AttachmentNotFound, AttachmentStore, UploadRejected, attachment_context  # noqa: E402
+from batch import BATCH_CONCURRENCY, BATCH_MAX_CONCURRENCY, BATCH_MAX_ITEMS, BATCH_WRITE_CHUNK, BatchStore, result_document, run_bounded  # noqa: E402
+from cache import ANSWER_CACHE_MONGO, AnswerCache, SingleFlight  # noqa: E402
+from conversations import ConversationStore  # noqa: E402
+from faq import FAQ_INDEX, FaqIndex  # noqa: E402
+from lifecycle import Draining, Lifecycle  # noqa: E402
+from metrics import MetricsMiddleware, MongoCommandTimer, agentspace_stage_duration, registry  # noqa: E402
+from responses import CompressionMiddleware, FastJSONResponse, model_response  # noqa: E402
+from rollups import StatusRollups  # noqa: E402
+from tracing import STATUS_ERROR, MemoryExporter, RequestIdFilter, TracingMiddleware, db_span, otlp_json, record_exception, tracer  # noqa: E402
+
 # Agentspace Configuration
 os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = str(ROOT_DIR / "sisl-internal-playground-eb68e48f1725.json")
 PROJECT_ID = "sisl-internal-playground"
@@ -23,13 +49,79 @@ PROJECT_NUMBER = "1001147206231"  # Project number from error logs
 LOCATION = "global"
 ENGINE_ID = "agentspace-hr-assisstant_1753777037202"
 
+# Seconds between keepalive comments on /api/chat/stream while Agentspace is working
+SSE_HEARTBEAT_SECONDS = float(os.environ.get('SSE_HEARTBEAT_SECONDS', '2'))
+
 # MongoDB connection
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
+
+# Bearer token for the admin endpoints (FAQ management, traces); they are disabled while unset
+ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN', '')
+
+# Per-process resources, created by open_resources() during lifespan startup
+# so that every worker opens its own connection pool after the fork
+client: Optional[AsyncIOMotorClient] = None
+db = None
+status_writer: Optional[WriteBehindBuffer] = None
+session_registry: Optional[SessionRegistry] = None
+conversation_store: Optional[ConversationStore] = None
+batch_store: Optional[BatchStore] = None
+attachment_store: Optional[AttachmentStore] = None
+answer_cache: Optional[AnswerCache] = None
+status_rollups: Optional[StatusRollups] = None
+faq_index: Optional[FaqIndex] = None
+
+# Coalesces identical new-session questions that are in flight at the same time
+single_flight = SingleFlight()
+
+# Readiness and graceful drain on SIGTERM
+lifecycle = Lifecycle()
+
+# Rate limits and the concurrency cap for chat requests
+admission = AdmissionController()
+CHAT_PATHS = ("/api/chat", "/api/chat/stream", "/api/chat/batch")
+# Scheduled behind interactive chats, for admission and Agentspace calls alike
+BATCH_PATHS = ("/api/chat/batch",)
+
+# Status check listing
+STATUS_PAGE_SIZE = 100
+STATUS_PAGE_MAX = 1000
+STATUS_PROJECTION = {"_id": 0, "id": 1, "client_name": 1, "timestamp": 1}
+STATUS_BULK_MAX = 5000
+STATUS_ROLLUP_PAGE_SIZE = 1000
+STATUS_ROLLUP_PAGE_MAX = 10000
+
+# Trace listing (TRACE_EXPORTER=memory)
+TRACE_PAGE_SIZE = 50
+TRACE_PAGE_MAX = 500
+
+# Seconds /api/health/ready waits for a MongoDB ping
+READINESS_MONGO_TIMEOUT = float(os.environ.get('READINESS_MONGO_TIMEOUT', '2'))
+
+# Conversation history listing
+HISTORY_PAGE_SIZE = 50
+HISTORY_PAGE_MAX = 200
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    open_resources()
+    await create_indexes()
+    if status_writer is not None:
+        await status_writer.start()
+    await status_rollups.start()
+    if admission.shared is not None:
+        await admission.shared.start()
+    attachment_store.start()
+    if FAQ_INDEX:
+        await faq_index.start()
+    await startup_agentspace_pool()
+    lifecycle.install_signal_handlers()
+    lifecycle.mark_ready()
+    yield
+    await close_resources()
 
 # Create the main app without a prefix
-app = FastAPI()
+app = FastAPI(lifespan=lifespan, default_response_class=FastJSONResponse)
 
 # Create a router with the /api prefix
 api_router = APIRouter(prefix="/api")
@@ -44,70 +136,873 @@ class StatusCheck(BaseModel):
 class StatusCheckCreate(BaseModel):
     client_name: str
 
+class StatusRollup(BaseModel):
+    clientName: str
+    bucket: datetime
+    count: int
+    lastSeen: datetime
+
+class StatusClientSummary(BaseModel):
+    clientName: str
+    count: int
+    lastSeen: datetime
+
 class ChatMessage(BaseModel):
     message: str
     sessionId: Optional[str] = None
+    attachmentIds: Optional[List[str]] = None  # ids returned by POST /api/attachments
 
 class ChatResponse(BaseModel):
     reply: str
+    # Empty for answers from the cache, the FAQ index or a coalesced call: there is
+    # no conversation of the caller's own to continue, so the next message starts one
+    sessionId: str
+
+class SessionTurn(BaseModel):
+    role: str
+    content: str
+    timestamp: datetime
+
+class SessionInfo(BaseModel):
+    sessionId: str
+    title: str
+    createdAt: datetime
+    lastActive: datetime
+    turnCount: int
+    recentTurns: List[SessionTurn]
+
+class ConversationMessage(BaseModel):
+    id: str
+    sessionId: str
+    role: str
+    content: str
+    timestamp: datetime
+    attachmentIds: List[str] = []
+
+class ConversationMessagePage(BaseModel):
+    messages: List[ConversationMessage]
+    olderCursor: Optional[str] = None  # pass as ?before= to load older messages
+    newestCursor: Optional[str] = None  # pass as ?after= to fetch only newer messages
+
+class ConversationSummary(BaseModel):
     sessionId: str
+    title: str
+    lastMessage: str
+    messageCount: int
+    createdAt: datetime
+    updatedAt: datetime
+
+class AttachmentInfo(BaseModel):
+    id: str
+    filename: str
+    contentType: str
+    size: int
+    sha256: str
+    status: str  # ready, unsupported (stored, no text) or failed
+    textChars: int
+    createdAt: datetime
+
+class FaqEntry(BaseModel):
+    id: str
+    question: str
+    variants: List[str] = []  # other phrasings of the question, matched like it
+    answer: str
+    active: bool
+    updatedAt: datetime
+
+class FaqEntryUpdate(BaseModel):
+    question: str = Field(min_length=1)
+    answer: str = Field(min_length=1)
+    variants: List[str] = []
+    active: bool = True
+
+class FaqMatch(BaseModel):
+    id: str
+    question: str
+    score: float
+    answered: bool  # at or above FAQ_MIN_SCORE
+
+class ChatBatchRequest(BaseModel):
+    items: List[ChatMessage]
+    label: Optional[str] = None
+    concurrency: int = Field(BATCH_CONCURRENCY, ge=1, le=BATCH_MAX_CONCURRENCY)
+    bypassCache: bool = True  # evaluate fresh answers rather than cached ones
+
+class BatchRun(BaseModel):
+    runId: str
+    label: Optional[str] = None
+    status: str
+    total: int
+    succeeded: int
+    failed: int
+    bypassCache: bool
+    createdAt: datetime
+    finishedAt: Optional[datetime] = None
+
+class BatchResult(BaseModel):
+    index: int
+    message: str
+    status: str
+    reply: Optional[str] = None
+    error: Optional[str] = None
+    latencyMs: float
+
+class BatchRunDetail(BatchRun):
+    results: List[BatchResult]
+
+class BatchDiffEntry(BaseModel):
+    message: str
+    before: Optional[str] = None
+    after: Optional[str] = None
+    beforeStatus: str
+    afterStatus: str
+
+class BatchDiff(BaseModel):
+    base: str
+    target: str
+    unchanged: int
+    changed: List[BatchDiffEntry]
+    onlyInBase: List[str]
+    onlyInTarget: List[str]
 
 # Add your routes to the router instead of directly to app
 @api_router.get("/")
 async def root():
     return {"message": "Hello World"}
 
-@api_router.post("/chat", response_model=ChatResponse)
-async def chat_with_agentspace(chat_request: ChatMessage):
+def encode_cursor(timestamp: datetime, doc_id: str) -> str:
+    raw = f"{timestamp.isoformat()}|{doc_id}".encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii')
+
+def decode_cursor(cursor: str) -> Tuple[datetime, str]:
     try:
-        user_message = chat_request.message
-        session_id = chat_request.sessionId
-        
-        # Create client to connect to Discovery Engine
-        agentspace_client = ConversationalSearchServiceClient()
-        
-        # Define the conversation name
-        if session_id:
-            # Use existing conversation
-            conversation_name = session_id
-        else:
-            # Auto session mode - creates new conversation
-            conversation_name = f"projects/{PROJECT_NUMBER}/locations/{LOCATION}/collections/default_collection/dataStores/{ENGINE_ID}/conversations/-"
-        
-        # Create a request
-        request_body = discoveryengine.ConverseConversationRequest(
-            name=conversation_name,
-            query=discoveryengine.TextInput(input=user_message),
-        )
+        raw = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8')
+        timestamp, doc_id = raw.split('|', 1)
+        return datetime.fromisoformat(timestamp), doc_id
+    except (ValueError, UnicodeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+async def ask_agentspace(user_message: str, session_id: Optional[str]) -> ChatResponse:
+    # Define the conversation name
+    if session_id:
+        # Use existing conversation
+        conversation_name = session_id
+    else:
+        # Auto session mode - creates new conversation
+        conversation_name = f"projects/{PROJECT_NUMBER}/locations/{LOCATION}/collections/default_collection/dataStores/{ENGINE_ID}/conversations/-"
+    
+    # Create a request
+    request_body = await agentspace.conversation_request(conversation_name, user_message)
 
-        # Send request and get response
-        response = agentspace_client.converse_conversation(request=request_body)
+    # Send request and get response without blocking the event loop
+    response = await agentspace.converse(request_body, idempotent=not session_id)
 
-        # Extract response information
+    # Extract response information
+    with agentspace_stage_duration.time("serialize"):
         agent_reply = response.reply.summary.summary_text if response.reply.summary else "No response available"
         new_session_id = response.conversation.name
-
         return ChatResponse(reply=agent_reply, sessionId=new_session_id)
-        
+
+def header_flag(value: Optional[str]) -> bool:
+    return value is not None and value.strip().lower() not in ('', '0', 'false', 'no')
+
+async def require_admin(authorization: Optional[str] = Header(None)):
+    """Dependency for admin endpoints: `Authorization: Bearer <ADMIN_TOKEN>`."""
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    scheme, _, token = (authorization or "").partition(" ")
+    if scheme.lower() != "bearer" or not secrets.compare_digest(token.strip().encode(), ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=401, detail="Admin token required", headers={"WWW-Authenticate": "Bearer"})
+
+async def open_session(chat_response: ChatResponse, user_message: str) -> ChatResponse:
+    # Swap the conversation name for a short session token
+    try:
+        token = await session_registry.create(chat_response.sessionId, title=user_message)
+    except Exception as e:
+        logger.error(f"Failed to register session, returning conversation name: {e}")
+        return chat_response
+    return ChatResponse(reply=chat_response.reply, sessionId=token)
+
+async def continue_session(user_message: str, session_id: str) -> ChatResponse:
+    if is_legacy_session(session_id):
+        return await ask_agentspace(user_message, session_id)
+    # Unknown tokens are rejected here, without an upstream round-trip
+    conversation_name = await session_registry.conversation_for(session_id)
+    chat_response = await ask_agentspace(user_message, conversation_name)
+    return ChatResponse(reply=chat_response.reply, sessionId=session_id)
+
+@tracer.traced("ask_agentspace_cached")
+async def ask_agentspace_cached(user_message: str, session_id: Optional[str], bypass_cache: bool = False,
+                                open_sessions: bool = True) -> Tuple[ChatResponse, Optional[str]]:
+    # Only session-less questions are answered from the FAQ index, cached or
+    # coalesced. Answers served from any of them carry an empty sessionId so
+    # a follow-up starts its own conversation instead of joining someone else's.
+    # Without open_sessions, new conversations are not registered either and
+    # every answer comes back without a sessionId.
+    if session_id:
+        return await continue_session(user_message, session_id), None
+
+    if bypass_cache:
+        answer_cache.record_bypass()
+        chat_response = await ask_agentspace(user_message, session_id)
+        return await open_session(chat_response, user_message), "BYPASS"
+
+    if FAQ_INDEX:
+        with tracer.span("faq_lookup") as span:
+            faq = faq_index.match(user_message)
+            span.set_attribute("faq.hit", faq is not None)
+        if faq is not None:
+            return ChatResponse(reply=faq["answer"], sessionId=""), "FAQ"
+
+    cache_key = answer_cache.key_for(user_message)
+    cached_reply = await answer_cache.get(cache_key)
+    if cached_reply is not None:
+        return ChatResponse(reply=cached_reply, sessionId=""), "HIT"
+
+    try:
+        chat_response, shared = await single_flight.do(
+            single_flight.key_for(user_message), lambda: ask_agentspace(user_message, session_id)
+        )
+    except CircuitOpen:
+        # Upstream is unhealthy; an expired answer beats an error
+        stale_reply = answer_cache.get_stale(cache_key)
+        if stale_reply is None:
+            raise
+        return ChatResponse(reply=stale_reply, sessionId=""), "STALE"
+    if shared:
+        # The conversation belongs to the caller that made the upstream call
+        return ChatResponse(reply=chat_response.reply, sessionId=""), "COALESCED"
+
+    if chat_response.reply != "No response available":
+        await answer_cache.set(cache_key, chat_response.reply)
+    if not open_sessions:
+        return ChatResponse(reply=chat_response.reply, sessionId=""), "MISS"
+    return await open_session(chat_response, user_message), "MISS"
+
+async def question_with_attachments(chat_request: ChatMessage) -> str:
+    """The message followed by the extracted text of its attachments."""
+    if not chat_request.attachmentIds:
+        return chat_request.message
+    try:
+        docs = await attachment_store.get_many(chat_request.attachmentIds)
+    except AttachmentNotFound as e:
+        raise HTTPException(status_code=400, detail=f"Unknown attachment {e}")
+    return chat_request.message + attachment_context(docs)
+
+@tracer.traced("record_turn")
+async def record_turn(chat_request: ChatMessage, chat_response: ChatResponse, asked_at: datetime):
+    # Cached answers have no conversation to attach to
+    if not chat_response.sessionId:
+        return
+    try:
+        await conversation_store.append_turn(
+            chat_response.sessionId, chat_request.message, chat_response.reply, asked_at, chat_request.attachmentIds
+        )
+        if not is_legacy_session(chat_response.sessionId):
+            await session_registry.record_turn(chat_response.sessionId, chat_request.message, chat_response.reply, asked_at)
     except Exception as e:
-        logger.error(f"Agentspace API error: {e}")
-        raise HTTPException(status_code=500, detail="Failed to get response from Agentspace")
+        logger.error(f"Failed to store chat turn: {e}")
+
+@api_router.post("/chat", response_model=ChatResponse)
+@tracer.traced("chat_with_agentspace")
+async def chat_with_agentspace(chat_request: ChatMessage, x_cache_bypass: Optional[str] = Header(None)):
+    """Answer one chat message.
+
+    Session-less questions may be answered without a new conversation; the
+    `X-Cache` header says how (MISS, HIT, STALE, COALESCED, FAQ or BYPASS).
+    Only MISS and BYPASS answers come with a sessionId to follow up on.
+    """
+    lifecycle.check_accepting()
+    admission.check("session", chat_request.sessionId)
+    question = await question_with_attachments(chat_request)
+    try:
+        with lifecycle.track():
+            asked_at = datetime.utcnow()
+            # Answers depend on the attachments, so those never use the shared cache
+            chat_response, cache_status = await ask_agentspace_cached(
+                question, chat_request.sessionId,
+                bypass_cache=header_flag(x_cache_bypass) or bool(chat_request.attachmentIds),
+            )
+            await record_turn(chat_request, chat_response, asked_at)
+            return model_response(chat_response, ChatResponse, headers={"X-Cache": cache_status} if cache_status else None)
+    except SessionNotFound:
+        raise HTTPException(status_code=404, detail="Unknown or expired session")
+    except CircuitOpen as e:
+        logger.warning(f"Agentspace circuit open: {e}")
+        raise HTTPException(
+            status_code=503,
+            detail="Agentspace is temporarily unavailable",
+            headers={"Retry-After": str(math.ceil(e.retry_after))},
+        )
+    except agentspace.AgentspaceBusy as e:
+        logger.warning(f"Agentspace busy: {e}")
+        raise HTTPException(status_code=503, detail="Agentspace is busy", headers={"Retry-After": "1"})
+    except agentspace.AgentspaceTimeout as e:
+        logger.error(f"Agentspace timeout: {e}")
+        raise HTTPException(status_code=504, detail="Agentspace request timed out")
+    except Exception as e:
+        # Keep the original error on the trace and in the log; the client only gets a generic 500
+        record_exception(e)
+        logger.error(f"Agentspace API error: {e!r}", exc_info=True)
+        raise HTTPException(status_code=500, detail="Failed to get response from Agentspace") from e
+
+def sse_event(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def iter_reply_chunks(reply: str, words_per_chunk: int = 5):
+    words = re.findall(r'\S+\s*', reply)
+    for i in range(0, len(words), words_per_chunk):
+        yield ''.join(words[i:i + words_per_chunk])
+
+@api_router.post("/chat/stream")
+async def chat_with_agentspace_stream(chat_request: ChatMessage, x_cache_bypass: Optional[str] = Header(None)):
+    """Server-Sent Events variant of /chat.
+
+    Emits `status` events as soon as the request is accepted and while the
+    upstream call is running, then the reply as `delta` chunks, and finally
+    a `done` event carrying the same payload as ChatResponse.
+    """
+    lifecycle.check_accepting()
+    admission.check("session", chat_request.sessionId)
+    question = await question_with_attachments(chat_request)
+
+    async def event_stream():
+        yield sse_event("status", {"stage": "understanding"})
+        asked_at = datetime.utcnow()
+        task = asyncio.create_task(ask_agentspace_cached(
+            question, chat_request.sessionId,
+            bypass_cache=header_flag(x_cache_bypass) or bool(chat_request.attachmentIds),
+        ))
+        try:
+            while not task.done():
+                done, _ = await asyncio.wait({task}, timeout=SSE_HEARTBEAT_SECONDS)
+                if not done:
+                    yield ": keepalive\n\n"
+            chat_response, _ = task.result()
+        except SessionNotFound:
+            yield sse_event("error", {"status": 404, "detail": "Unknown or expired session"})
+            return
+        except CircuitOpen as e:
+            logger.warning(f"Agentspace circuit open: {e}")
+            yield sse_event("error", {
+                "status": 503, "detail": "Agentspace is temporarily unavailable", "retryAfter": math.ceil(e.retry_after),
+            })
+            return
+        except agentspace.AgentspaceBusy as e:
+            logger.warning(f"Agentspace busy: {e}")
+            yield sse_event("error", {"status": 503, "detail": "Agentspace is busy", "retryAfter": 1})
+            return
+        except agentspace.AgentspaceTimeout as e:
+            logger.error(f"Agentspace timeout: {e}")
+            yield sse_event("error", {"status": 504, "detail": "Agentspace request timed out"})
+            return
+        except Exception as e:
+            record_exception(e)
+            logger.error(f"Agentspace API error: {e!r}", exc_info=True)
+            yield sse_event("error", {"status": 500, "detail": "Failed to get response from Agentspace"})
+            return
+        finally:
+            # The client went away before the upstream answered
+            if not task.done():
+                task.cancel()
+
+        yield sse_event("status", {"stage": "typing"})
+        for chunk in iter_reply_chunks(chat_response.reply):
+            yield sse_event("delta", {"text": chunk})
+        await record_turn(chat_request, chat_response, asked_at)
+        yield sse_event("done", chat_response.model_dump())
+
+    return StreamingResponse(
+        lifecycle.tracked(event_stream()),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+def ndjson_line(data: dict) -> str:
+    return json.dumps(data) + "\n"
+
+def batch_error_detail(error: Exception) -> str:
+    if isinstance(error, SessionNotFound):
+        return "Unknown or expired session"
+    if isinstance(error, CircuitOpen):
+        return "Agentspace is temporarily unavailable"
+    if isinstance(error, agentspace.AgentspaceBusy):
+        return "Agentspace is busy"
+    if isinstance(error, agentspace.AgentspaceTimeout):
+        return "Agentspace request timed out"
+    record_exception(error)
+    logger.error(f"Agentspace API error in batch: {error!r}", exc_info=error)
+    return "Failed to get response from Agentspace"
+
+async def store_batch_results(run: dict, results: List[dict], status: Optional[str] = None):
+    # Storage problems must not abort a run whose answers are still streaming
+    try:
+        await batch_store.add_results(run["_id"], results)
+        if status:
+            await batch_store.finish_run(run, status)
+    except Exception as e:
+        logger.error(f"Failed to store batch run {run['_id']}: {e}")
+
+def batch_run_model(run: dict) -> BatchRun:
+    return BatchRun(
+        runId=run["_id"],
+        label=run.get("label"),
+        status=run["status"],
+        total=run["total"],
+        succeeded=run["succeeded"],
+        failed=run["failed"],
+        bypassCache=run.get("bypass_cache", True),
+        createdAt=run["created_at"],
+        finishedAt=run.get("finished_at"),
+    )
+
+@api_router.post("/chat/batch")
+async def chat_batch(batch: ChatBatchRequest):
+    """Answer many questions with bounded parallelism, streamed back as NDJSON.
+
+    The first line describes the run, then one `result` line per question in
+    completion order (carrying its `index` in the request), then a `summary`.
+    Items sharing a sessionId run one after another, in request order.
+    Results are stored so runs can be compared with /api/chat/batch/diff.
+    """
+    lifecycle.check_accepting()
+    if not batch.items:
+        raise HTTPException(status_code=400, detail="No items to run")
+    if len(batch.items) > BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"At most {BATCH_MAX_ITEMS} items per batch")
+    run = await batch_store.start_run(batch.label, len(batch.items), batch.bypassCache)
+
+    async def answer(item: ChatMessage) -> str:
+        # Evaluation runs stay out of the chat history and the session registry
+        if item.sessionId:
+            return (await continue_session(item.message, item.sessionId)).reply
+        if batch.bypassCache:
+            return (await ask_agentspace(item.message, None)).reply
+        chat_response, _ = await ask_agentspace_cached(item.message, None, open_sessions=False)
+        return chat_response.reply
+
+    async def result_lines():
+        yield ndjson_line({"type": "run", "runId": run["_id"], "label": run["label"], "total": run["total"]})
+        started = time.perf_counter()
+        pending, status = [], "cancelled"
+        try:
+            # Turns of one session run in order, so each follows up on the one before it
+            async with aclosing(run_bounded(batch.items, answer, batch.concurrency,
+                                            key=lambda item: item.sessionId or None)) as results:
+                async for index, reply, error, seconds in results:
+                    detail = batch_error_detail(error) if error else None
+                    result = result_document(index, batch.items[index].message, reply, detail, seconds)
+                    run["failed" if error else "succeeded"] += 1
+                    pending.append(result)
+                    if len(pending) >= BATCH_WRITE_CHUNK:
+                        await store_batch_results(run, pending)
+                        pending = []
+                    yield ndjson_line({
+                        "type": "result", "index": index, "message": result["message"], "status": result["status"],
+                        "reply": reply, "error": detail, "latencyMs": result["latency_ms"],
+                    })
+            status = "completed"
+        finally:
+            # Also runs when the client goes away or the worker drains mid-run
+            await asyncio.shield(store_batch_results(run, pending, status))
+        yield ndjson_line({
+            "type": "summary", "runId": run["_id"], "total": run["total"], "succeeded": run["succeeded"],
+            "failed": run["failed"], "durationMs": round(1000 * (time.perf_counter() - started), 1),
+        })
+
+    return StreamingResponse(lifecycle.tracked(result_lines()), media_type="application/x-ndjson")
+
+@api_router.get("/chat/batch/runs", response_model=List[BatchRun])
+async def list_batch_runs(limit: int = Query(HISTORY_PAGE_SIZE, ge=1, le=HISTORY_PAGE_MAX)):
+    return [batch_run_model(run) for run in await batch_store.list_runs(limit)]
+
+@api_router.get("/chat/batch/runs/{run_id}", response_model=BatchRunDetail)
+async def get_batch_run(run_id: str):
+    run = await batch_store.get_run(run_id)
+    if run is None:
+        raise HTTPException(status_code=404, detail="Unknown batch run")
+    results = [
+        BatchResult(index=doc["index"], message=doc["message"], status=doc["status"], reply=doc.get("reply"),
+                    error=doc.get("error"), latencyMs=doc["latency_ms"])
+        for doc in await batch_store.list_results(run_id)
+    ]
+    return BatchRunDetail(**batch_run_model(run).model_dump(), results=results)
+
+@api_router.get("/chat/batch/diff", response_model=BatchDiff)
+async def diff_batch_runs(base: str, target: str):
+    """Questions whose answer or outcome differs between two runs."""
+    for run_id in (base, target):
+        if await batch_store.get_run(run_id) is None:
+            raise HTTPException(status_code=404, detail=f"Unknown batch run {run_id}")
+    return BatchDiff(base=base, target=target, **await batch_store.diff(base, target))
+
+def attachment_info(doc: dict) -> AttachmentInfo:
+    return AttachmentInfo(
+        id=doc["_id"],
+        filename=doc["filename"],
+        contentType=doc["content_type"],
+        size=doc["size"],
+        sha256=doc["sha256"],
+        status=doc["status"],
+        textChars=doc["text_chars"],
+        createdAt=doc["created_at"],
+    )
+
+@api_router.post("/attachments", response_model=List[AttachmentInfo])
+async def upload_attachments(request: Request):
+    """Store the files of a multipart/form-data upload and extract their text.
+
+    The body is parsed as it arrives and written to GridFS chunk by chunk,
+    so oversized files are rejected with 413 as soon as they cross the
+    limit. Pass the returned ids as `attachmentIds` on /api/chat.
+    """
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > ATTACHMENT_MAX_FILES * ATTACHMENT_MAX_BYTES + 65536:
+        raise HTTPException(status_code=413, detail="Upload too large")
+    try:
+        docs = await attachment_store.save_upload(request.headers.get("content-type"), request.stream())
+    except UploadRejected as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    return [attachment_info(doc) for doc in docs]
+
+@api_router.get("/attachments/{attachment_id}", response_model=AttachmentInfo)
+async def get_attachment(attachment_id: str):
+    try:
+        return attachment_info(await attachment_store.get(attachment_id))
+    except AttachmentNotFound:
+        raise HTTPException(status_code=404, detail="Unknown attachment")
+
+def content_disposition(filename: str) -> str:
+    """Attachment header with an ASCII filename for old clients and the exact one per RFC 5987."""
+    stem, extension = (
+        re.sub(r'[^\x20-\x7e]|["\\]', "_", unicodedata.normalize("NFKD", part).encode("ascii", "ignore").decode("ascii"))
+        for part in os.path.splitext(filename)
+    )
+    fallback = (stem.strip() or "download") + extension
+    if fallback == filename:
+        return f'attachment; filename="{filename}"'
+    return f'attachment; filename="{fallback}"; filename*=UTF-8\'\'{quote(filename, safe="")}'
+
+@api_router.get("/attachments/{attachment_id}/content")
+async def download_attachment(attachment_id: str):
+    try:
+        doc, grid_out = await attachment_store.open_content(attachment_id)
+    except AttachmentNotFound:
+        raise HTTPException(status_code=404, detail="Unknown attachment")
+
+    async def chunks():
+        while chunk := await grid_out.readchunk():
+            yield chunk
+
+    return StreamingResponse(chunks(), media_type=doc["content_type"], headers={
+        "Content-Length": str(doc["size"]),
+        "Content-Disposition": content_disposition(doc["filename"]),
+    })
+
+@api_router.get("/sessions/{session_id}", response_model=SessionInfo)
+async def get_session(session_id: str):
+    """Session metadata and recent turns, served from the registry without calling Agentspace."""
+    try:
+        session = await session_registry.get(session_id)
+    except SessionNotFound:
+        raise HTTPException(status_code=404, detail="Unknown or expired session")
+    return model_response(SessionInfo(
+        sessionId=session_id,
+        title=session["title"],
+        createdAt=session["created_at"],
+        lastActive=session["last_active"],
+        turnCount=session.get("turn_count", 0),
+        recentTurns=[SessionTurn(**turn) for turn in session.get("turns", [])],
+    ), SessionInfo)
+
+@api_router.get("/conversations", response_model=List[ConversationSummary])
+async def list_conversations(sessionId: List[str] = Query([])):
+    """Summaries of the caller's own conversations, most recently active first.
+
+    Pass every sessionId the client holds as a repeated `sessionId`
+    parameter; unknown ones are left out. Other users' conversations are
+    never listed.
+    """
+    if not sessionId:
+        raise HTTPException(status_code=400, detail="Pass the sessionIds to list")
+    if len(sessionId) > HISTORY_PAGE_MAX:
+        raise HTTPException(status_code=400, detail=f"At most {HISTORY_PAGE_MAX} sessionIds per request")
+    conversations = await conversation_store.list_conversations(sessionId)
+    return model_response([
+        ConversationSummary(
+            sessionId=doc["session_id"],
+            title=doc["title"],
+            lastMessage=doc.get("last_message", ""),
+            messageCount=doc.get("message_count", 0),
+            createdAt=doc["created_at"],
+            updatedAt=doc["updated_at"],
+        )
+        for doc in conversations
+    ], List[ConversationSummary])
+
+@api_router.get("/conversations/messages", response_model=ConversationMessagePage)
+async def get_conversation_messages(
+    sessionId: str,
+    limit: int = Query(HISTORY_PAGE_SIZE, ge=1, le=HISTORY_PAGE_MAX),
+    before: Optional[str] = None,
+    after: Optional[str] = None,
+):
+    """Chronological page of a conversation's messages.
+
+    Without cursors this is the latest page. `before` loads older messages
+    and `after` returns only messages newer than a previously seen page.
+    """
+    if before and after:
+        raise HTTPException(status_code=400, detail="Use either before or after, not both")
+    docs, has_more = await conversation_store.list_messages(
+        sessionId,
+        limit,
+        before=decode_cursor(before) if before else None,
+        after=decode_cursor(after) if after else None,
+    )
+
+    messages = [
+        ConversationMessage(
+            id=doc["id"], sessionId=doc["session_id"], role=doc["role"], content=doc["content"], timestamp=doc["timestamp"],
+            attachmentIds=doc.get("attachment_ids", []),
+        )
+        for doc in docs
+    ]
+    page = ConversationMessagePage(messages=messages, newestCursor=after)
+    if docs:
+        page.newestCursor = encode_cursor(docs[-1]["timestamp"], docs[-1]["id"])
+        if has_more and not after:
+            page.olderCursor = encode_cursor(docs[0]["timestamp"], docs[0]["id"])
+    return model_response(page, ConversationMessagePage)
+
+@api_router.get("/health/live")
+async def liveness():
+    """The process is up and its event loop is responsive."""
+    return {"status": "ok"}
+
+@api_router.get("/health/ready")
+async def readiness():
+    """Whether this worker should receive traffic.
+
+    Not ready before startup has finished, once draining has begun, or while
+    MongoDB does not answer a ping. An open Agentspace breaker is reported
+    but does not fail the check, since every worker shares the same upstream.
+    """
+    checks = {"accepting": lifecycle.ready, "draining": lifecycle.draining}
+    try:
+        await asyncio.wait_for(client.admin.command("ping"), timeout=READINESS_MONGO_TIMEOUT)
+        checks["mongo"] = "ok"
+    except Exception as e:
+        checks["mongo"] = f"error: {e.__class__.__name__}"
+    checks["agentspace"] = {"pool_started": agentspace.pool.started, "breaker": agentspace.breaker.state}
+
+    ready = lifecycle.ready and checks["mongo"] == "ok"
+    return JSONResponse(status_code=200 if ready else 503, content={"status": "ready" if ready else "unavailable", "checks": checks})
+
+@api_router.get("/agentspace/pool")
+async def get_agentspace_pool_metrics():
+    return agentspace.pool.metrics()
+
+@api_router.get("/chat/cache")
+async def get_answer_cache_metrics():
+    return answer_cache.metrics()
+
+@api_router.get("/chat/singleflight")
+async def get_single_flight_metrics():
+    return single_flight.metrics()
+
+def faq_entry(doc: dict) -> FaqEntry:
+    return FaqEntry(
+        id=doc["_id"],
+        question=doc["question"],
+        variants=doc.get("variants", []),
+        answer=doc["answer"],
+        active=doc.get("active", True),
+        updatedAt=doc["updated_at"],
+    )
+
+@api_router.get("/faqs", response_model=List[FaqEntry], dependencies=[Depends(require_admin)])
+async def list_faqs():
+    """Every curated HR FAQ entry, retired ones included."""
+    return model_response([faq_entry(doc) for doc in await faq_index.list()], List[FaqEntry])
+
+@api_router.put("/faqs/{faq_id}", response_model=FaqEntry, dependencies=[Depends(require_admin)])
+async def put_faq(faq_id: str, update: FaqEntryUpdate):
+    """Create or replace an entry; this worker reindexes at once, others within FAQ_REFRESH_INTERVAL."""
+    doc = await faq_index.upsert(
+        faq_id, update.question.strip(), update.answer.strip(),
+        [variant.strip() for variant in update.variants if variant.strip()], update.active,
+    )
+    return model_response(faq_entry(doc), FaqEntry)
+
+@api_router.delete("/faqs/{faq_id}", status_code=204, dependencies=[Depends(require_admin)])
+async def retire_faq(faq_id: str):
+    """Stop answering from an entry; it stays in the collection with active=false."""
+    if not await faq_index.retire(faq_id):
+        raise HTTPException(status_code=404, detail="Unknown or already retired FAQ")
+
+@api_router.get("/faqs/match", response_model=List[FaqMatch], dependencies=[Depends(require_admin)])
+async def match_faqs(q: str = Query(..., min_length=1), limit: int = Query(5, ge=1, le=50)):
+    """Best-scoring entries for a question, for tuning FAQ_MIN_SCORE and the variants."""
+    return model_response([
+        FaqMatch(**candidate, answered=candidate["score"] >= faq_index.min_score)
+        for candidate in faq_index.search(q, limit)
+    ], List[FaqMatch])
+
+@api_router.post("/faqs/reindex", dependencies=[Depends(require_admin)])
+async def reindex_faqs():
+    """Reload every entry and rebuild this worker's index."""
+    await faq_index.refresh(full=True)
+    return faq_index.metrics()
+
+def memory_traces() -> MemoryExporter:
+    if not isinstance(tracer.exporter, MemoryExporter):
+        raise HTTPException(status_code=404, detail="Traces are only kept in memory with TRACE_EXPORTER=memory")
+    return tracer.exporter
+
+@api_router.get("/traces", dependencies=[Depends(require_admin)])
+async def list_traces(limit: int = Query(TRACE_PAGE_SIZE, ge=1, le=TRACE_PAGE_MAX)):
+    """Most recent sampled traces, newest first, with their root span and duration."""
+    summaries = []
+    for spans in memory_traces().recent(limit):
+        root = next((span for span in spans if span.local_root), spans[0])
+        summaries.append({
+            "traceId": root.trace_id,
+            "name": root.name,
+            "start": root.start_ns / 1e9,
+            "durationMs": (root.end_ns - root.start_ns) / 1e6,
+            "spanCount": len(spans),
+            "error": any(span.status_code == STATUS_ERROR for span in spans),
+            "requestId": root.attributes.get("http.request_id"),
+        })
+    return summaries
+
+@api_router.get("/traces/{trace_id}", dependencies=[Depends(require_admin)])
+async def get_trace(trace_id: str, format: str = Query("json", pattern="^(json|otlp)$")):
+    """Every span of a trace, in start order; `format=otlp` returns OTLP/JSON for other tools."""
+    spans = memory_traces().get(trace_id.lower())
+    if spans is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired trace")
+    spans.sort(key=lambda span: span.start_ns)
+    if format == "otlp":
+        return otlp_json(spans)
+    return {"traceId": trace_id.lower(), "spans": [span.to_dict() for span in spans]}
 
 @api_router.post("/status", response_model=StatusCheck)
 async def create_status_check(input: StatusCheckCreate):
-    status_dict = input.dict()
+    status_dict = input.model_dump()
     status_obj = StatusCheck(**status_dict)
-    _ = await db.status_checks.insert_one(status_obj.dict())
-    return status_obj
+    if status_writer is not None:
+        # Write-behind: acknowledged once buffered, persisted (and rolled up) with the next batch
+        status_writer.add(status_obj.model_dump())
+    else:
+        status_doc = status_obj.model_dump()
+        with db_span("status_checks", "insert_one"):
+            _ = await db.status_checks.insert_one(status_doc)
+        status_rollups.record([status_doc])
+    return model_response(status_obj, StatusCheck)
+
+@api_router.post("/status/bulk", response_model=List[StatusCheck])
+async def create_status_checks_bulk(inputs: List[StatusCheckCreate]):
+    if len(inputs) > STATUS_BULK_MAX:
+        raise HTTPException(status_code=413, detail=f"At most {STATUS_BULK_MAX} status checks per request")
+    status_objs = [StatusCheck(**item.model_dump()) for item in inputs]
+    if status_objs:
+        status_docs = [status_obj.model_dump() for status_obj in status_objs]
+        with db_span("status_checks", "insert_many") as span:
+            span.set_attribute("db.mongodb.documents", len(status_docs))
+            _ = await db.status_checks.insert_many(status_docs, ordered=False)
+        status_rollups.record(status_docs)
+    return model_response(status_objs, List[StatusCheck])
+
+@api_router.get("/status/writer")
+async def get_status_writer_metrics():
+    return status_writer.metrics() if status_writer is not None else {"enabled": False}
+
+@api_router.get("/status/rollups", response_model=List[StatusRollup])
+async def get_status_rollups(
+    granularity: str = Query("minute", pattern="^(minute|hour)$"),
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    client_name: Optional[str] = None,
+    limit: int = Query(STATUS_ROLLUP_PAGE_SIZE, ge=1, le=STATUS_ROLLUP_PAGE_MAX),
+):
+    """Check counts and last-seen time per client and minute or hour bucket, oldest first.
+
+    Defaults to the last hour of minute buckets or the last day of hour
+    buckets. Served from pre-aggregated rollups, never from raw checks.
+    """
+    until = until or datetime.utcnow()
+    since = since or until - (timedelta(hours=1) if granularity == "minute" else timedelta(days=1))
+    with db_span("status_rollups", "aggregate"):
+        rows = await status_rollups.buckets(granularity, since, until, client_name, limit)
+    return model_response([StatusRollup(**row) for row in rows], List[StatusRollup])
+
+@api_router.get("/status/clients", response_model=List[StatusClientSummary])
+async def get_status_clients(
+    granularity: str = Query("hour", pattern="^(minute|hour)$"),
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+):
+    """Total checks and last-seen time per client over a range (default: the last day), busiest first."""
+    until = until or datetime.utcnow()
+    since = since or until - timedelta(days=1)
+    with db_span("status_rollups", "aggregate"):
+        rows = await status_rollups.clients(granularity, since, until)
+    return model_response([StatusClientSummary(**row) for row in rows], List[StatusClientSummary])
 
 @api_router.get("/status", response_model=List[StatusCheck])
-async def get_status_checks():
-    status_checks = await db.status_checks.find().to_list(1000)
-    return [StatusCheck(**status_check) for status_check in status_checks]
+async def get_status_checks(
+    limit: int = Query(STATUS_PAGE_SIZE, ge=1, le=STATUS_PAGE_MAX),
+    cursor: Optional[str] = None,
+    client_name: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+):
+    """Newest-first page of status checks.
+
+    Pass the X-Next-Cursor response header back as `cursor` to fetch the
+    next (older) page; the header is absent on the last page.
+    """
+    query = {}
+    if client_name:
+        query["client_name"] = client_name
+    if since or until:
+        query["timestamp"] = {}
+        if since:
+            query["timestamp"]["$gte"] = since
+        if until:
+            query["timestamp"]["$lt"] = until
+    if cursor:
+        cursor_timestamp, cursor_id = decode_cursor(cursor)
+        query["$or"] = [
+            {"timestamp": {"$lt": cursor_timestamp}},
+            {"timestamp": cursor_timestamp, "id": {"$lt": cursor_id}},
+        ]
+
+    with db_span("status_checks", "find") as span:
+        status_checks = await db.status_checks.find(query, STATUS_PROJECTION) \
+            .sort([("timestamp", -1), ("id", -1)]) \
+            .limit(limit + 1) \
+            .to_list(limit + 1)
+        span.set_attribute("db.mongodb.documents", len(status_checks))
+
+    headers = {}
+    if len(status_checks) > limit:
+        status_checks = status_checks[:limit]
+        last = status_checks[-1]
+        headers["X-Next-Cursor"] = encode_cursor(last["timestamp"], last["id"])
+
+    # Documents are written from StatusCheck and projected to its fields, so
+    # orjson encodes them as they come from the driver, datetimes included
+    return FastJSONResponse(content=status_checks, headers=headers)
 
 # Include the router in the main app
 app.include_router(api_router)
 
+# Inside CORS so that rejections still carry the CORS headers
+app.add_middleware(AdmissionMiddleware, controller=admission, paths=CHAT_PATHS, batch_paths=BATCH_PATHS)
+
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
@@ -116,13 +1011,133 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Compresses complete bodies above COMPRESSION_MIN_BYTES; streams pass through
+app.add_middleware(CompressionMiddleware)
+
+# Server span per request plus X-Request-ID and traceparent response headers
+app.add_middleware(TracingMiddleware, tracer=tracer)
+
+# Outermost, so latency includes every other middleware
+app.add_middleware(MetricsMiddleware)
+
+@app.exception_handler(Draining)
+async def draining_handler(request, exc):
+    # Ask the client to retry on a fresh connection, which lands on another worker
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Server is shutting down"},
+        headers={"Retry-After": "1", "Connection": "close"},
+    )
+
+@app.exception_handler(Rejected)
+async def rejected_handler(request, exc):
+    return JSONResponse(status_code=429, content={"detail": exc.reason}, headers=rejection_headers(exc.retry_after))
+
+# Expose component counters alongside the request metrics; per-process
+# resources register theirs in open_resources()
+registry.add_collector("agentspace_pool", agentspace.pool.metrics)
+registry.add_collector("agentspace", agentspace.resilience_metrics)
+registry.add_collector("agentspace_scheduler", agentspace.scheduler.metrics)
+registry.add_collector("single_flight", single_flight.metrics)
+registry.add_collector("lifecycle", lifecycle.metrics)
+registry.add_collector("admission", admission.metrics)
+registry.add_collector("tracing", tracer.metrics)
+
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    format='%(asctime)s - %(name)s - %(levelname)s - [%(request_id)s] %(message)s'
 )
+# Tag every line with the X-Request-ID of the request that logged it
+for handler in logging.getLogger().handlers:
+    handler.addFilter(RequestIdFilter())
 logger = logging.getLogger(__name__)
 
-@app.on_event("shutdown")
-async def shutdown_db_client():
-    client.close()
\ No newline at end of file
+def open_resources():
+    global client, db, status_writer, status_rollups, session_registry, conversation_store, batch_store, attachment_store, answer_cache, faq_index
+    client = AsyncIOMotorClient(mongo_url, event_listeners=[MongoCommandTimer()])
+    db = client[os.environ['DB_NAME']]
+
+    # Per-client status check counts by minute and hour
+    status_rollups = StatusRollups(db)
+
+    # Coalesces POST /api/status inserts when STATUS_WRITE_BEHIND is enabled
+    status_writer = WriteBehindBuffer(
+        db.status_checks.with_options(write_concern=parse_write_concern(STATUS_WRITE_CONCERN)),
+        on_flushed=status_rollups.record,
+    ) if STATUS_WRITE_BEHIND else None
+
+    # Short opaque session tokens handed out as sessionId
+    session_registry = SessionRegistry(db.chat_sessions)
+
+    # Server-side chat history keyed by sessionId
+    conversation_store = ConversationStore(db)
+
+    # Stored /api/chat/batch runs for comparing answers between runs
+    batch_store = BatchStore(db)
+
+    # Uploaded files (GridFS) and their extracted text
+    attachment_store = AttachmentStore(db)
+
+    # Cache of Agentspace answers for session-less questions
+    answer_cache = AnswerCache(collection=db.answer_cache if ANSWER_CACHE_MONGO else None)
+
+    # Curated HR answers matched locally; only consulted for chats with FAQ_INDEX
+    faq_index = FaqIndex(db.hr_faqs, upstream_latency=agentspace.latency_tracker.mean)
+
+    if RATE_LIMIT_MONGO:
+        admission.share_through(db.rate_limits)
+
+    registry.add_collector("answer_cache", answer_cache.metrics)
+    registry.add_collector("session_registry", session_registry.metrics)
+    registry.add_collector("attachments", attachment_store.metrics)
+    registry.add_collector("status_rollups", status_rollups.metrics)
+    registry.add_collector("faq_index", faq_index.metrics)
+    if status_writer is not None:
+        registry.add_collector("status_writer", status_writer.metrics)
+
+async def create_indexes():
+    try:
+        await db.status_checks.create_index([("timestamp", -1), ("id", -1)])
+        await db.status_checks.create_index([("client_name", 1), ("timestamp", -1), ("id", -1)])
+        await status_rollups.ensure_indexes()
+        await status_rollups.ensure_retention()
+        await conversation_store.ensure_indexes()
+        await session_registry.ensure_indexes()
+        await batch_store.ensure_indexes()
+        await answer_cache.ensure_indexes()
+        await faq_index.ensure_indexes()
+        if admission.shared is not None:
+            await admission.shared.ensure_indexes()
+    except Exception as e:
+        logger.error(f"Index creation failed: {e}")
+
+async def startup_agentspace_pool():
+    if not agentspace.AGENTSPACE_PREWARM:
+        # Loaded and connected on the first chat request instead
+        return
+    try:
+        await agentspace.pool.start()
+    except Exception as e:
+        # Keep serving /api/status; the pool is retried on the first chat request
+        logger.error(f"Agentspace pool startup failed: {e}")
+
+async def close_resources():
+    # Normally already draining from SIGTERM; this covers other shutdown paths
+    lifecycle.begin_drain()
+    await lifecycle.wait_drained()
+    # Flush buffered status checks before the connection goes away
+    if status_writer is not None:
+        await status_writer.close()
+    await status_rollups.close()
+    await faq_index.close()
+    if admission.shared is not None:
+        await admission.shared.close()
+    attachment_store.close()
+    client.close()
+    await agentspace.pool.close()
+    tracer.close()
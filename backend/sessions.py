@@ -0,0 +1,117 @@
+import os
+import secrets
+import time
+from collections import OrderedDict
+from datetime import datetime
+from pymongo import ReturnDocument
+
+# Session registry settings
+SESSION_CACHE_SIZE = int(os.environ.get('SESSION_CACHE_SIZE', '10000'))
+SESSION_CACHE_IDLE = float(os.environ.get('SESSION_CACHE_IDLE', '900'))
+SESSION_RECENT_TURNS = int(os.environ.get('SESSION_RECENT_TURNS', '20'))
+SESSION_RETENTION_DAYS = int(os.environ.get('SESSION_RETENTION_DAYS', '30'))
+
+# Raw Agentspace conversation names still accepted as sessionId
+LEGACY_SESSION_PREFIX = "projects/"
+
+
+class SessionNotFound(Exception):
+    """Raised for a session token that is unknown or has expired."""
+
+
+def is_legacy_session(session_id: str) -> bool:
+    return session_id.startswith(LEGACY_SESSION_PREFIX)
+
+
+class SessionRegistry:
+    """Maps short opaque session tokens to Agentspace conversation names.
+
+    MongoDB (`chat_sessions`) is the source of truth, so any worker can
+    resolve any token; each worker keeps an LRU of recently used sessions
+    with idle eviction. The token -> conversation mapping never changes,
+    so it is always safe to serve from memory. Recent turns are refreshed
+    from MongoDB whenever this worker records one, so with sticky routing
+    by token they are exact and otherwise may lag other workers' writes.
+    """
+
+    def __init__(self, collection, max_entries: int = SESSION_CACHE_SIZE, idle_seconds: float = SESSION_CACHE_IDLE,
+                 recent_turns: int = SESSION_RECENT_TURNS):
+        self.collection = collection
+        self.max_entries = max_entries
+        self.idle_seconds = idle_seconds
+        self.recent_turns = recent_turns
+        self._entries = OrderedDict()
+        self.stats = {"hits": 0, "loads": 0, "not_found": 0, "created": 0, "evictions": 0}
+
+    async def ensure_indexes(self):
+        await self.collection.create_index("last_active", expireAfterSeconds=SESSION_RETENTION_DAYS * 86400)
+
+    async def create(self, conversation_name: str, title: str) -> str:
+        token = secrets.token_urlsafe(12)
+        now = datetime.utcnow()
+        doc = {
+            "_id": token,
+            "conversation_name": conversation_name,
+            "title": title[:80],
+            "created_at": now,
+            "last_active": now,
+            "turn_count": 0,
+            "turns": [],
+        }
+        await self.collection.insert_one(doc)
+        self._remember(token, doc)
+        self.stats["created"] += 1
+        return token
+
+    async def get(self, token: str) -> dict:
+        """Return the session document, from memory when possible; raises SessionNotFound."""
+        entry = self._entries.get(token)
+        if entry is not None and time.monotonic() - entry[1] < self.idle_seconds:
+            self._entries.move_to_end(token)
+            self._entries[token] = (entry[0], time.monotonic())
+            self.stats["hits"] += 1
+            return entry[0]
+
+        doc = await self.collection.find_one({"_id": token})
+        if doc is None:
+            self._entries.pop(token, None)
+            self.stats["not_found"] += 1
+            raise SessionNotFound(token)
+        self.stats["loads"] += 1
+        self._remember(token, doc)
+        return doc
+
+    async def conversation_for(self, token: str) -> str:
+        return (await self.get(token))["conversation_name"]
+
+    async def record_turn(self, token: str, user_message: str, reply: str, asked_at: datetime):
+        now = datetime.utcnow()
+        doc = await self.collection.find_one_and_update(
+            {"_id": token},
+            {
+                "$push": {"turns": {"$each": [
+                    {"role": "user", "content": user_message, "timestamp": asked_at},
+                    {"role": "bot", "content": reply, "timestamp": now},
+                ], "$slice": -self.recent_turns}},
+                "$set": {"last_active": now},
+                "$inc": {"turn_count": 1},
+            },
+            return_document=ReturnDocument.AFTER,
+        )
+        if doc is not None:
+            self._remember(token, doc)
+
+    def metrics(self) -> dict:
+        return {**self.stats, "cached": len(self._entries)}
+
+    def _remember(self, token: str, doc: dict):
+        now = time.monotonic()
+        self._entries[token] = (doc, now)
+        self._entries.move_to_end(token)
+        # Oldest entries sit at the front; drop them while idle or over capacity
+        while self._entries:
+            oldest_token, (_, last_used) = next(iter(self._entries.items()))
+            if len(self._entries) <= self.max_entries and now - last_used < self.idle_seconds:
+                break
+            del self._entries[oldest_token]
+            self.stats["evictions"] += 1
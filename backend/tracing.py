@@ -0,0 +1,395 @@
+import contextvars
+import functools
+import json
+import logging
+import os
+import random
+import re
+import threading
+import time
+import traceback
+from collections import OrderedDict
+from typing import Optional
+
+
+logger = logging.getLogger(__name__)
+
+# Fraction of requests traced; requests arriving with a sampled traceparent are always traced
+TRACE_SAMPLE_RATE = float(os.environ.get('TRACE_SAMPLE_RATE', '0.1'))
+# "memory" keeps recent traces for /api/traces, "file" appends OTLP/JSON lines to TRACE_FILE, "none" drops them.
+# Spans carry request details and error stack traces, so nothing is kept unless asked for
+TRACE_EXPORTER = os.environ.get('TRACE_EXPORTER', 'none').lower()
+# {pid} keeps the workers of a multi-process server in separate files
+TRACE_FILE = os.environ.get('TRACE_FILE', 'traces-{pid}.jsonl')
+TRACE_MEMORY_TRACES = int(os.environ.get('TRACE_MEMORY_TRACES', '500'))
+SERVICE_NAME = os.environ.get('SERVICE_NAME', 'agentspace-hr-backend')
+
+# OTLP span kinds and status codes
+KIND_INTERNAL, KIND_SERVER, KIND_CLIENT = 1, 2, 3
+STATUS_UNSET, STATUS_OK, STATUS_ERROR = 0, 1, 2
+
+_TRACEPARENT = re.compile(r'^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$')
+_REQUEST_ID = re.compile(r'^[\w.:@/+=-]{1,128}$')
+
+_current_span = contextvars.ContextVar("current_span", default=None)
+_request_id = contextvars.ContextVar("request_id", default="-")
+
+
+def _new_id(bits: int) -> str:
+    return f"{random.getrandbits(bits):0{bits // 4}x}"
+
+
+class Span:
+    """One timed operation; a no-op that only carries ids when its trace is not sampled."""
+
+    def __init__(self, tracer, name: str, trace_id: str, parent_id: Optional[str], sampled: bool,
+                 kind: int = KIND_INTERNAL, attributes: Optional[dict] = None, local_root: bool = False):
+        self.tracer = tracer
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = _new_id(64)
+        self.parent_id = parent_id
+        self.sampled = sampled
+        self.kind = kind
+        self.local_root = local_root
+        self.attributes = dict(attributes or {}) if sampled else {}
+        self.events = []
+        self.status_code = STATUS_UNSET
+        self.status_message = ""
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self._token = None
+
+    @property
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-{'01' if self.sampled else '00'}"
+
+    def set_attribute(self, key: str, value):
+        if self.sampled:
+            self.attributes[key] = value
+
+    def set_error(self, message: str):
+        self.status_code = STATUS_ERROR
+        self.status_message = message
+
+    def record_exception(self, error: BaseException):
+        """Attach the exception's type, message and stack trace, and mark the span failed."""
+        self.set_error(f"{type(error).__name__}: {error}")
+        if self.sampled:
+            self.events.append({
+                "name": "exception",
+                "time_ns": time.time_ns(),
+                "attributes": {
+                    "exception.type": f"{type(error).__module__}.{type(error).__qualname__}",
+                    "exception.message": str(error),
+                    "exception.stacktrace": "".join(traceback.format_exception(type(error), error, error.__traceback__)),
+                },
+            })
+
+    def end(self):
+        if self.end_ns is None:
+            self.end_ns = time.time_ns()
+            self.tracer._finish(self)
+
+    def __enter__(self):
+        self._token = _current_span.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc is not None:
+            status_code = getattr(exc, "status_code", None)
+            if status_code is not None:
+                # HTTPException: the handler already turned the failure into a response
+                if status_code >= 500:
+                    self.set_error(str(getattr(exc, "detail", exc)))
+            elif not isinstance(exc, GeneratorExit):
+                self.record_exception(exc)
+        try:
+            _current_span.reset(self._token)
+        except ValueError:
+            # Exited from another context, e.g. an async generator closed by the GC
+            pass
+        self.end()
+        return False
+
+    def to_dict(self) -> dict:
+        return {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "parentSpanId": self.parent_id,
+            "name": self.name,
+            "kind": self.kind,
+            "start": self.start_ns / 1e9,
+            "durationMs": (self.end_ns - self.start_ns) / 1e6 if self.end_ns else None,
+            "attributes": self.attributes,
+            "events": self.events,
+            "status": {"code": self.status_code, "message": self.status_message},
+        }
+
+
+def _otlp_value(value) -> dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def _otlp_attributes(attributes: dict) -> list:
+    return [{"key": key, "value": _otlp_value(value)} for key, value in attributes.items()]
+
+
+def otlp_json(spans: list) -> dict:
+    """Spans as an OTLP/JSON ExportTraceServiceRequest, as read by the collector's otlpjsonfile receiver."""
+    return {"resourceSpans": [{
+        "resource": {"attributes": _otlp_attributes({"service.name": SERVICE_NAME})},
+        "scopeSpans": [{
+            "scope": {"name": "backend.tracing"},
+            "spans": [{
+                "traceId": span.trace_id,
+                "spanId": span.span_id,
+                "parentSpanId": span.parent_id or "",
+                "name": span.name,
+                "kind": span.kind,
+                "startTimeUnixNano": str(span.start_ns),
+                "endTimeUnixNano": str(span.end_ns),
+                "attributes": _otlp_attributes(span.attributes),
+                "events": [
+                    {"name": event["name"], "timeUnixNano": str(event["time_ns"]),
+                     "attributes": _otlp_attributes(event["attributes"])}
+                    for event in span.events
+                ],
+                "status": {"code": span.status_code, "message": span.status_message},
+            } for span in spans],
+        }],
+    }]}
+
+
+class MemoryExporter:
+    """Keeps the spans of the most recent `max_traces` traces for /api/traces."""
+
+    def __init__(self, max_traces: int = TRACE_MEMORY_TRACES):
+        self.max_traces = max_traces
+        self._traces = OrderedDict()
+        self._lock = threading.Lock()
+
+    def export(self, spans: list):
+        with self._lock:
+            self._traces.setdefault(spans[0].trace_id, []).extend(spans)
+            while len(self._traces) > self.max_traces:
+                self._traces.popitem(last=False)
+
+    def get(self, trace_id: str) -> Optional[list]:
+        with self._lock:
+            spans = self._traces.get(trace_id)
+            return list(spans) if spans is not None else None
+
+    def recent(self, limit: int) -> list:
+        with self._lock:
+            return [list(spans) for spans in list(self._traces.values())[-limit:]][::-1]
+
+    def close(self):
+        pass
+
+
+class FileExporter:
+    """Appends each finished trace to `path` as one OTLP/JSON line."""
+
+    def __init__(self, path: str = TRACE_FILE):
+        self.path = path
+        self._file = None
+        self._lock = threading.Lock()
+
+    def export(self, spans: list):
+        line = json.dumps(otlp_json(spans), separators=(",", ":")) + "\n"
+        with self._lock:
+            if self._file is None:
+                self._file = open(self.path.format(pid=os.getpid()), "a", encoding="utf-8")
+            self._file.write(line)
+            self._file.flush()
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+def make_exporter(kind: str = TRACE_EXPORTER):
+    if kind == "file":
+        return FileExporter()
+    if kind == "memory":
+        return MemoryExporter()
+    return None
+
+
+class Tracer:
+    """Creates spans in the current context and hands finished traces to an exporter.
+
+    The sampling decision is made once per trace, at its root, and
+    inherited by every span below it; unsampled traces still get ids so
+    requests can be correlated. Spans of a trace are exported together
+    when its local root span ends; spans still running then (say, a
+    cancelled hedge) are exported on their own when they finish.
+    """
+
+    def __init__(self, sample_rate: float = TRACE_SAMPLE_RATE, exporter=None):
+        self.sample_rate = sample_rate
+        self.exporter = exporter
+        self._pending = {}
+        self.stats = {"traces_started": 0, "traces_sampled": 0, "spans_exported": 0, "export_errors": 0}
+
+    def start_trace(self, name: str, traceparent: Optional[str] = None, kind: int = KIND_SERVER,
+                    attributes: Optional[dict] = None) -> Span:
+        """Root span for an incoming request, continuing the caller's trace when `traceparent` is valid."""
+        match = _TRACEPARENT.match((traceparent or "").strip().lower())
+        if match and match.group(1) != "0" * 32:
+            trace_id, parent_id = match.group(1), match.group(2)
+            sampled = bool(int(match.group(3), 16) & 1) or random.random() < self.sample_rate
+        else:
+            trace_id, parent_id = _new_id(128), None
+            sampled = random.random() < self.sample_rate
+        sampled = sampled and self.exporter is not None
+        self.stats["traces_started"] += 1
+        if sampled:
+            self.stats["traces_sampled"] += 1
+            self._pending[trace_id] = []
+        return Span(self, name, trace_id, parent_id, sampled, kind, attributes, local_root=True)
+
+    def span(self, name: str, kind: int = KIND_INTERNAL, attributes: Optional[dict] = None) -> Span:
+        """Child of the current span, for use as a context manager; a new root if there is none."""
+        parent = _current_span.get()
+        if parent is None:
+            return self.start_trace(name, kind=kind, attributes=attributes)
+        return Span(self, name, parent.trace_id, parent.span_id, parent.sampled, kind, attributes)
+
+    def traced(self, name: str, kind: int = KIND_INTERNAL):
+        """Decorator wrapping every call of an async function in a span."""
+        def decorate(fn):
+            @functools.wraps(fn)
+            async def wrapper(*args, **kwargs):
+                with self.span(name, kind):
+                    return await fn(*args, **kwargs)
+            return wrapper
+        return decorate
+
+    def metrics(self) -> dict:
+        return {**self.stats, "sample_rate": self.sample_rate, "pending_traces": len(self._pending)}
+
+    def close(self):
+        if self.exporter is not None:
+            self.exporter.close()
+
+    def _finish(self, span: Span):
+        if not span.sampled:
+            return
+        pending = self._pending.get(span.trace_id)
+        if span.local_root:
+            spans = self._pending.pop(span.trace_id, [])
+            spans.append(span)
+        elif pending is not None:
+            pending.append(span)
+            return
+        else:
+            spans = [span]  # finished after its trace was exported
+        try:
+            self.exporter.export(spans)
+            self.stats["spans_exported"] += len(spans)
+        except Exception as e:
+            self.stats["export_errors"] += 1
+            logger.error(f"Trace export failed: {e}")
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+def record_exception(error: BaseException):
+    """Record `error` on the current span, if any."""
+    span = _current_span.get()
+    if span is not None:
+        span.record_exception(error)
+
+
+def set_attribute(key: str, value):
+    span = _current_span.get()
+    if span is not None:
+        span.set_attribute(key, value)
+
+
+def db_attributes(collection: str, operation: str) -> dict:
+    return {"db.system": "mongodb", "db.mongodb.collection": collection, "db.operation": operation}
+
+
+class RequestIdFilter(logging.Filter):
+    """Adds the current request id to log records as `request_id`."""
+
+    def filter(self, record):
+        record.request_id = _request_id.get()
+        return True
+
+
+class TracingMiddleware:
+    """ASGI middleware opening a server span per request and returning correlation headers.
+
+    Continues the caller's trace from `traceparent`, and echoes the
+    caller's X-Request-ID (or uses the trace id) so a response, its log
+    lines and its trace can be matched up. Both headers are returned on
+    every response.
+    """
+
+    def __init__(self, app, tracer: Tracer):
+        self.app = app
+        self.tracer = tracer
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        traceparent, request_id = None, None
+        for name, value in scope.get("headers", []):
+            if name == b"traceparent":
+                traceparent = value.decode("latin-1")
+            elif name == b"x-request-id":
+                request_id = value.decode("latin-1").strip()
+
+        span = self.tracer.start_trace(f"{scope['method']} {scope['path']}", traceparent, attributes={
+            "http.method": scope["method"],
+            "http.target": scope["path"],
+        })
+        if not (request_id and _REQUEST_ID.match(request_id)):
+            request_id = span.trace_id
+        span.set_attribute("http.request_id", request_id)
+        request_id_token = _request_id.set(request_id)
+        correlation_headers = [(b"x-request-id", request_id.encode("latin-1")), (b"traceparent", span.traceparent.encode("latin-1"))]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                span.set_attribute("http.status_code", message["status"])
+                if message["status"] >= 500:
+                    span.set_error(f"HTTP {message['status']}")
+                message["headers"] = list(message.get("headers", [])) + correlation_headers
+            await send(message)
+
+        try:
+            with span:
+                try:
+                    await self.app(scope, receive, send_wrapper)
+                finally:
+                    # Name the span after the route template once the router has matched it
+                    route = getattr(scope.get("route"), "path_format", None)
+                    if route:
+                        span.name = f"{scope['method']} {route}"
+                        span.set_attribute("http.route", route)
+        finally:
+            _request_id.reset(request_id_token)
+
+
+tracer = Tracer(exporter=make_exporter())
+
+
+def db_span(collection: str, operation: str) -> Span:
+    """Client span around one MongoDB operation on `collection`."""
+    return tracer.span(f"{collection}.{operation}", KIND_CLIENT, db_attributes(collection, operation))
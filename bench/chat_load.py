@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+Load test for /api/chat against the local fake Agentspace service.
+
+Starts bench/fake_agentspace.py and a single uvicorn worker running
+backend/server.py, then drives /api/chat at increasing concurrency. With a
+non-blocking chat path the throughput should grow roughly linearly with the
+number of concurrent sessions until AGENTSPACE_MAX_CONCURRENCY is reached.
+"""
+
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from stack import running_stack
+
+
+def run_level(url: str, concurrency: int, requests_per_session: int):
+    def session_worker(n):
+        with requests.Session() as session:
+            for i in range(requests_per_session):
+                response = session.post(url, json={"message": f"How do I request time off? ({n}-{i})", "sessionId": None}, timeout=60)
+                response.raise_for_status()
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(session_worker, range(concurrency)))
+    elapsed = time.perf_counter() - started
+    return concurrency * requests_per_session / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test /api/chat against a fake Agentspace")
+    parser.add_argument("--fake-port", type=int, default=50051)
+    parser.add_argument("--port", type=int, default=8011)
+    parser.add_argument("--latency", type=float, default=0.2, help="Fake upstream latency in seconds")
+    parser.add_argument("--levels", default="1,2,4,8,16,32", help="Comma separated concurrency levels")
+    parser.add_argument("--requests", type=int, default=5, help="Requests per session at each level")
+    parser.add_argument("--mongo", choices=["url", "mongod", "mongomock"], default="url",
+                        help="url: MONGO_URL; mongod: throwaway local mongod; mongomock: in-memory")
+    args = parser.parse_args()
+
+    with running_stack(args.port, args.fake_port, args.latency, mongo=args.mongo) as base_url:
+        url = f"{base_url}/api/chat"
+        run_level(url, 1, 1)  # warm up
+
+        baseline = None
+        print(f"{'sessions':>8} {'rps':>10} {'ideal':>10} {'scaling':>8}")
+        for level in [int(n) for n in args.levels.split(",")]:
+            rps = run_level(url, level, args.requests)
+            baseline = baseline or rps / level
+            ideal = baseline * level
+            print(f"{level:>8} {rps:>10.1f} {ideal:>10.1f} {rps / ideal:>7.0%}")
+
+
+if __name__ == "__main__":
+    main()
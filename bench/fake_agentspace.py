@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the Agentspace (Discovery Engine) ConversationalSearchService.
+Serves ConverseConversation over plaintext gRPC with a configurable latency
+distribution and error rate so the backend can be load tested without Google
+Cloud credentials.
+
+Point the backend at it with AGENTSPACE_ENDPOINT=localhost:<port>.
+"""
+
+import argparse
+import asyncio
+import random
+import uuid
+
+import grpc
+from google.cloud import discoveryengine_v1beta as discoveryengine
+
+SERVICE_NAME = "google.cloud.discoveryengine.v1beta.ConversationalSearchService"
+
+
+class FakeAgentspace:
+    """
+    latency_dist is one of:
+      fixed      always `latency` seconds
+      uniform    uniformly spread over latency +/- jitter
+      lognormal  median `latency` with shape `jitter` (long right tail)
+    """
+
+    def __init__(self, latency: float = 0.2, latency_dist: str = "fixed", jitter: float = 0.0,
+                 error_rate: float = 0.0, stall_rate: float = 0.0, stall: float = 5.0,
+                 reply: str = "This is a canned HR answer."):
+        self.latency = latency
+        self.latency_dist = latency_dist
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.stall_rate = stall_rate
+        self.stall = stall
+        self.reply = reply
+        self.calls = 0
+        self.errors = 0
+
+    def sample_latency(self) -> float:
+        if random.random() < self.stall_rate:
+            return self.stall
+        if self.latency_dist == "uniform":
+            return max(random.uniform(self.latency - self.jitter, self.latency + self.jitter), 0.0)
+        if self.latency_dist == "lognormal":
+            return random.lognormvariate(0, self.jitter) * self.latency
+        return self.latency
+
+    async def converse_conversation(self, request, context):
+        self.calls += 1
+        await asyncio.sleep(self.sample_latency())
+
+        if random.random() < self.error_rate:
+            self.errors += 1
+            await context.abort(grpc.StatusCode.UNAVAILABLE, "Injected failure")
+
+        if request.name.endswith("/conversations/-"):
+            conversation_name = request.name[:-1] + uuid.uuid4().hex
+        else:
+            conversation_name = request.name
+
+        return discoveryengine.ConverseConversationResponse(
+            reply=discoveryengine.Reply(
+                summary=discoveryengine.SearchResponse.Summary(
+                    summary_text=f"{self.reply} (query: {request.query.input})"
+                )
+            ),
+            conversation=discoveryengine.Conversation(name=conversation_name),
+        )
+
+    def handler(self):
+        return grpc.method_handlers_generic_handler(SERVICE_NAME, {
+            "ConverseConversation": grpc.unary_unary_rpc_method_handler(
+                self.converse_conversation,
+                request_deserializer=discoveryengine.ConverseConversationRequest.deserialize,
+                response_serializer=discoveryengine.ConverseConversationResponse.serialize,
+            ),
+        })
+
+
+async def start_server(fake: FakeAgentspace, port: int = 0):
+    """Start the fake on localhost and return (server, bound_port)."""
+    server = grpc.aio.server()
+    server.add_generic_rpc_handlers((fake.handler(),))
+    bound_port = server.add_insecure_port(f"127.0.0.1:{port}")
+    await server.start()
+    return server, bound_port
+
+
+async def main(args):
+    fake = FakeAgentspace(
+        latency=args.latency, latency_dist=args.latency_dist, jitter=args.jitter,
+        error_rate=args.error_rate, stall_rate=args.stall_rate, stall=args.stall,
+    )
+    server, port = await start_server(fake, args.port)
+    print(f"Fake Agentspace listening on 127.0.0.1:{port} "
+          f"({args.latency_dist} latency {args.latency}s, error rate {args.error_rate:.0%})")
+    await server.wait_for_termination()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a local fake Agentspace gRPC service")
+    parser.add_argument("--port", type=int, default=50051)
+    parser.add_argument("--latency", type=float, default=0.2, help="Seconds to wait before replying")
+    parser.add_argument("--latency-dist", choices=["fixed", "uniform", "lognormal"], default="fixed")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Spread for uniform, sigma for lognormal")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of calls failing with UNAVAILABLE")
+    parser.add_argument("--stall-rate", type=float, default=0.0, help="Fraction of calls that hang for --stall seconds")
+    parser.add_argument("--stall", type=float, default=5.0)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+HR FAQ index benchmark.
+
+Builds backend/faq.py's TF-IDF index over synthetic FAQ sets of growing
+size and reports build time, index size and per-question lookup latency
+for questions that match an entry (paraphrased) and questions that do
+not, next to the share of each answered at FAQ_MIN_SCORE:
+
+    python bench/faq.py
+    python bench/faq.py --sizes 100 1000 10000 --min-score 0.7
+"""
+
+import argparse
+import random
+import statistics
+import sys
+import time
+
+from stack import BACKEND_DIR
+
+sys.path.insert(0, str(BACKEND_DIR))
+
+from faq import FAQ_MIN_SCORE, TfidfIndex, terms  # noqa: E402
+
+TOPICS = [
+    "vacation days", "annual leave", "sick leave", "parental leave", "remote work", "expense claims", "travel booking",
+    "payroll date", "pension plan", "health insurance", "dental cover", "training budget", "performance review",
+    "probation period", "notice period", "overtime pay", "public holidays", "laptop replacement", "relocation support",
+    "bonus payment", "salary review", "company car", "gym membership", "childcare vouchers", "jury duty",
+]
+ASPECTS = [
+    "for part-time staff", "for contractors", "in the first year", "after promotion", "in Germany", "in the UK",
+    "for managers", "during probation", "for interns", "when changing teams", "for new hires", "after ten years",
+]
+TEMPLATES = [
+    "How does {topic} work {aspect}?", "What is the policy on {topic} {aspect}?", "Who approves {topic} {aspect}?",
+    "Where do I request {topic} {aspect}?", "How much {topic} is available {aspect}?",
+]
+PARAPHRASES = ["{q}", "{q} Thanks", "Quick question: {q}", "{q_lower}"]
+UNRELATED = [
+    "What's the weather like tomorrow?", "Summarise the attached contract", "Write a poem about Mondays",
+    "Which printer is closest to meeting room 4?", "Translate 'good morning' into Finnish",
+    "How do I reset the VPN on my phone?", "Book a table for lunch on Friday",
+]
+
+
+def faq_rows(size: int, rng: random.Random):
+    combos = [(topic, aspect, template) for topic in TOPICS for aspect in ASPECTS for template in TEMPLATES]
+    rng.shuffle(combos)
+    questions = [template.format(topic=topic, aspect=aspect) for topic, aspect, template in combos[:size]]
+    return questions, [(f"faq-{n}", terms(question)) for n, question in enumerate(questions)]
+
+
+def lookup_stats(index: TfidfIndex, questions, min_score: float, repeats: int):
+    samples, answered = [], 0
+    for question in questions:
+        best = index.search(question, limit=1)
+        answered += bool(best and best[0][1] >= min_score)
+        started = time.perf_counter()
+        for _ in range(repeats):
+            index.search(question, limit=1)
+        samples.append((time.perf_counter() - started) / repeats)
+    samples.sort()
+    return 1e6 * statistics.median(samples), 1e6 * samples[int(0.99 * (len(samples) - 1))], answered / len(questions)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure HR FAQ index build and lookup cost")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[50, 200, 1000, 1500])
+    parser.add_argument("--queries", type=int, default=300, help="Matching and non-matching questions per size")
+    parser.add_argument("--repeats", type=int, default=20, help="Lookups per question (mean is one sample)")
+    parser.add_argument("--min-score", type=float, default=FAQ_MIN_SCORE)
+    args = parser.parse_args()
+
+    rng = random.Random(11)
+    print(f"{'entries':>8} {'terms':>7} {'build ms':>9} {'KiB':>7}   {'match p50/p99 us':>17} {'answered':>9}"
+          f"   {'other p50/p99 us':>17} {'answered':>9}")
+    for size in args.sizes:
+        questions, rows = faq_rows(size, rng)
+        started = time.perf_counter()
+        index = TfidfIndex(rows)
+        build_ms = 1000 * (time.perf_counter() - started)
+        kib = sum(array.nbytes for array in (index.idf, index.rows, index.weights, index.offsets, index.row_faq)) / 1024
+
+        matching = [
+            rng.choice(PARAPHRASES).format(q=question, q_lower=question.lower().rstrip("?"))
+            for question in rng.choices(questions, k=args.queries)
+        ]
+        other = [
+            rng.choice(UNRELATED) if rng.random() < 0.5
+            else f"Can I {rng.choice(['swap', 'split', 'donate'])} {rng.choice(TOPICS)} with a colleague?"
+            for _ in range(args.queries)
+        ]
+        match_p50, match_p99, match_answered = lookup_stats(index, matching, args.min_score, args.repeats)
+        other_p50, other_p99, other_answered = lookup_stats(index, other, args.min_score, args.repeats)
+        print(f"{size:>8} {len(index.vocabulary):>7} {build_ms:>9.1f} {kib:>7.0f}   "
+              f"{match_p50:>8.0f}/{match_p99:<8.0f} {match_answered:>9.0%}   "
+              f"{other_p50:>8.0f}/{other_p99:<8.0f} {other_answered:>9.0%}")
+
+
+if __name__ == "__main__":
+    main()
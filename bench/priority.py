@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Interactive chat latency while batch work saturates Agentspace.
+
+Starts the fake Agentspace and the backend with a small
+AGENTSPACE_MAX_CONCURRENCY, keeps it saturated with a bulk script (many
+concurrent /api/chat calls sent with X-Priority: batch) plus a
+/api/chat/batch run, and meanwhile measures a few interactive users
+chatting with think time between questions. Runs once with the default
+scheduler settings and once with priority classes flattened (equal class
+weights, no interactive reserve) for comparison:
+
+    python bench/priority.py
+    python bench/priority.py --slots 16 --bulk-threads 64 --duration 30
+"""
+
+import argparse
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from stack import running_stack
+
+FLAT = {"SCHEDULER_INTERACTIVE_WEIGHT": "1", "SCHEDULER_BATCH_WEIGHT": "1", "SCHEDULER_INTERACTIVE_RESERVE": "0"}
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[int(fraction * (len(ordered) - 1))]
+
+
+def run(base_url: str, args) -> dict:
+    stop = threading.Event()
+    bulk_done = [0]
+
+    def bulk_worker(n):
+        with requests.Session() as session:
+            i = 0
+            while not stop.is_set():
+                session.post(f"{base_url}/api/chat", json={"message": f"bulk {n}-{i}"},
+                             headers={"X-Priority": "batch", "X-Cache-Bypass": "1"}, timeout=120)
+                bulk_done[0] += 1
+                i += 1
+
+    def batch_run():
+        while not stop.is_set():
+            requests.post(f"{base_url}/api/chat/batch", json={
+                "items": [{"message": f"eval {i}"} for i in range(args.batch_items)], "concurrency": 16,
+            }, timeout=600)
+
+    def interactive_user(n):
+        latencies = []
+        with requests.Session() as session:
+            i = 0
+            while not stop.is_set():
+                started = time.perf_counter()
+                response = session.post(f"{base_url}/api/chat", json={"message": f"user {n} question {i}"},
+                                        headers={"X-Cache-Bypass": "1"}, timeout=120)
+                if response.ok:
+                    latencies.append(time.perf_counter() - started)
+                i += 1
+                time.sleep(args.think_time)
+        return latencies
+
+    with ThreadPoolExecutor(max_workers=args.bulk_threads + args.users + 1) as pool:
+        for n in range(args.bulk_threads):
+            pool.submit(bulk_worker, n)
+        pool.submit(batch_run)
+        time.sleep(2)  # let the backlog build
+        users = [pool.submit(interactive_user, n) for n in range(args.users)]
+        time.sleep(args.duration)
+        stop.set()
+        latencies = [latency for user in users for latency in user.result()]
+
+    return {
+        "interactive": len(latencies),
+        "p50": 1000 * statistics.median(latencies),
+        "p99": 1000 * percentile(latencies, 0.99),
+        "bulk_rps": bulk_done[0] / (args.duration + 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure interactive latency under batch load")
+    parser.add_argument("--fake-port", type=int, default=50061)
+    parser.add_argument("--port", type=int, default=8021)
+    parser.add_argument("--latency", type=float, default=0.2, help="Fake upstream latency in seconds")
+    parser.add_argument("--slots", type=int, default=8, help="AGENTSPACE_MAX_CONCURRENCY")
+    parser.add_argument("--bulk-threads", type=int, default=32, help="Concurrent bulk-script requests")
+    parser.add_argument("--batch-items", type=int, default=200, help="Questions per /api/chat/batch run")
+    parser.add_argument("--users", type=int, default=4, help="Interactive users")
+    parser.add_argument("--think-time", type=float, default=0.5, help="Seconds between an interactive user's questions")
+    parser.add_argument("--duration", type=float, default=15, help="Seconds of measurement per configuration")
+    parser.add_argument("--mongo", choices=["url", "mongod", "mongomock"], default="mongomock")
+    args = parser.parse_args()
+
+    env = {"AGENTSPACE_MAX_CONCURRENCY": str(args.slots)}
+    print(f"{'scheduler':<10} {'interactive':>11} {'p50 ms':>8} {'p99 ms':>8} {'bulk rps':>9}")
+    for name, extra_env in (("priority", {}), ("flat", FLAT)):
+        with running_stack(args.port, args.fake_port, args.latency, mongo=args.mongo, extra_env={**env, **extra_env}) as base_url:
+            result = run(base_url, args)
+        print(f"{name:<10} {result['interactive']:>11} {result['p50']:>8.0f} {result['p99']:>8.0f} {result['bulk_rps']:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Fault-injection scenarios for the Agentspace resilience layer.
+
+Each scenario boots the backend against a fake Agentspace configured to
+misbehave in one way and reports client-visible outcomes together with the
+agentspace_resilience_events_total counters from /metrics:
+
+  errors    30% UNAVAILABLE responses; retries should hide most of them
+  stalls    2% of calls hang for 5s; hedging should cut the p99
+  outage    every call fails; the breaker should open and fail fast with 503
+"""
+
+import argparse
+import re
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from stack import running_stack
+
+SCENARIOS = {
+    "errors": {"fake": {"error_rate": 0.3}, "env": {}},
+    "stalls": {"fake": {"stall_rate": 0.02}, "env": {"AGENTSPACE_HEDGE": "true", "AGENTSPACE_HEDGE_MIN_SAMPLES": "20"}},
+    "stalls_no_hedge": {"fake": {"stall_rate": 0.02}, "env": {"AGENTSPACE_HEDGE": "false"}},
+    "outage": {"fake": {"error_rate": 1.0}, "env": {"AGENTSPACE_BREAKER_COOLDOWN": "60"}},
+}
+
+
+def drive(base_url: str, total: int, concurrency: int):
+    def one(n):
+        started = time.perf_counter()
+        try:
+            status = requests.post(
+                f"{base_url}/api/chat",
+                json={"message": f"What is the vacation policy? ({uuid.uuid4().hex[:8]})", "sessionId": None},
+                timeout=60,
+            ).status_code
+        except requests.RequestException:
+            status = 0
+        return status, time.perf_counter() - started
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        return list(pool.map(one, range(total)))
+
+
+def resilience_events(base_url: str) -> dict:
+    text = requests.get(f"{base_url}/metrics", timeout=5).text
+    events = {}
+    for event, value in re.findall(r'agentspace_resilience_events_total\{event="(\w+)"\} ([\d.]+)', text):
+        events[event] = int(float(value))
+    breaker = re.search(r"^agentspace_breaker_times_opened (\S+)$", text, re.M)
+    events["breaker_times_opened"] = int(float(breaker.group(1))) if breaker else 0
+    return events
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Exercise retries, hedging and the circuit breaker")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--port", type=int, default=8011)
+    parser.add_argument("--fake-port", type=int, default=50051)
+    parser.add_argument("--mongo", choices=["url", "mongod", "mongomock"], default="url")
+    args = parser.parse_args()
+
+    for name in [n.strip() for n in args.scenarios.split(",") if n.strip()]:
+        scenario = SCENARIOS[name]
+        with running_stack(args.port, args.fake_port, args.latency, mongo=args.mongo,
+                           extra_env=scenario["env"], **scenario["fake"]) as base_url:
+            results = drive(base_url, args.requests, args.concurrency)
+            events = resilience_events(base_url)
+
+        latencies = sorted(seconds for _, seconds in results)
+        statuses = {}
+        for status, _ in results:
+            statuses[status] = statuses.get(status, 0) + 1
+        p50 = 1000 * latencies[len(latencies) // 2]
+        p99 = 1000 * latencies[int(0.99 * (len(latencies) - 1))]
+        print(f"\n== {name} ==")
+        print(f"status codes: {dict(sorted(statuses.items()))}")
+        print(f"latency p50 {p50:.0f} ms, p99 {p99:.0f} ms")
+        print(f"resilience events: {events}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Status rollup benchmark at millions of documents.
+
+Seeds a throwaway database with --docs status checks spread over --days,
+backfills status_rollups from them (as migrate_status_rollups.py does),
+then times dashboard queries answered by aggregating raw status_checks
+against the same answers read from the rollups:
+
+    python bench/rollups.py --mongo mongod --docs 2000000
+    python bench/rollups.py --mongo url --docs 5000000 --clients 500
+    python bench/rollups.py --mongo mongomock --docs 20000   # smoke test only
+
+With --mongo url the database named by --db on MONGO_URL is dropped at the
+end unless --keep is given.
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import time
+import uuid
+from contextlib import ExitStack
+from datetime import datetime, timedelta
+
+from dotenv import load_dotenv
+
+from stack import BACKEND_DIR, local_mongod
+
+sys.path.insert(0, str(BACKEND_DIR))
+load_dotenv(BACKEND_DIR / '.env')
+
+from rollups import StatusRollups, bucket_expression, bucket_start  # noqa: E402
+
+
+async def seed(db, docs: int, clients: int, days: int, batch: int, now: datetime) -> float:
+    """Insert `docs` status checks with random timestamps in the last `days`; returns seconds taken."""
+    await db.status_checks.create_index([("timestamp", -1), ("id", -1)])
+    await db.status_checks.create_index([("client_name", 1), ("timestamp", -1), ("id", -1)])
+    rng = random.Random(42)
+    span = days * 86400
+    started = time.perf_counter()
+    for offset in range(0, docs, batch):
+        await db.status_checks.insert_many([
+            {
+                "id": str(uuid.uuid4()),
+                "client_name": f"client-{int(rng.paretovariate(1.2)) % clients}",
+                "timestamp": now - timedelta(seconds=rng.random() * span),
+            }
+            for _ in range(min(batch, docs - offset))
+        ], ordered=False)
+        print(f"\r  seeded {min(offset + batch, docs)}/{docs}", end="", flush=True)
+    print()
+    return time.perf_counter() - started
+
+
+def raw_clients(since, until):
+    return [
+        {"$match": {"timestamp": {"$gte": since, "$lt": until}}},
+        {"$group": {"_id": "$client_name", "count": {"$sum": 1}, "lastSeen": {"$max": "$timestamp"}}},
+    ]
+
+
+def raw_buckets(granularity, since, until, client_name=None):
+    match = {"timestamp": {"$gte": since, "$lt": until}}
+    if client_name:
+        match["client_name"] = client_name
+    return [
+        {"$match": match},
+        {"$group": {
+            "_id": {"client_name": "$client_name", "bucket": bucket_expression(granularity)},
+            "count": {"$sum": 1},
+            "lastSeen": {"$max": "$timestamp"},
+        }},
+    ]
+
+
+async def timed(fn, repeats: int):
+    samples, result = [], None
+    for _ in range(repeats):
+        started = time.perf_counter()
+        result = await fn()
+        samples.append(time.perf_counter() - started)
+    return 1000 * statistics.median(samples), result
+
+
+async def run(db, args):
+    now = bucket_start(datetime.utcnow(), "hour")
+    rollups = StatusRollups(db)
+    await rollups.ensure_indexes()
+
+    print(f"Seeding {args.docs} status checks for {args.clients} clients over {args.days} days")
+    seconds = await seed(db, args.docs, args.clients, args.days, args.batch, now)
+    print(f"  {args.docs / seconds:,.0f} inserts/s")
+
+    since = now - timedelta(days=args.days)
+    started = time.perf_counter()
+    rolled_up = await rollups.backfill(since, now, step=timedelta(hours=args.step_hours))
+    seconds = time.perf_counter() - started
+    rollup_docs = await db.status_rollups.count_documents({})
+    print(f"Backfill: {rolled_up:,} checks into {rollup_docs:,} buckets in {seconds:.1f}s ({rolled_up / seconds:,.0f} checks/s)")
+
+    busiest = (await rollups.clients("hour", since, now))[0]["clientName"]
+    last_day, last_hour = now - timedelta(days=1), now - timedelta(hours=1)
+    queries = [
+        ("clients, last day", raw_clients(last_day, now),
+         lambda: rollups.clients("hour", last_day, now), {"timestamp": {"$gte": last_day, "$lt": now}}),
+        (f"clients, last {args.days} days", raw_clients(since, now),
+         lambda: rollups.clients("hour", since, now), {"timestamp": {"$gte": since, "$lt": now}}),
+        ("by minute, last hour", raw_buckets("minute", last_hour, now),
+         lambda: rollups.buckets("minute", last_hour, now, None, 100000), {"timestamp": {"$gte": last_hour, "$lt": now}}),
+        (f"by hour, one client, {args.days} days", raw_buckets("hour", since, now, busiest),
+         lambda: rollups.buckets("hour", since, now, busiest, 100000),
+         {"timestamp": {"$gte": since, "$lt": now}, "client_name": busiest}),
+    ]
+
+    print(f"\n{'query':<32} {'raw docs':>10} {'raw ms':>9} {'rollup ms':>10} {'speedup':>8} {'match':>6}")
+    for name, pipeline, rollup_query, raw_filter in queries:
+        raw_ms, raw_rows = await timed(lambda: db.status_checks.aggregate(pipeline, allowDiskUse=True).to_list(None), args.repeats)
+        rollup_ms, rollup_rows = await timed(rollup_query, args.repeats)
+        scanned = await db.status_checks.count_documents(raw_filter)
+        match = sum(row["count"] for row in raw_rows) == sum(row["count"] for row in rollup_rows)
+        print(f"{name:<32} {scanned:>10,} {raw_ms:>9.1f} {rollup_ms:>10.1f} {raw_ms / max(rollup_ms, 1e-6):>7.0f}x {'yes' if match else 'NO':>6}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare raw status_checks aggregation with status_rollups")
+    parser.add_argument("--docs", type=int, default=2_000_000)
+    parser.add_argument("--clients", type=int, default=200)
+    parser.add_argument("--days", type=int, default=7, help="History span; keep within STATUS_ROLLUP_MINUTE_DAYS")
+    parser.add_argument("--batch", type=int, default=10_000, help="Documents per insert_many while seeding")
+    parser.add_argument("--step-hours", type=int, default=24, help="Hours aggregated per backfill step")
+    parser.add_argument("--repeats", type=int, default=5, help="Runs per query (median is reported)")
+    parser.add_argument("--mongo", choices=["url", "mongod", "mongomock"], default="mongod",
+                        help="url: MONGO_URL; mongod: throwaway local mongod; mongomock: in-memory (small --docs only)")
+    parser.add_argument("--port", type=int, default=27099, help="Port for --mongo mongod")
+    parser.add_argument("--db", default="bench_rollups")
+    parser.add_argument("--keep", action="store_true", help="Do not drop the database afterwards")
+    args = parser.parse_args()
+
+    with ExitStack() as stack:
+        if args.mongo == "mongomock":
+            from mongomock_motor import AsyncMongoMockClient
+            client = AsyncMongoMockClient()
+        else:
+            from motor.motor_asyncio import AsyncIOMotorClient
+            url = stack.enter_context(local_mongod(args.port)) if args.mongo == "mongod" else os.environ['MONGO_URL']
+            client = AsyncIOMotorClient(url)
+
+        async def main_async():
+            db = client[args.db]
+            await client.drop_database(args.db)
+            try:
+                await run(db, args)
+            finally:
+                if not args.keep:
+                    await client.drop_database(args.db)
+
+        asyncio.run(main_async())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""
+Benchmark harness for the backend.
+
+Boots backend/server.py against the fake Agentspace service (configurable
+latency distribution and error rate) and a local MongoDB, then drives
+/api/chat and /api/status at a fixed concurrency for a fixed duration.
+Reports p50/p95/p99 latency and RPS per scenario and saves the results as
+JSON under bench/results/ so runs can be compared between commits:
+
+    python bench/run.py --mongo mongod --concurrency 16 --duration 20
+    python bench/run.py --compare bench/results/<earlier-run>.json
+"""
+
+import argparse
+import itertools
+import json
+import subprocess
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+import requests
+
+from stack import ROOT_DIR, running_stack
+
+RESULTS_DIR = ROOT_DIR / "bench" / "results"
+
+HR_QUESTIONS = [
+    "What is the company's vacation policy?",
+    "How do I request time off?",
+    "What are the health insurance benefits?",
+    "What is the process for reporting workplace issues?",
+]
+
+
+def chat_new_session(session: requests.Session, base_url: str, n: int):
+    # Bypass the answer cache so every request measures the upstream path
+    return session.post(
+        f"{base_url}/api/chat",
+        json={"message": f"{HR_QUESTIONS[n % len(HR_QUESTIONS)]} ({uuid.uuid4().hex[:8]})", "sessionId": None},
+        headers={"X-Cache-Bypass": "1"},
+        timeout=60,
+    )
+
+
+def chat_cached(session: requests.Session, base_url: str, n: int):
+    return session.post(
+        f"{base_url}/api/chat",
+        json={"message": HR_QUESTIONS[n % len(HR_QUESTIONS)], "sessionId": None},
+        timeout=60,
+    )
+
+
+def status_create(session: requests.Session, base_url: str, n: int):
+    return session.post(f"{base_url}/api/status", json={"client_name": f"bench-{n % 50}"}, timeout=30)
+
+
+def status_list(session: requests.Session, base_url: str, n: int):
+    return session.get(f"{base_url}/api/status", params={"limit": 100}, timeout=30)
+
+
+SCENARIOS = {
+    "chat_new_session": chat_new_session,
+    "chat_cached": chat_cached,
+    "status_create": status_create,
+    "status_list": status_list,
+}
+
+
+def percentile(sorted_values, fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(int(round(fraction * (len(sorted_values) - 1))), len(sorted_values) - 1)
+    return sorted_values[index]
+
+
+def run_scenario(base_url: str, name: str, concurrency: int, duration: float) -> dict:
+    request_fn = SCENARIOS[name]
+    counter = itertools.count()
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+    stop_at = time.perf_counter() + duration
+
+    def worker(_):
+        local_latencies = []
+        local_errors = 0
+        with requests.Session() as session:
+            while time.perf_counter() < stop_at:
+                started = time.perf_counter()
+                try:
+                    ok = request_fn(session, base_url, next(counter)).ok
+                except requests.RequestException:
+                    ok = False
+                local_latencies.append(time.perf_counter() - started)
+                local_errors += 0 if ok else 1
+        with lock:
+            latencies.extend(local_latencies)
+            errors.append(local_errors)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(worker, range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": sum(errors),
+        "rps": len(latencies) / elapsed,
+        "p50_ms": 1000 * percentile(latencies, 0.50),
+        "p95_ms": 1000 * percentile(latencies, 0.95),
+        "p99_ms": 1000 * percentile(latencies, 0.99),
+    }
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT_DIR, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def print_results(results: dict, baseline=None):
+    header = f"{'scenario':<18} {'rps':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>7}"
+    print(header)
+    print("-" * len(header))
+    for name, stats in results["scenarios"].items():
+        print(f"{name:<18} {stats['rps']:>9.1f} {stats['p50_ms']:>9.1f} {stats['p95_ms']:>9.1f} "
+              f"{stats['p99_ms']:>9.1f} {stats['errors']:>7}")
+        before = (baseline or {}).get("scenarios", {}).get(name)
+        if before:
+            deltas = [
+                f"{key} {100 * (stats[key] - before[key]) / before[key]:+.1f}%"
+                for key in ("rps", "p50_ms", "p95_ms", "p99_ms") if before[key]
+            ]
+            print(f"{'':<18} vs {baseline['revision']}: " + ", ".join(deltas))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark /api/chat and /api/status against local stand-ins")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="Comma separated scenario names")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=10, help="Seconds per scenario")
+    parser.add_argument("--port", type=int, default=8011)
+    parser.add_argument("--fake-port", type=int, default=50051)
+    parser.add_argument("--mongo", choices=["url", "mongod", "mongomock"], default="url",
+                        help="url: MONGO_URL; mongod: throwaway local mongod; mongomock: in-memory")
+    parser.add_argument("--latency", type=float, default=0.2, help="Fake Agentspace median latency (s)")
+    parser.add_argument("--latency-dist", choices=["fixed", "uniform", "lognormal"], default="lognormal")
+    parser.add_argument("--jitter", type=float, default=0.5)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--compare", type=Path, help="Earlier results file to compare against")
+    parser.add_argument("--no-save", action="store_true", help="Do not write a results file")
+    args = parser.parse_args()
+
+    baseline = json.loads(args.compare.read_text()) if args.compare else None
+    scenarios = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+
+    results = {
+        "revision": git_revision(),
+        "started_at": datetime.utcnow().isoformat(),
+        "config": {
+            "concurrency": args.concurrency,
+            "duration": args.duration,
+            "mongo": args.mongo,
+            "latency": args.latency,
+            "latency_dist": args.latency_dist,
+            "jitter": args.jitter,
+            "error_rate": args.error_rate,
+        },
+        "scenarios": {},
+    }
+
+    with running_stack(args.port, args.fake_port, args.latency, args.latency_dist, args.jitter,
+                       args.error_rate, mongo=args.mongo) as base_url:
+        for name in scenarios:
+            run_scenario(base_url, name, min(args.concurrency, 4), 1)  # warm up
+            results["scenarios"][name] = run_scenario(base_url, name, args.concurrency, args.duration)
+
+    print_results(results, baseline)
+
+    if not args.no_save:
+        RESULTS_DIR.mkdir(exist_ok=True)
+        path = RESULTS_DIR / f"{datetime.utcnow():%Y%m%d-%H%M%S}-{results['revision']}.json"
+        path.write_text(json.dumps(results, indent=2))
+        print(f"\nSaved results to {path.relative_to(ROOT_DIR)}")
+
+
+if __name__ == "__main__":
+    main()
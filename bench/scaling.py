@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Multi-worker scaling benchmark.
+
+Boots the backend with 1, 2, 4, ... workers and drives one scenario from
+bench/run.py at each size, reporting RPS against ideal linear scaling. The
+default scenario, chat_cached, is served from each worker's in-process answer
+cache and so is CPU-bound in the backend, which is what extra workers buy.
+
+The load generator runs in several processes so the client is not the
+bottleneck, but it shares the machine with the backend: leave cores for it
+or run it from another host against --workers-levels up to the core count.
+
+    python bench/scaling.py --server gunicorn --mongo mongod
+    python bench/scaling.py --mongo mongomock --workers-levels 1,2,4
+"""
+
+import argparse
+import itertools
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import requests
+
+from run import SCENARIOS, percentile
+from stack import running_stack
+
+
+def drive(base_url: str, scenario: str, threads: int, duration: float, offset: int):
+    """Run `threads` client threads for `duration` seconds; return (latencies, errors)."""
+    request_fn = SCENARIOS[scenario]
+    counter = itertools.count(offset)
+    stop_at = time.perf_counter() + duration
+
+    def worker(_):
+        latencies, errors = [], 0
+        with requests.Session() as session:
+            while time.perf_counter() < stop_at:
+                started = time.perf_counter()
+                try:
+                    ok = request_fn(session, base_url, next(counter)).ok
+                except requests.RequestException:
+                    ok = False
+                latencies.append(time.perf_counter() - started)
+                errors += 0 if ok else 1
+        return latencies, errors
+
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        results = list(pool.map(worker, range(threads)))
+    return [seconds for latencies, _ in results for seconds in latencies], sum(errors for _, errors in results)
+
+
+def run_level(base_url: str, scenario: str, clients: int, threads: int, duration: float) -> dict:
+    started = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=clients) as pool:
+        futures = [pool.submit(drive, base_url, scenario, threads, duration, n * 1_000_000) for n in range(clients)]
+        results = [future.result() for future in futures]
+    elapsed = time.perf_counter() - started
+
+    latencies = sorted(seconds for latencies, _ in results for seconds in latencies)
+    return {
+        "requests": len(latencies),
+        "errors": sum(errors for _, errors in results),
+        "rps": len(latencies) / elapsed,
+        "p50_ms": 1000 * percentile(latencies, 0.50),
+        "p99_ms": 1000 * percentile(latencies, 0.99),
+    }
+
+
+def main():
+    cores = os.cpu_count() or 1
+    parser = argparse.ArgumentParser(description="Measure RPS scaling across backend workers")
+    parser.add_argument("--scenario", choices=list(SCENARIOS), default="chat_cached")
+    parser.add_argument("--workers-levels", default=",".join(str(2 ** i) for i in range(cores.bit_length()) if 2 ** i <= cores),
+                        help="Comma separated worker counts (default: powers of two up to the core count)")
+    parser.add_argument("--clients", type=int, default=cores, help="Load generator processes")
+    parser.add_argument("--threads", type=int, default=8, help="Threads per load generator process")
+    parser.add_argument("--duration", type=float, default=10, help="Seconds per level")
+    parser.add_argument("--server", choices=["uvicorn", "gunicorn"], default="gunicorn")
+    parser.add_argument("--mongo", choices=["url", "mongod", "mongomock"], default="url",
+                        help="url: MONGO_URL; mongod: throwaway local mongod; mongomock: in-memory, one per worker")
+    parser.add_argument("--latency", type=float, default=0.05, help="Fake Agentspace latency (s)")
+    parser.add_argument("--port", type=int, default=8011)
+    parser.add_argument("--fake-port", type=int, default=50051)
+    args = parser.parse_args()
+
+    print(f"{args.scenario} on {cores} core(s), {args.clients} client process(es) x {args.threads} threads")
+    print(f"{'workers':>7} {'rps':>9} {'ideal':>9} {'scaling':>8} {'p50 ms':>8} {'p99 ms':>8} {'errors':>7}")
+    baseline = None
+    for workers in [int(n) for n in args.workers_levels.split(",")]:
+        with running_stack(args.port, args.fake_port, args.latency, mongo=args.mongo,
+                           workers=workers, server=args.server) as base_url:
+            run_level(base_url, args.scenario, args.clients, args.threads, 2)  # warm up every worker's cache
+            stats = run_level(base_url, args.scenario, args.clients, args.threads, args.duration)
+
+        baseline = baseline or stats["rps"] / workers
+        ideal = baseline * workers
+        print(f"{workers:>7} {stats['rps']:>9.1f} {ideal:>9.1f} {stats['rps'] / ideal:>7.0%} "
+              f"{stats['p50_ms']:>8.1f} {stats['p99_ms']:>8.1f} {stats['errors']:>7}")
+
+
+if __name__ == "__main__":
+    main()
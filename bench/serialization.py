@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Response serialization and compression benchmark.
+
+Encodes representative large responses in-process and reports CPU time
+per request and bytes on the wire:
+
+  * status_list: a full page of /api/status (1000 documents)
+  * chat_reply: /api/chat with a long Agentspace summary
+  * messages: a page of /api/conversations/messages
+
+Each payload is encoded the way FastAPI does it by default (build and
+validate models, dump them to dicts, json.dumps) and the way the backend
+does it now (orjson on the raw documents, or pydantic-core straight to
+bytes), then compressed with gzip and, when installed, brotli at the
+settings in backend/responses.py:
+
+    python bench/serialization.py
+    python bench/serialization.py --status-docs 5000 --reply-chars 40000
+"""
+
+import argparse
+import json
+import random
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import List
+
+from stack import BACKEND_DIR
+
+sys.path.insert(0, str(BACKEND_DIR))
+
+SENTENCES = [
+    "Full-time employees accrue 1.67 days of paid vacation per month of service.",
+    "Unused vacation of up to five days can be carried over into the next calendar year.",
+    "Requests for time off should be submitted in the HR portal at least two weeks in advance.",
+    "Your manager approves the request, after which it appears on the team calendar.",
+    "Sick leave is tracked separately and does not reduce your vacation balance.",
+    "Part-time employees accrue vacation in proportion to their contracted hours.",
+    "Public holidays that fall within approved leave are not deducted from the balance.",
+    "Contact the HR helpdesk if the balance shown in the portal looks incorrect.",
+]
+
+
+def cpu_per_call(fn, repeats: int) -> float:
+    """Median process CPU microseconds per call over `repeats` rounds."""
+    fn()
+    samples = []
+    for _ in range(repeats):
+        started = time.process_time()
+        rounds = 0
+        while rounds < 5 or time.process_time() - started < 0.05:
+            fn()
+            rounds += 1
+        samples.append((time.process_time() - started) / rounds)
+    samples.sort()
+    return 1e6 * samples[len(samples) // 2]
+
+
+def long_reply(chars: int) -> str:
+    rng = random.Random(7)
+    parts, length = [], 0
+    while length < chars:
+        sentence = rng.choice(SENTENCES)
+        parts.append(sentence)
+        length += len(sentence) + 1
+    return " ".join(parts)[:chars]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure response encoding CPU and size")
+    parser.add_argument("--status-docs", type=int, default=1000)
+    parser.add_argument("--reply-chars", type=int, default=12000)
+    parser.add_argument("--messages", type=int, default=200)
+    parser.add_argument("--repeats", type=int, default=7)
+    args = parser.parse_args()
+
+    from fastapi.responses import JSONResponse
+    from pydantic import TypeAdapter
+
+    import responses
+    from server import ChatResponse, ConversationMessage, ConversationMessagePage, StatusCheck
+
+    now = datetime.utcnow().replace(microsecond=0)
+    status_docs = [
+        {"id": str(uuid.uuid4()), "client_name": f"client-{n % 50}", "timestamp": now - timedelta(seconds=n)}
+        for n in range(args.status_docs)
+    ]
+    reply = ChatResponse(reply=long_reply(args.reply_chars), sessionId="q3L0xv2bHn8Yt4Wc")
+    page = ConversationMessagePage(messages=[
+        ConversationMessage(id=str(uuid.uuid4()), sessionId="q3L0xv2bHn8Yt4Wc", role="bot" if n % 2 else "user",
+                            content=long_reply(600 if n % 2 else 80), timestamp=now + timedelta(seconds=n))
+        for n in range(args.messages)
+    ])
+
+    def fastapi_default(content, annotation):
+        # What a response_model route does: validate, dump to JSON-ready dicts, json.dumps
+        adapter = TypeAdapter(annotation)
+        return JSONResponse(adapter.dump_python(adapter.validate_python(content), mode="json")).body
+
+    status_list_annotation = List[StatusCheck]
+    cases = {
+        "status_list": {
+            "fastapi default": lambda: fastapi_default([StatusCheck(**doc) for doc in status_docs], status_list_annotation),
+            "orjson raw docs": lambda: responses.FastJSONResponse(status_docs).body,
+        },
+        "chat_reply": {
+            "fastapi default": lambda: fastapi_default(reply, ChatResponse),
+            "pydantic dump_json": lambda: responses.model_response(reply, ChatResponse).body,
+        },
+        "messages": {
+            "fastapi default": lambda: fastapi_default(page, ConversationMessagePage),
+            "pydantic dump_json": lambda: responses.model_response(page, ConversationMessagePage).body,
+        },
+    }
+
+    print(f"orjson {'installed' if responses.orjson else 'missing'}, brotli {'installed' if responses.brotli else 'missing'}")
+    print(f"\n{'payload':<12} {'encoder':<20} {'cpu us/req':>11} {'bytes':>9} {'speedup':>8}")
+    bodies = {}
+    for payload, encoders in cases.items():
+        baseline = None
+        for name, encode in encoders.items():
+            body = encode()
+            assert json.loads(body) == json.loads(next(iter(encoders.values()))()), f"{payload}: {name} differs"
+            cpu = cpu_per_call(encode, args.repeats)
+            baseline = baseline or cpu
+            bodies[payload] = body
+            print(f"{payload:<12} {name:<20} {cpu:>11.1f} {len(body):>9} {baseline / cpu:>7.1f}x")
+
+    encodings = ["gzip"] + (["br"] if responses.brotli else [])
+    print(f"\n{'payload':<12} {'encoding':<10} {'cpu us/req':>11} {'bytes':>9} {'of identity':>12}")
+    for payload, body in bodies.items():
+        print(f"{payload:<12} {'identity':<10} {0.0:>11.1f} {len(body):>9} {1:>11.0%}")
+        for encoding in encodings:
+            compressed = responses.compress(body, encoding)
+            cpu = cpu_per_call(lambda: responses.compress(body, encoding), args.repeats)
+            print(f"{payload:<12} {encoding:<10} {cpu:>11.1f} {len(compressed):>9} {len(compressed) / len(body):>11.0%}")
+
+
+if __name__ == "__main__":
+    main()
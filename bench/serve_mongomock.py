@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+"""
+Run backend/server.py against an in-memory mongomock database.
+
+Used by the benchmark harness when no MongoDB server is available. Requires
+the mongomock-motor package (pip install mongomock-motor); numbers for Mongo
+operations are only indicative in this mode, and with --workers > 1 every
+worker has its own separate database.
+"""
+
+import argparse
+import sys
+from pathlib import Path
+
+import motor.motor_asyncio
+import uvicorn
+from mongomock_motor import AsyncMongoMockClient, enabled_gridfs_integration
+
+BACKEND_DIR = Path(__file__).parent.parent / "backend"
+
+# server.py binds the client class when imported, so swap it first. This
+# runs again in every worker process, each getting its own in-memory data.
+motor.motor_asyncio.AsyncIOMotorClient = AsyncMongoMockClient
+# GridFS (attachments) only accepts real databases unless patched for the life of the process
+_gridfs_patch = enabled_gridfs_integration()
+_gridfs_patch.__enter__()
+sys.path.insert(0, str(BACKEND_DIR))
+from server import app  # noqa: E402,F401
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the backend with an in-memory MongoDB")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--workers", type=int, default=1)
+    args = parser.parse_args()
+
+    uvicorn.run("serve_mongomock:app", host="127.0.0.1", port=args.port, workers=args.workers, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
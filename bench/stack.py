@@ -0,0 +1,105 @@
+"""
+Helpers for booting the backend and its local stand-ins as subprocesses.
+"""
+
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import ExitStack, contextmanager
+from pathlib import Path
+
+import requests
+
+ROOT_DIR = Path(__file__).parent.parent
+BACKEND_DIR = ROOT_DIR / "backend"
+BENCH_DIR = ROOT_DIR / "bench"
+
+
+def wait_for(url: str, timeout: float = 30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            requests.get(url, timeout=1)
+            return
+        except requests.RequestException:
+            time.sleep(0.2)
+    raise RuntimeError(f"{url} did not come up within {timeout}s")
+
+
+def fake_agentspace_command(port: int, latency: float, latency_dist: str = "fixed",
+                            jitter: float = 0.0, error_rate: float = 0.0, stall_rate: float = 0.0):
+    return [
+        sys.executable, str(BENCH_DIR / "fake_agentspace.py"),
+        "--port", str(port), "--latency", str(latency), "--latency-dist", latency_dist,
+        "--jitter", str(jitter), "--error-rate", str(error_rate), "--stall-rate", str(stall_rate),
+    ]
+
+
+def backend_command(port: int, mongo: str = "url", workers: int = 1, server: str = "uvicorn"):
+    if mongo == "mongomock":
+        return [sys.executable, str(BENCH_DIR / "serve_mongomock.py"), "--port", str(port), "--workers", str(workers)]
+    if server == "gunicorn":
+        # Uses backend/gunicorn.conf.py, like production
+        return [
+            sys.executable, "-m", "gunicorn", "server:app",
+            "--bind", f"127.0.0.1:{port}", "--workers", str(workers), "--log-level", "warning",
+        ]
+    return [
+        sys.executable, "-m", "uvicorn", "server:app",
+        "--port", str(port), "--workers", str(workers), "--log-level", "warning",
+    ]
+
+
+@contextmanager
+def local_mongod(port: int):
+    """Run a throwaway mongod (from PATH) on `port` and yield its URL."""
+    mongod = shutil.which("mongod")
+    if mongod is None:
+        raise RuntimeError("mongod not found on PATH; use --mongo url or --mongo mongomock")
+    dbpath = tempfile.mkdtemp(prefix="bench-mongo-")
+    process = subprocess.Popen(
+        [mongod, "--dbpath", dbpath, "--port", str(port), "--bind_ip", "127.0.0.1", "--quiet"],
+        stdout=subprocess.DEVNULL,
+    )
+    try:
+        time.sleep(2)
+        yield f"mongodb://127.0.0.1:{port}"
+    finally:
+        process.terminate()
+        process.wait()
+        shutil.rmtree(dbpath, ignore_errors=True)
+
+
+def _stop(process):
+    process.terminate()
+    process.wait()
+
+
+@contextmanager
+def running_stack(port: int, fake_port: int, latency: float, latency_dist: str = "fixed",
+                  jitter: float = 0.0, error_rate: float = 0.0, mongo: str = "url",
+                  workers: int = 1, extra_env=None, stall_rate: float = 0.0, server: str = "uvicorn"):
+    """Start the fake Agentspace and the backend; yield the backend base URL.
+
+    mongo is "url" (use MONGO_URL from the environment or backend/.env),
+    "mongod" (spawn a throwaway local mongod) or "mongomock" (in-memory).
+    server is "uvicorn" or "gunicorn"; mongomock always runs under uvicorn.
+    """
+    with ExitStack() as stack:
+        stack.callback(_stop, subprocess.Popen(fake_agentspace_command(fake_port, latency, latency_dist, jitter, error_rate, stall_rate)))
+
+        # Every load generator connects from 127.0.0.1, so per-IP rate limits would shed the benchmark itself
+        env = dict(os.environ, AGENTSPACE_ENDPOINT=f"127.0.0.1:{fake_port}", RATE_LIMIT_ENABLED="false")
+        env.update(extra_env or {})
+        if mongo == "mongod":
+            env["MONGO_URL"] = stack.enter_context(local_mongod(fake_port + 1))
+
+        backend = subprocess.Popen(backend_command(port, mongo, workers, server), cwd=BACKEND_DIR, env=env)
+        stack.callback(_stop, backend)
+
+        base_url = f"http://127.0.0.1:{port}"
+        wait_for(f"{base_url}/api/health/live")
+        yield base_url
@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+"""
+Cold-start benchmark for the backend.
+
+Measures, in fresh processes:
+
+  * how long `import server` takes, and which of its imports cost the most
+  * how long a worker takes from spawn until /api/health/live and
+    /api/health/ready answer, with AGENTSPACE_PREWARM on and off
+  * the latency of the first and second chat after startup
+
+Results are saved as JSON under bench/results/. With --compare, every
+timing is checked against an earlier run and the script exits non-zero
+when one regressed by more than --max-regression (and --min-delta-ms), so
+it can gate changes that slow down startup:
+
+    python bench/startup.py --mongo mongomock
+    python bench/startup.py --mongo mongomock --compare bench/results/startup-<earlier-run>.json
+"""
+
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from contextlib import ExitStack
+from datetime import datetime
+from pathlib import Path
+
+import requests
+
+from run import RESULTS_DIR, git_revision
+from stack import BACKEND_DIR, _stop, backend_command, fake_agentspace_command, local_mongod
+
+IMPORT_SNIPPET = "import time; started = time.perf_counter(); import server; print(time.perf_counter() - started)"
+
+
+def measure_import(repeats: int) -> dict:
+    """Median seconds to import server.py (and the interpreter around it) over `repeats` runs."""
+    import_times, process_times = [], []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        output = subprocess.check_output([sys.executable, "-c", IMPORT_SNIPPET], cwd=BACKEND_DIR, text=True)
+        process_times.append(time.perf_counter() - started)
+        import_times.append(float(output.strip().splitlines()[-1]))
+    return {"import_ms": 1000 * statistics.median(import_times), "process_ms": 1000 * statistics.median(process_times)}
+
+
+def slowest_imports(limit: int) -> list:
+    """Direct imports of server.py ranked by cumulative import time, from `python -X importtime`."""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", "import server"],
+                            cwd=BACKEND_DIR, capture_output=True, text=True, check=True)
+    modules = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|", 2)
+        # Nesting is shown by two spaces per level; depth 1 are the modules server.py imports itself
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        if depth == 1 and cumulative.strip().isdigit():
+            modules.append((name.strip(), int(cumulative) / 1000))
+    return sorted(modules, key=lambda module: module[1], reverse=True)[:limit]
+
+
+def wait_for_port(port: int, timeout: float = 30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError(f"Port {port} did not open within {timeout}s")
+
+
+def poll_until_ok(url: str, process, timeout: float = 60) -> float:
+    """Seconds until `url` returns 2xx, polling every 10ms while `process` is running."""
+    started = time.perf_counter()
+    while time.perf_counter() - started < timeout:
+        if process.poll() is not None:
+            raise RuntimeError(f"Backend exited with code {process.returncode} during startup")
+        try:
+            if requests.get(url, timeout=1).ok:
+                return time.perf_counter() - started
+        except requests.RequestException:
+            pass
+        time.sleep(0.01)
+    raise RuntimeError(f"{url} was not ready within {timeout}s")
+
+
+def measure_boot(port: int, fake_port: int, latency: float, mongo: str, prewarm: bool, mongo_url=None) -> dict:
+    """Spawn one backend worker and time it until it is live, ready and has answered two chats."""
+    env = dict(os.environ, AGENTSPACE_ENDPOINT=f"127.0.0.1:{fake_port}", AGENTSPACE_PREWARM="true" if prewarm else "false")
+    if mongo_url:
+        env["MONGO_URL"] = mongo_url
+    base_url = f"http://127.0.0.1:{port}"
+
+    spawned = time.perf_counter()
+    backend = subprocess.Popen(backend_command(port, mongo), cwd=BACKEND_DIR, env=env)
+    try:
+        poll_until_ok(f"{base_url}/api/health/live", backend)
+        live = time.perf_counter() - spawned
+        poll_until_ok(f"{base_url}/api/health/ready", backend)
+        ready = time.perf_counter() - spawned
+
+        chats = []
+        for n in range(2):
+            started = time.perf_counter()
+            response = requests.post(
+                f"{base_url}/api/chat",
+                json={"message": f"What is the company's vacation policy? (startup {n})", "sessionId": None},
+                headers={"X-Cache-Bypass": "1"},
+                timeout=60,
+            )
+            response.raise_for_status()
+            chats.append(time.perf_counter() - started)
+    finally:
+        _stop(backend)
+
+    return {"live_ms": 1000 * live, "ready_ms": 1000 * ready, "first_chat_ms": 1000 * chats[0], "second_chat_ms": 1000 * chats[1]}
+
+
+def regressions(results: dict, baseline: dict, max_regression: float, min_delta_ms: float) -> list:
+    found = []
+    for section, stats in results["timings"].items():
+        before = baseline.get("timings", {}).get(section, {})
+        for key, value in stats.items():
+            previous = before.get(key)
+            if previous and value - previous > min_delta_ms and value > previous * (1 + max_regression):
+                found.append(f"{section}.{key}: {previous:.0f} ms -> {value:.0f} ms ({100 * (value - previous) / previous:+.0f}%)")
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure backend import and startup time")
+    parser.add_argument("--repeats", type=int, default=5, help="Fresh interpreters used for the import timing")
+    parser.add_argument("--boots", type=int, default=3, help="Worker boots per prewarm setting (median is reported)")
+    parser.add_argument("--mongo", choices=["url", "mongod", "mongomock"], default="url",
+                        help="url: MONGO_URL; mongod: throwaway local mongod; mongomock: in-memory")
+    parser.add_argument("--latency", type=float, default=0.05, help="Fake Agentspace latency (s)")
+    parser.add_argument("--port", type=int, default=8012)
+    parser.add_argument("--fake-port", type=int, default=50052)
+    parser.add_argument("--compare", type=Path, help="Earlier startup results file to compare against")
+    parser.add_argument("--max-regression", type=float, default=0.2, help="Allowed slowdown as a fraction of the baseline")
+    parser.add_argument("--min-delta-ms", type=float, default=50, help="Ignore slowdowns smaller than this")
+    parser.add_argument("--no-save", action="store_true")
+    args = parser.parse_args()
+
+    timings = {"import": measure_import(args.repeats)}
+    print(f"import server: {timings['import']['import_ms']:.0f} ms "
+          f"(whole interpreter {timings['import']['process_ms']:.0f} ms, median of {args.repeats})")
+    print("slowest direct imports:")
+    for name, ms in slowest_imports(8):
+        print(f"  {name:<40} {ms:>8.1f} ms")
+
+    with ExitStack() as stack:
+        stack.callback(_stop, subprocess.Popen(fake_agentspace_command(args.fake_port, args.latency)))
+        wait_for_port(args.fake_port)
+        mongo_url = stack.enter_context(local_mongod(args.fake_port + 1)) if args.mongo == "mongod" else None
+
+        print(f"\n{'prewarm':<8} {'live ms':>9} {'ready ms':>9} {'1st chat ms':>12} {'2nd chat ms':>12}")
+        for prewarm in (True, False):
+            boots = [measure_boot(args.port, args.fake_port, args.latency, args.mongo, prewarm, mongo_url)
+                     for _ in range(args.boots)]
+            stats = {key: statistics.median(boot[key] for boot in boots) for key in boots[0]}
+            timings["prewarm" if prewarm else "lazy"] = stats
+            print(f"{'on' if prewarm else 'off':<8} {stats['live_ms']:>9.0f} {stats['ready_ms']:>9.0f} "
+                  f"{stats['first_chat_ms']:>12.0f} {stats['second_chat_ms']:>12.0f}")
+
+    results = {
+        "revision": git_revision(),
+        "created_at": datetime.utcnow().isoformat(),
+        "mongo": args.mongo,
+        "latency": args.latency,
+        "timings": timings,
+    }
+    if not args.no_save:
+        RESULTS_DIR.mkdir(exist_ok=True)
+        path = RESULTS_DIR / f"startup-{datetime.utcnow():%Y%m%d-%H%M%S}-{results['revision']}.json"
+        path.write_text(json.dumps(results, indent=2))
+        print(f"\nSaved {path}")
+
+    if args.compare:
+        found = regressions(results, json.loads(args.compare.read_text()), args.max_regression, args.min_delta_ms)
+        if found:
+            print(f"\nStartup regressions against {args.compare}:")
+            for line in found:
+                print(f"  {line}")
+            sys.exit(1)
+        print(f"\nNo startup regressions against {args.compare}")
+
+
+if __name__ == "__main__":
+    main()
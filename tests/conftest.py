@@ -0,0 +1,62 @@
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT_DIR = Path(__file__).parent.parent
+
+# The backend is a flat directory of modules imported by name, as server.py does. The bench
+# scripts share some of those names, so they go last; only fake_agentspace is imported from there
+sys.path.insert(0, str(ROOT_DIR / "backend"))
+sys.path.append(str(ROOT_DIR / "bench"))
+
+
+@pytest.fixture(scope="session")
+def server():
+    """backend/server.py on an in-memory MongoDB (mongomock-motor)."""
+    mongomock_motor = pytest.importorskip("mongomock_motor")
+    import motor.motor_asyncio
+
+    os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+    os.environ.setdefault("DB_NAME", "test_database")
+    # server.py binds the client class when imported, so swap it first
+    motor.motor_asyncio.AsyncIOMotorClient = mongomock_motor.AsyncMongoMockClient
+    import server
+    server.agentspace.AGENTSPACE_PREWARM = False
+    return server
+
+
+@pytest.fixture
+def api(server, monkeypatch):
+    """TestClient for the app, with Agentspace served by bench/fake_agentspace.py in the app's loop.
+
+    The fake is available as `api.fake`. Each test gets a fresh breaker,
+    retry budget, drain state and upstream channel; failed calls are not
+    retried so injected errors surface at once.
+    """
+    pytest.importorskip("google.cloud.discoveryengine_v1beta")
+    import mongomock_motor
+    from fastapi.testclient import TestClient
+
+    from fake_agentspace import FakeAgentspace, start_server
+    from lifecycle import Lifecycle
+    from resilience import CircuitBreaker, RetryBudget
+
+    agentspace = server.agentspace
+    monkeypatch.setattr(agentspace, "breaker", CircuitBreaker(failure_threshold=100, cooldown=60))
+    monkeypatch.setattr(agentspace, "retry_budget", RetryBudget(ratio=0.2))
+    monkeypatch.setattr(agentspace, "AGENTSPACE_MAX_RETRIES", 0)
+    monkeypatch.setattr(server, "lifecycle", Lifecycle(drain_timeout=5))
+    fake = FakeAgentspace(latency=0)
+    # GridFS (attachments) only accepts real databases unless patched
+    with mongomock_motor.enabled_gridfs_integration(), TestClient(server.app) as client:
+        upstream, port = client.portal.call(start_server, fake)
+        pool = agentspace.AgentspacePool(size=1, endpoint=f"127.0.0.1:{port}")
+        monkeypatch.setattr(agentspace, "pool", pool)
+        client.fake = fake
+        try:
+            yield client
+        finally:
+            client.portal.call(pool.close)
+            client.portal.call(upstream.stop, None)
@@ -0,0 +1,197 @@
+import asyncio
+from collections import Counter
+
+import pytest
+
+import admission
+from admission import ConcurrencyLimiter, Rejected, SharedUsage, TokenBuckets
+from scheduler import PRIORITY_BATCH, PRIORITY_INTERACTIVE, set_request_class
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(admission.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_bucket_allows_a_burst_then_reports_the_wait(clock):
+    buckets = TokenBuckets(rate=2, burst=3)
+    assert [buckets.take("a") for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert buckets.take("a") == pytest.approx(0.5)
+
+
+def test_bucket_refills_at_rate_up_to_burst(clock):
+    buckets = TokenBuckets(rate=2, burst=3)
+    for _ in range(3):
+        buckets.take("a")
+    clock[0] += 1
+    assert buckets.take("a") == 0.0
+    assert buckets.take("a") == 0.0
+    assert buckets.take("a") > 0
+
+    clock[0] += 60
+    assert [buckets.take("a") for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert buckets.take("a") > 0
+
+
+def test_buckets_are_per_key(clock):
+    buckets = TokenBuckets(rate=1, burst=1)
+    assert buckets.take("a") == 0.0
+    assert buckets.take("a") > 0
+    assert buckets.take("b") == 0.0
+
+
+def test_debit_drains_the_bucket_below_zero(clock):
+    buckets = TokenBuckets(rate=1, burst=5)
+    buckets.take("a")
+    buckets.debit("a", 6)
+    assert buckets.take("a") == pytest.approx(3)
+
+
+def test_least_recently_used_bucket_is_dropped(clock):
+    buckets = TokenBuckets(rate=1, burst=1, max_keys=2)
+    buckets.take("a")
+    buckets.take("b")
+    buckets.take("a")
+    buckets.take("c")
+    assert len(buckets) == 2
+    # "b" was evicted and comes back full
+    assert buckets.take("b") == 0.0
+
+
+async def _hold(limiter, priority, client, outcomes, hold=0.05):
+    set_request_class(priority, client)
+    try:
+        granted = await limiter.acquire()
+    except Rejected as e:
+        outcomes[client, e.reason] += 1
+        return
+    outcomes[client, "admitted"] += 1
+    await asyncio.sleep(hold)
+    limiter.release(granted)
+
+
+def test_one_client_cannot_fill_the_queue_for_others():
+    async def run():
+        limiter = ConcurrencyLimiter(max_concurrent=2, max_queue=8, queue_timeout=5, client_share=0.25,
+                                     interactive_reserve=0)
+        outcomes = Counter()
+        tasks = [asyncio.create_task(_hold(limiter, PRIORITY_INTERACTIVE, "busy", outcomes)) for _ in range(20)]
+        tasks += [asyncio.create_task(_hold(limiter, PRIORITY_INTERACTIVE, f"user{n}", outcomes)) for n in range(4)]
+        await asyncio.gather(*tasks)
+        return outcomes
+
+    outcomes = asyncio.run(run())
+    # Two slots plus two queue places (a quarter of eight)
+    assert outcomes["busy", "admitted"] == 4
+    assert outcomes["busy", "Too many queued requests from this client"] == 16
+    assert all(outcomes[f"user{n}", "admitted"] == 1 for n in range(4))
+
+
+def test_batch_requests_leave_the_interactive_share_of_the_queue():
+    async def run():
+        limiter = ConcurrencyLimiter(max_concurrent=1, max_queue=8, queue_timeout=5, client_share=1,
+                                     interactive_reserve=0.5)
+        outcomes = Counter()
+        tasks = [asyncio.create_task(_hold(limiter, PRIORITY_BATCH, f"batch{n}", outcomes, hold=0.01))
+                 for n in range(10)]
+        tasks += [asyncio.create_task(_hold(limiter, PRIORITY_INTERACTIVE, f"user{n}", outcomes, hold=0.01))
+                  for n in range(4)]
+        await asyncio.gather(*tasks)
+        return outcomes
+
+    outcomes = asyncio.run(run())
+    batch_admitted = sum(count for (client, outcome), count in outcomes.items()
+                         if client.startswith("batch") and outcome == "admitted")
+    # One slot plus half of the queue
+    assert batch_admitted == 5
+    assert all(outcomes[f"user{n}", "admitted"] == 1 for n in range(4))
+
+
+def test_queued_request_is_rejected_after_the_timeout():
+    async def run():
+        limiter = ConcurrencyLimiter(max_concurrent=1, max_queue=4, queue_timeout=0.01)
+        outcomes = Counter()
+        await asyncio.gather(
+            _hold(limiter, PRIORITY_INTERACTIVE, "first", outcomes, hold=0.2),
+            _hold(limiter, PRIORITY_INTERACTIVE, "second", outcomes),
+        )
+        return outcomes, limiter.queued, limiter.active
+
+    outcomes, queued, active = asyncio.run(run())
+    assert outcomes["second", "Timed out waiting for a free slot"] == 1
+    assert (queued, active) == (0, 0)
+
+
+def _workers(count):
+    """SharedUsage for `count` workers sharing one in-memory rate_limits collection."""
+    mongomock_motor = pytest.importorskip("mongomock_motor")
+    collection = mongomock_motor.AsyncMongoMockClient()["admission"]["rate_limits"]
+    return [SharedUsage(collection, {"session": TokenBuckets(rate=1, burst=5)}, interval=60) for _ in range(count)]
+
+
+def _use(worker, key, times):
+    for _ in range(times):
+        assert worker.buckets["session"].take(key) == 0.0
+        worker.record("session", key)
+
+
+def test_usage_on_another_worker_is_debited_as_it_happens(clock):
+    async def run():
+        a, b = _workers(2)
+        _use(a, "s1", 1)
+        await a.sync()
+        _use(b, "s1", 3)
+        await b.sync()
+        # a did not use the key this interval but still sees b's three requests
+        await a.sync()
+        return a.buckets["session"].take("s1"), a.buckets["session"].take("s1"), a.stats["remote_debits"]
+
+    first, second, debited = asyncio.run(run())
+    assert (first, debited) == (0.0, 3)
+    assert second > 0
+
+
+def test_remote_usage_from_before_an_idle_spell_is_not_debited(clock):
+    async def run():
+        a, b = _workers(2)
+        _use(a, "s1", 1)
+        await a.sync()
+        clock[0] += 60
+        await a.sync()
+        for _ in range(200):
+            _use(b, "s1", 1)
+            clock[0] += 1
+        await b.sync()
+        _use(a, "s1", 1)
+        await a.sync()
+        return a.buckets["session"].take("s1")
+
+    assert asyncio.run(run()) == 0.0
+
+
+def test_a_single_debit_never_exceeds_the_burst(clock):
+    async def run():
+        a, b = _workers(2)
+        _use(a, "s1", 1)
+        await a.sync()
+        b.buckets["session"].burst = 1000
+        _use(b, "s1", 1000)
+        await b.sync()
+        await a.sync()
+        return a.buckets["session"].take("s1")
+
+    # Four tokens left, minus at most a burst of five: two seconds to wait, not a thousand
+    assert asyncio.run(run()) == pytest.approx(2)
+
+
+def test_session_limit_stays_on_with_the_address_limit_off(clock):
+    controller = admission.AdmissionController(enabled=False, session_enabled=True)
+    for _ in range(100):
+        controller.check("ip", "10.0.0.1")
+    for _ in range(int(admission.RATE_LIMIT_SESSION_BURST)):
+        controller.check("session", "s1")
+    with pytest.raises(Rejected) as excinfo:
+        controller.check("session", "s1")
+    assert excinfo.value.reason == "Rate limit exceeded for this session"
@@ -0,0 +1,145 @@
+"""Circuit breaker and retry behaviour of agentspace.converse() against bench/fake_agentspace.py."""
+
+import asyncio
+
+import pytest
+
+pytest.importorskip("google.cloud.discoveryengine_v1beta")
+
+import agentspace  # noqa: E402
+from agentspace import AgentspaceBusy, AgentspacePool, converse, conversation_request  # noqa: E402
+from fake_agentspace import FakeAgentspace, start_server  # noqa: E402
+from resilience import CircuitBreaker, CircuitOpen, RetryBudget  # noqa: E402
+from scheduler import FairScheduler  # noqa: E402
+
+NEW_CONVERSATION = "projects/1/locations/global/collections/default_collection/dataStores/hr/conversations/-"
+
+
+@pytest.fixture
+def upstream(monkeypatch):
+    """Fresh breaker, retry budget and slots for each test, with quick retries."""
+    monkeypatch.setattr(agentspace, "breaker", CircuitBreaker(failure_threshold=3, cooldown=60))
+    monkeypatch.setattr(agentspace, "retry_budget", RetryBudget(ratio=0.2, min_tokens=10))
+    monkeypatch.setattr(agentspace, "scheduler", FairScheduler(4, "test"))
+    monkeypatch.setattr(agentspace, "AGENTSPACE_MAX_RETRIES", 2)
+    monkeypatch.setattr(agentspace, "AGENTSPACE_RETRY_BASE", 0.001)
+    monkeypatch.setattr(agentspace, "AGENTSPACE_HEDGE", False)
+    return agentspace
+
+
+def run_against_fake(monkeypatch, scenario, **fake_options):
+    """Run `scenario(fake)` with agentspace pointed at a fresh in-process fake."""
+
+    async def run():
+        fake = FakeAgentspace(latency=0, **fake_options)
+        server, port = await start_server(fake)
+        pool = AgentspacePool(size=1, endpoint=f"127.0.0.1:{port}")
+        monkeypatch.setattr(agentspace, "pool", pool)
+        try:
+            return await scenario(fake)
+        finally:
+            await pool.close()
+            await server.stop(None)
+
+    return asyncio.run(run())
+
+
+async def retryable_errors():
+    return (await agentspace.load_stack_async()).retryable_errors
+
+
+async def ask(idempotent=True, timeout=5):
+    request = await conversation_request(NEW_CONVERSATION, "How many vacation days do I get?")
+    return await converse(request, timeout=timeout, idempotent=idempotent)
+
+
+def test_success_closes_the_breaker(upstream, monkeypatch):
+    async def scenario(fake):
+        response = await ask()
+        return fake.calls, response.reply.summary.summary_text
+
+    calls, reply = run_against_fake(monkeypatch, scenario)
+    assert calls == 1
+    assert "vacation days" in reply
+    assert upstream.breaker.state == "closed"
+
+
+def test_idempotent_call_is_retried_then_counts_one_failure(upstream, monkeypatch):
+    async def scenario(fake):
+        with pytest.raises(await retryable_errors()):
+            await ask()
+        return fake.calls
+
+    assert run_against_fake(monkeypatch, scenario, error_rate=1.0) == 3
+    assert upstream.breaker.failures == 1
+    assert upstream.retry_budget.tokens == pytest.approx(10 + 0.2 - 2)
+
+
+def test_follow_up_turns_are_not_retried(upstream, monkeypatch):
+    async def scenario(fake):
+        with pytest.raises(await retryable_errors()):
+            await ask(idempotent=False)
+        return fake.calls
+
+    assert run_against_fake(monkeypatch, scenario, error_rate=1.0) == 1
+
+
+def test_retries_stop_when_the_budget_is_spent(upstream, monkeypatch):
+    monkeypatch.setattr(agentspace, "retry_budget", RetryBudget(ratio=0, min_tokens=1))
+
+    async def scenario(fake):
+        for _ in range(2):
+            with pytest.raises(await retryable_errors()):
+                await ask()
+        return fake.calls
+
+    # The first call retries once on the single token; the second is not retried at all
+    assert run_against_fake(monkeypatch, scenario, error_rate=1.0) == 3
+
+
+def test_breaker_opens_and_then_fails_fast(upstream, monkeypatch):
+    async def scenario(fake):
+        for _ in range(3):
+            with pytest.raises(await retryable_errors()):
+                await ask(idempotent=False)
+        calls = fake.calls
+        with pytest.raises(CircuitOpen):
+            await ask()
+        return calls, fake.calls
+
+    calls_before, calls_after = run_against_fake(monkeypatch, scenario, error_rate=1.0)
+    assert calls_before == calls_after == 3
+    assert upstream.breaker.state == "open"
+
+
+def test_half_open_probe_closes_the_breaker_once_upstream_recovers(upstream, monkeypatch):
+    async def scenario(fake):
+        for _ in range(3):
+            with pytest.raises(await retryable_errors()):
+                await ask(idempotent=False)
+        fake.error_rate = 0.0
+        upstream.breaker.opened_at -= upstream.breaker.cooldown
+        await ask()
+
+    run_against_fake(monkeypatch, scenario, error_rate=1.0)
+    assert upstream.breaker.state == "closed"
+    assert upstream.breaker.failures == 0
+
+
+def test_waiting_for_a_local_slot_does_not_count_against_upstream(upstream, monkeypatch):
+    monkeypatch.setattr(agentspace, "scheduler", FairScheduler(1, "test"))
+
+    async def scenario(fake):
+        held = await upstream.scheduler.acquire()
+        try:
+            for _ in range(5):
+                with pytest.raises(AgentspaceBusy):
+                    await ask(timeout=0.01)
+        finally:
+            upstream.scheduler.release(held)
+        return fake.calls
+
+    assert run_against_fake(monkeypatch, scenario) == 0
+    assert upstream.breaker.state == "closed"
+    assert upstream.breaker.failures == 0
+    assert upstream.retry_budget.tokens == pytest.approx(10 + 5 * 0.2)
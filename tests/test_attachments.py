@@ -0,0 +1,92 @@
+import uuid
+
+import pytest
+
+import attachments
+
+
+@pytest.fixture
+def small_limits(monkeypatch):
+    monkeypatch.setattr(attachments, "ATTACHMENT_MAX_BYTES", 4096)
+    monkeypatch.setattr(attachments, "ATTACHMENT_CHUNK_SIZE", 1024)
+
+
+def stored_files(server, filename):
+    async def run():
+        files = await server.db["attachments.files"].find({"filename": filename}).to_list(None)
+        chunks = await server.db["attachments.chunks"].count_documents({"files_id": {"$in": [f["_id"] for f in files]}})
+        return len(files), chunks
+    return run
+
+
+def test_upload_is_stored_extracted_and_sent_with_a_question(api):
+    filename = f"policy-{uuid.uuid4().hex}.txt"
+    upload = api.post("/api/attachments", files={"file": (filename, b"Employees get 25 vacation days.", "text/plain")})
+    assert upload.status_code == 200
+    [info] = upload.json()
+    assert (info["filename"], info["status"], info["size"]) == (filename, "ready", 31)
+
+    download = api.get(f"/api/attachments/{info['id']}/content")
+    assert download.content == b"Employees get 25 vacation days."
+    assert download.headers["Content-Disposition"] == f'attachment; filename="{filename}"'
+
+    chat = api.post("/api/chat", json={"message": "How many vacation days?", "attachmentIds": [info["id"]]})
+    assert chat.headers["X-Cache"] == "BYPASS"
+    assert "Employees get 25 vacation days." in chat.json()["reply"]
+
+
+def test_oversized_file_is_rejected_and_earlier_files_are_rolled_back(api, server, small_limits):
+    kept, oversized = f"kept-{uuid.uuid4().hex}.txt", f"big-{uuid.uuid4().hex}.txt"
+    response = api.post("/api/attachments", files=[
+        ("file", (kept, b"a" * 2048, "text/plain")),
+        ("file", (oversized, b"b" * 5000, "text/plain")),
+    ])
+    assert response.status_code == 413
+    assert oversized in response.json()["detail"]
+    assert api.portal.call(stored_files(server, kept)) == (0, 0)
+    assert api.portal.call(stored_files(server, oversized)) == (0, 0)
+    assert server.attachment_store.stats["rejected"] >= 1
+
+
+def test_file_at_the_limit_is_accepted(api, small_limits):
+    response = api.post("/api/attachments", files={"file": (f"{uuid.uuid4().hex}.txt", b"a" * 4096, "text/plain")})
+    assert response.status_code == 200
+    assert response.json()[0]["size"] == 4096
+
+
+def test_too_many_files_are_rejected(api, monkeypatch):
+    monkeypatch.setattr(attachments, "ATTACHMENT_MAX_FILES", 2)
+    files = [("file", (f"{n}-{uuid.uuid4().hex}.txt", b"x", "text/plain")) for n in range(3)]
+    assert api.post("/api/attachments", files=files).status_code == 413
+
+
+def test_non_multipart_upload_is_415(api):
+    response = api.post("/api/attachments", json={"file": "not a file"})
+    assert response.status_code == 415
+    assert response.json()["detail"] == "Expected multipart/form-data"
+
+
+def test_upload_without_files_is_400(api):
+    assert api.post("/api/attachments", files={"note": (None, "no files")}).status_code == 400
+
+
+def test_unknown_attachment_is_404_and_a_chat_naming_it_is_400(api):
+    assert api.get("/api/attachments/nope").status_code == 404
+    assert api.get("/api/attachments/nope/content").status_code == 404
+    chat = api.post("/api/chat", json={"message": "Summarise this", "attachmentIds": ["nope"]})
+    assert chat.status_code == 400
+    assert api.fake.calls == 0
+
+
+def test_content_disposition_keeps_ascii_names_as_they_are(server):
+    assert server.content_disposition("policy 2024.pdf") == 'attachment; filename="policy 2024.pdf"'
+
+
+def test_content_disposition_adds_the_exact_name_per_rfc_5987(server):
+    assert server.content_disposition("Überstunden 2024.pdf") == (
+        "attachment; filename=\"Uberstunden 2024.pdf\"; filename*=UTF-8''%C3%9Cberstunden%202024.pdf"
+    )
+    assert server.content_disposition('say "hi".txt') == (
+        "attachment; filename=\"say _hi_.txt\"; filename*=UTF-8''say%20%22hi%22.txt"
+    )
+    assert server.content_disposition("給与.pdf") == "attachment; filename=\"download.pdf\"; filename*=UTF-8''%E7%B5%A6%E4%B8%8E.pdf"
@@ -0,0 +1,131 @@
+import asyncio
+import json
+import uuid
+
+from batch import run_bounded
+
+
+def collect(items, answer, concurrency, **options):
+    async def run():
+        return [result async for result in run_bounded(items, answer, concurrency, **options)]
+    return asyncio.run(run())
+
+
+def test_at_most_concurrency_items_run_at_once():
+    running, peak = [0], [0]
+
+    async def answer(item):
+        running[0] += 1
+        peak[0] = max(peak[0], running[0])
+        await asyncio.sleep(0.01)
+        running[0] -= 1
+        return f"reply {item}"
+
+    results = collect(list(range(20)), answer, 3)
+    assert peak[0] == 3
+    assert sorted((index, reply) for index, reply, _, _ in results) == [(n, f"reply {n}") for n in range(20)]
+
+
+def test_errors_are_reported_per_item():
+    async def answer(item):
+        if item == 1:
+            raise ValueError("bad item")
+        return "ok"
+
+    results = {index: (reply, error) for index, reply, error, _ in collect([0, 1, 2], answer, 2)}
+    assert results[0] == ("ok", None) and results[2] == ("ok", None)
+    assert results[1][0] is None and str(results[1][1]) == "bad item"
+
+
+def test_items_with_the_same_key_run_in_order_one_at_a_time():
+    events = []
+
+    async def answer(item):
+        session, turn, delay = item
+        events.append(("start", session, turn))
+        await asyncio.sleep(delay)
+        events.append(("end", session, turn))
+
+    # The later turns of "a" are quicker, so unordered they would overtake the first
+    items = [("a", 0, 0.05), ("b", 0, 0.01), ("a", 1, 0.01), ("a", 2, 0), (None, 0, 0.01), (None, 1, 0.01)]
+    collect(items, answer, 4, key=lambda item: item[0])
+
+    turns_of_a = [(kind, turn) for kind, session, turn in events if session == "a"]
+    assert turns_of_a == [("start", 0), ("end", 0), ("start", 1), ("end", 1), ("start", 2), ("end", 2)]
+    # Other sessions and keyless items did not wait for "a"
+    assert events.index(("end", "b", 0)) < events.index(("end", "a", 0))
+    assert events.index(("end", None, 1)) < events.index(("end", "a", 0))
+
+
+def test_stopping_early_cancels_the_rest():
+    cancelled = []
+
+    async def answer(item):
+        try:
+            await asyncio.sleep(0 if item == 0 else 10)
+        except asyncio.CancelledError:
+            cancelled.append(item)
+            raise
+
+    async def run():
+        results = run_bounded([0, 1, 2], answer, 3)
+        first = await results.__anext__()
+        await results.aclose()
+        await asyncio.sleep(0)
+        return first
+
+    assert asyncio.run(run())[0] == 0
+    assert sorted(cancelled) == [1, 2]
+
+
+def run_batch(api, items, **options):
+    response = api.post("/api/chat/batch", json={"items": items, **options})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    return [json.loads(line) for line in response.text.splitlines()]
+
+
+def test_batch_streams_run_results_and_summary_as_ndjson(api):
+    questions = [f"Question {n} {uuid.uuid4().hex}" for n in range(5)]
+    lines = run_batch(api, [{"message": question} for question in questions] + [
+        {"message": "And then?", "sessionId": "unknown-token"},
+    ], label="smoke", concurrency=2)
+
+    run, results, summary = lines[0], lines[1:-1], lines[-1]
+    assert (run["type"], run["label"], run["total"]) == ("run", "smoke", 6)
+    assert {line["type"] for line in results} == {"result"}
+    assert sorted(line["index"] for line in results) == list(range(6))
+    by_index = {line["index"]: line for line in results}
+    assert all(by_index[n]["status"] == "ok" and questions[n] in by_index[n]["reply"] for n in range(5))
+    assert (by_index[5]["status"], by_index[5]["error"]) == ("error", "Unknown or expired session")
+    assert (summary["type"], summary["runId"], summary["succeeded"], summary["failed"]) == ("summary", run["runId"], 5, 1)
+
+    stored = api.get(f"/api/chat/batch/runs/{run['runId']}").json()
+    assert (stored["status"], stored["succeeded"], stored["failed"]) == ("completed", 5, 1)
+    assert [result["index"] for result in stored["results"]] == list(range(6))
+
+
+def test_turns_of_one_session_run_in_request_order(api):
+    session_id = api.post("/api/chat", json={"message": f"Hello {uuid.uuid4().hex}"}).json()["sessionId"]
+    api.fake.latency = 0.02
+    lines = run_batch(api, [{"message": f"Turn {n}", "sessionId": session_id} for n in range(4)], concurrency=4)
+    # With four slots free, only the per-session ordering keeps them from finishing together
+    assert [line["index"] for line in lines[1:-1]] == [0, 1, 2, 3]
+    assert all(line["status"] == "ok" for line in lines[1:-1])
+
+
+def test_diff_reports_changed_and_missing_questions(api):
+    shared, dropped, added = (f"{name} {uuid.uuid4().hex}" for name in ("Shared", "Dropped", "Added"))
+    base = run_batch(api, [{"message": shared}, {"message": dropped}])[0]["runId"]
+    api.fake.reply = "A revised HR answer."
+    target = run_batch(api, [{"message": shared.upper()}, {"message": added}])[0]["runId"]
+
+    diff = api.get("/api/chat/batch/diff", params={"base": base, "target": target}).json()
+    assert diff["unchanged"] == 0
+    [changed] = diff["changed"]
+    assert changed["message"] == shared.upper()
+    assert changed["before"].startswith("This is a canned HR answer.")
+    assert changed["after"].startswith("A revised HR answer.")
+    assert (diff["onlyInBase"], diff["onlyInTarget"]) == ([dropped], [added])
+
+    assert api.get("/api/chat/batch/diff", params={"base": base, "target": "nope"}).status_code == 404
@@ -0,0 +1,39 @@
+import asyncio
+
+from batching import WriteBehindBuffer
+
+
+class FakeCollection:
+    name = "status_checks"
+
+    def __init__(self):
+        self.documents = []
+
+    async def insert_many(self, documents, ordered=True):
+        self.documents += documents
+
+
+def test_failing_callback_does_not_stop_later_flushes():
+    async def run():
+        collection = FakeCollection()
+        flushed = []
+
+        def on_flushed(documents):
+            flushed.append(len(documents))
+            raise RuntimeError("rollup bookkeeping failed")
+
+        buffer = WriteBehindBuffer(collection, batch_size=2, flush_interval=0.01, on_flushed=on_flushed)
+        await buffer.start()
+        for n in range(3):
+            buffer.add({"id": n})
+        await asyncio.sleep(0.05)
+        buffer.add({"id": 3})
+        await asyncio.sleep(0.05)
+        running = not buffer._task.done()
+        await buffer.close()
+        return collection.documents, flushed, running
+
+    documents, flushed, running = asyncio.run(run())
+    assert [doc["id"] for doc in documents] == [0, 1, 2, 3]
+    assert sum(flushed) == 4
+    assert running
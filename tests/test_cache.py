@@ -0,0 +1,182 @@
+import asyncio
+import uuid
+from datetime import datetime, timedelta
+
+import httpx
+import pytest
+
+import cache
+from cache import AnswerCache, SingleFlight
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_variants_of_a_question_share_a_key():
+    assert AnswerCache.key_for("  How many VACATION days?? ") == AnswerCache.key_for("how many vacation days")
+
+
+def test_entry_expires_after_the_ttl_but_stays_available_as_stale(clock):
+    async def run():
+        answers = AnswerCache(ttl=10, max_entries=10)
+        await answers.set("q", "reply")
+        fresh = await answers.get("q")
+        clock[0] += 11
+        expired = await answers.get("q")
+        return fresh, expired, answers.get_stale("q"), answers.stats
+
+    fresh, expired, stale, stats = asyncio.run(run())
+    assert (fresh, expired, stale) == ("reply", None, "reply")
+    assert (stats["hits"], stats["expirations"], stats["misses"], stats["stale_hits"]) == (1, 1, 1, 1)
+
+
+def test_least_recently_used_entry_is_evicted(clock):
+    async def run():
+        answers = AnswerCache(ttl=60, max_entries=2)
+        await answers.set("a", "A")
+        await answers.set("b", "B")
+        await answers.get("a")
+        await answers.set("c", "C")
+        return [await answers.get(key) for key in "abc"], answers.stats["evictions"]
+
+    assert asyncio.run(run()) == (["A", None, "C"], 1)
+
+
+def test_mongo_tier_is_shared_between_workers():
+    mongomock_motor = pytest.importorskip("mongomock_motor")
+
+    async def run():
+        collection = mongomock_motor.AsyncMongoMockClient()["cache"]["answer_cache"]
+        first, second = AnswerCache(ttl=60, collection=collection), AnswerCache(ttl=60, collection=collection)
+        await first.set("q", "reply")
+        shared = await second.get("q")
+        # Now held in the second worker's memory as well
+        await collection.delete_many({})
+        local = await second.get("q")
+        return shared, local, second.stats
+
+    shared, local, stats = asyncio.run(run())
+    assert shared == local == "reply"
+    assert (stats["mongo_hits"], stats["hits"]) == (1, 1)
+
+
+def test_expired_mongo_entry_is_a_miss():
+    mongomock_motor = pytest.importorskip("mongomock_motor")
+
+    async def run():
+        collection = mongomock_motor.AsyncMongoMockClient()["cache"]["answer_cache"]
+        answers = AnswerCache(ttl=60, collection=collection)
+        await collection.insert_one({
+            "_id": AnswerCache._mongo_id("q"), "query": "q", "reply": "old",
+            "expires_at": datetime.utcnow() - timedelta(seconds=1),
+        })
+        return await answers.get("q")
+
+    assert asyncio.run(run()) is None
+
+
+def test_repeated_question_is_answered_from_the_cache(api):
+    question = f"What is the parental leave policy {uuid.uuid4().hex}?"
+    miss = api.post("/api/chat", json={"message": question})
+    hit = api.post("/api/chat", json={"message": question.upper() + "  "})
+    assert (miss.headers["X-Cache"], hit.headers["X-Cache"]) == ("MISS", "HIT")
+    assert hit.json()["reply"] == miss.json()["reply"]
+    assert api.fake.calls == 1
+
+
+def test_cached_answer_has_no_session_so_a_follow_up_starts_a_new_conversation(api):
+    question = f"How do I claim expenses {uuid.uuid4().hex}?"
+    first = api.post("/api/chat", json={"message": question}).json()
+    hit = api.post("/api/chat", json={"message": question}).json()
+    assert first["sessionId"]
+    assert hit["sessionId"] == ""
+
+    follow_up = api.post("/api/chat", json={"message": f"And for travel? {uuid.uuid4().hex}", "sessionId": hit["sessionId"]})
+    assert follow_up.headers["X-Cache"] == "MISS"
+    assert follow_up.json()["sessionId"] not in ("", first["sessionId"])
+
+
+def test_bypass_header_skips_the_cache(api):
+    question = f"Who approves overtime {uuid.uuid4().hex}?"
+    api.post("/api/chat", json={"message": question})
+    bypass = api.post("/api/chat", json={"message": question}, headers={"X-Cache-Bypass": "1"})
+    assert bypass.headers["X-Cache"] == "BYPASS"
+    assert bypass.json()["sessionId"]
+    assert api.fake.calls == 2
+
+
+class CountingUpstream:
+    """Answers after `delay` seconds, or raises `error`; counts the calls."""
+
+    def __init__(self, delay=0.05, error=None):
+        self.delay = delay
+        self.error = error
+        self.calls = 0
+
+    async def __call__(self):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        if self.error is not None:
+            raise self.error
+        return f"answer {self.calls}"
+
+
+def test_concurrent_identical_questions_make_one_upstream_call():
+    async def run():
+        flights, upstream = SingleFlight(), CountingUpstream()
+        key = flights.key_for("How many vacation days?")
+        results = await asyncio.gather(*(flights.do(key, upstream) for _ in range(10)))
+        return results, upstream.calls, flights.metrics()
+
+    results, calls, metrics = asyncio.run(run())
+    assert calls == 1
+    assert [reply for reply, _ in results] == ["answer 1"] * 10
+    assert [shared for _, shared in results] == [False] + [True] * 9
+    assert (metrics["upstream_calls"], metrics["upstream_calls_saved"], metrics["in_flight"]) == (1, 9, 0)
+
+
+def test_upstream_error_reaches_every_waiter():
+    async def run():
+        flights, upstream = SingleFlight(), CountingUpstream(error=RuntimeError("upstream down"))
+        results = await asyncio.gather(*(flights.do("q", upstream) for _ in range(5)), return_exceptions=True)
+        # Nothing is left behind, so the next call goes upstream again
+        upstream.error = None
+        retried = await flights.do("q", upstream)
+        return results, retried, upstream.calls
+
+    results, retried, calls = asyncio.run(run())
+    assert all(isinstance(result, RuntimeError) and str(result) == "upstream down" for result in results)
+    assert retried == ("answer 2", False)
+    assert calls == 2
+
+
+def test_leader_going_away_does_not_cancel_the_shared_call():
+    async def run():
+        flights, upstream = SingleFlight(), CountingUpstream()
+        leader = asyncio.create_task(flights.do("q", upstream))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(flights.do("q", upstream))
+        await asyncio.sleep(0)
+        leader.cancel()
+        return await follower, upstream.calls
+
+    assert asyncio.run(run()) == (("answer 1", True), 1)
+
+
+def test_concurrent_new_session_chats_share_one_upstream_call(api, server):
+    api.fake.latency = 0.2
+    question = f"When is the next payday {uuid.uuid4().hex}?"
+
+    async def run():
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://testserver") as client:
+            return await asyncio.gather(*(client.post("/api/chat", json={"message": question}) for _ in range(8)))
+
+    responses = api.portal.call(run)
+    assert api.fake.calls == 1
+    assert sorted(response.headers["X-Cache"] for response in responses) == ["COALESCED"] * 7 + ["MISS"]
+    assert len({response.json()["reply"] for response in responses}) == 1
@@ -0,0 +1,100 @@
+"""POST /api/chat/stream against bench/fake_agentspace.py."""
+
+import asyncio
+import json
+import uuid
+
+
+def events(body: str):
+    """(event, data) pairs of an SSE body, with comment lines as ("comment", text)."""
+    parsed = []
+    for block in body.split("\n\n"):
+        if block.startswith(":"):
+            parsed.append(("comment", block[1:].strip()))
+        elif block:
+            fields = dict(line.split(": ", 1) for line in block.splitlines())
+            parsed.append((fields["event"], json.loads(fields["data"])))
+    return parsed
+
+
+def question():
+    return f"How many vacation days do I get? {uuid.uuid4().hex}"
+
+
+def test_reply_streams_as_status_delta_and_done(api):
+    message = question()
+    response = api.post("/api/chat/stream", json={"message": message})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+
+    stream = events(response.text)
+    names = [name for name, _ in stream]
+    assert names[:2] == ["status", "status"]
+    assert [data["stage"] for _, data in stream[:2]] == ["understanding", "typing"]
+    assert set(names[2:-1]) == {"delta"}
+    assert names[-1] == "done"
+    done = stream[-1][1]
+    assert "".join(data["text"] for name, data in stream if name == "delta") == done["reply"]
+    assert message in done["reply"]
+    assert done["sessionId"]
+
+
+def test_keepalives_are_sent_while_upstream_is_slow(api, server, monkeypatch):
+    monkeypatch.setattr(server, "SSE_HEARTBEAT_SECONDS", 0.05)
+    api.fake.latency = 0.3
+    stream = events(api.post("/api/chat/stream", json={"message": question()}).text)
+    assert ("comment", "keepalive") in stream
+    assert stream[-1][0] == "done"
+
+
+def test_upstream_failure_ends_the_stream_with_an_error_event(api):
+    api.fake.error_rate = 1.0
+    stream = events(api.post("/api/chat/stream", json={"message": question()}).text)
+    assert [name for name, _ in stream] == ["status", "error"]
+    assert stream[-1][1] == {"status": 500, "detail": "Failed to get response from Agentspace"}
+
+
+def test_unknown_session_is_an_error_event(api):
+    stream = events(api.post("/api/chat/stream", json={"message": "And next year?", "sessionId": "nope"}).text)
+    assert stream[-1] == ("error", {"status": 404, "detail": "Unknown or expired session"})
+    assert api.fake.calls == 0
+
+
+def test_client_disconnect_stops_the_stream(api, server):
+    api.fake.latency = 2
+    body = json.dumps({"message": question()}).encode()
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "POST", "scheme": "http",
+        "path": "/api/chat/stream", "raw_path": b"/api/chat/stream", "root_path": "", "query_string": b"",
+        "headers": [(b"host", b"testserver"), (b"content-type", b"application/json")],
+        "client": ("127.0.0.1", 50000), "server": ("testserver", 80),
+    }
+
+    async def run():
+        sent, first_event, requested = [], asyncio.Event(), []
+
+        async def receive():
+            if not requested:
+                requested.append(True)
+                return {"type": "http.request", "body": body, "more_body": False}
+            # The client goes away once it has seen the first event
+            await first_event.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            sent.append(message)
+            if message.get("body", b"").startswith(b"event: status"):
+                first_event.set()
+
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        await asyncio.wait_for(server.app(scope, receive, send), 1)
+        return sent, loop.time() - started, server.lifecycle.metrics()["in_flight"]
+
+    sent, elapsed, in_flight = api.portal.call(run)
+    bodies = b"".join(message.get("body", b"") for message in sent)
+    assert bodies.startswith(b"event: status")
+    assert b"event: done" not in bodies
+    # Well before the upstream answer, and no longer counted as in flight
+    assert elapsed < 1
+    assert in_flight == 0
@@ -0,0 +1,96 @@
+"""Server-side chat history: /api/conversations and /api/conversations/messages."""
+
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+
+
+@pytest.fixture
+def record(api, server):
+    """record(session_id, turns): store `turns` question/answer pairs, each a minute after the last one."""
+    # Replies are stamped no earlier than now, so the questions are asked from now on
+    clock = [datetime.utcnow().replace(microsecond=0)]
+
+    def record(session_id, turns):
+        for n in range(turns):
+            clock[0] += timedelta(minutes=1)
+            api.portal.call(server.conversation_store.append_turn,
+                            session_id, f"question {n}", f"answer {n}", clock[0])
+        return session_id
+    return record
+
+
+def new_session():
+    return f"session-{uuid.uuid4().hex}"
+
+
+def messages(api, session_id, **params):
+    response = api.get("/api/conversations/messages", params={"sessionId": session_id, **params})
+    assert response.status_code == 200
+    return response.json()
+
+
+def test_before_cursor_pages_back_through_the_whole_history(api, record):
+    session_id = record(new_session(), 6)
+    page = messages(api, session_id, limit=5)
+    assert [m["content"] for m in page["messages"]] == ["answer 3", "question 4", "answer 4", "question 5", "answer 5"]
+
+    seen = page["messages"]
+    while page["olderCursor"]:
+        page = messages(api, session_id, limit=5, before=page["olderCursor"])
+        seen = page["messages"] + seen
+    assert [m["content"] for m in seen] == [text for n in range(6) for text in (f"question {n}", f"answer {n}")]
+    assert len({m["id"] for m in seen}) == 12
+
+
+def test_after_cursor_returns_only_newer_messages(api, record):
+    session_id = record(new_session(), 2)
+    latest = messages(api, session_id)
+    assert latest["olderCursor"] is None
+
+    nothing_new = messages(api, session_id, after=latest["newestCursor"])
+    assert nothing_new["messages"] == []
+    assert nothing_new["newestCursor"] == latest["newestCursor"]
+
+    record(session_id, 1)
+    newer = messages(api, session_id, after=latest["newestCursor"])
+    assert [m["role"] for m in newer["messages"]] == ["user", "bot"]
+    assert newer["newestCursor"] != latest["newestCursor"]
+
+
+@pytest.mark.parametrize("params", [
+    {"before": "not base64!"},
+    {"after": "bm90LWEtZGF0ZXxpZA=="},
+    {"before": "bm90LWEtZGF0ZXxpZA==", "after": "bm90LWEtZGF0ZXxpZA=="},
+])
+def test_bad_cursors_are_client_errors(api, params):
+    response = api.get("/api/conversations/messages", params={"sessionId": new_session(), **params})
+    assert response.status_code == 400
+
+
+def test_listing_only_covers_the_callers_sessions(api, record):
+    older, newer = new_session(), new_session()
+    record(older, 1)
+    record(newer, 2)
+    someone_else = record(new_session(), 1)
+
+    response = api.get("/api/conversations", params={"sessionId": [older, newer, new_session()]})
+    assert response.status_code == 200
+    listed = response.json()
+    assert [c["sessionId"] for c in listed] == [newer, older]
+    assert someone_else not in {c["sessionId"] for c in listed}
+    assert (listed[0]["title"], listed[0]["messageCount"], listed[0]["lastMessage"]) == ("question 0", 4, "answer 1")
+
+
+def test_listing_needs_between_one_and_the_page_maximum_of_session_ids(api, server):
+    assert api.get("/api/conversations").status_code == 400
+    too_many = [new_session() for _ in range(server.HISTORY_PAGE_MAX + 1)]
+    assert api.get("/api/conversations", params={"sessionId": too_many}).status_code == 400
+
+
+def test_chat_turns_are_recorded_under_the_returned_session(api):
+    chat = api.post("/api/chat", json={"message": f"Where is the payslip archive? {uuid.uuid4().hex}"}).json()
+    page = messages(api, chat["sessionId"])
+    assert [m["role"] for m in page["messages"]] == ["user", "bot"]
+    assert page["messages"][1]["content"] == chat["reply"]
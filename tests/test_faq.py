@@ -0,0 +1,61 @@
+import pytest
+
+from faq import TfidfIndex, terms
+
+FAQS = {
+    "vacation": ["How many vacation days do I get per year?", "What is my annual leave allowance?"],
+    "sick": ["How do I report sick leave?"],
+    "payroll": ["When is salary paid each month?", "What is the payroll date?"],
+    "expenses": ["How do I submit expense claims for travel?"],
+}
+
+
+@pytest.fixture(scope="module")
+def index():
+    return TfidfIndex([(faq_id, terms(question)) for faq_id, questions in FAQS.items() for question in questions])
+
+
+def test_terms_fold_case_drop_stop_words_and_add_word_pairs():
+    assert terms("How many Vacation days do I get?") == {
+        "many": 1, "vacation": 1, "days": 1, "many vacation": 1, "vacation days": 1,
+    }
+
+
+def test_exact_question_scores_one(index):
+    [(faq_id, score)] = index.search("How many vacation days do I get per year?")
+    assert faq_id == "vacation"
+    assert score == pytest.approx(1.0)
+
+
+def test_any_variant_matches_its_entry(index):
+    assert index.search("what is my ANNUAL LEAVE allowance")[0] == ("vacation", pytest.approx(1.0))
+    assert index.search("payroll date?")[0][0] == "payroll"
+
+
+def test_paraphrase_ranks_the_right_entry_first(index):
+    results = index.search("when do we get our salary paid", limit=4)
+    assert results[0][0] == "payroll"
+    assert results[0][1] > 0.5
+    assert [score for _, score in results] == sorted((score for _, score in results), reverse=True)
+
+
+def test_each_entry_is_reported_once_with_its_best_variant(index):
+    results = index.search("vacation days annual leave", limit=10)
+    ids = [faq_id for faq_id, _ in results]
+    assert len(ids) == len(set(ids))
+
+
+def test_unknown_words_dilute_the_score(index):
+    exact = index.search("How do I report sick leave?")[0][1]
+    padded = index.search("How do I report sick leave while hiking in Patagonia with my cousins?")[0][1]
+    assert padded < exact
+
+
+def test_unrelated_question_has_no_match(index):
+    assert index.search("Write a poem about Mondays") == []
+    assert index.search("the and of") == []
+
+
+def test_empty_index():
+    assert len(TfidfIndex([])) == 0
+    assert TfidfIndex([]).search("vacation days") == []
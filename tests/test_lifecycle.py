@@ -0,0 +1,118 @@
+import asyncio
+import os
+import signal
+import uuid
+
+import httpx
+import pytest
+
+from lifecycle import Draining, Lifecycle
+
+
+@pytest.fixture
+def restore_signal_handlers():
+    saved = {sig: signal.getsignal(sig) for sig in (signal.SIGTERM, signal.SIGINT)}
+    yield
+    for sig, handler in saved.items():
+        signal.signal(sig, handler)
+
+
+def test_drain_refuses_new_work_and_waits_for_in_flight():
+    async def run():
+        lifecycle = Lifecycle(drain_timeout=5)
+        lifecycle.mark_ready()
+        finished = []
+
+        async def chat():
+            with lifecycle.track():
+                await asyncio.sleep(0.05)
+                finished.append(True)
+
+        task = asyncio.create_task(chat())
+        await asyncio.sleep(0)
+        lifecycle.begin_drain()
+        with pytest.raises(Draining):
+            lifecycle.check_accepting()
+        await lifecycle.wait_drained()
+        await task
+        return finished, lifecycle.metrics()
+
+    finished, metrics = asyncio.run(run())
+    assert finished == [True]
+    assert (metrics["ready"], metrics["draining"], metrics["in_flight"]) == (False, True, 0)
+    assert (metrics["drained"], metrics["cancelled"], metrics["refused"]) == (1, 0, 1)
+
+
+def test_drain_timeout_cancels_what_is_left():
+    async def run():
+        lifecycle = Lifecycle(drain_timeout=0.05)
+
+        async def chat():
+            with lifecycle.track():
+                await asyncio.sleep(10)
+
+        task = asyncio.create_task(chat())
+        await asyncio.sleep(0)
+        lifecycle.begin_drain()
+        await lifecycle.wait_drained()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        return lifecycle.metrics()
+
+    metrics = asyncio.run(run())
+    assert (metrics["drained"], metrics["cancelled"]) == (0, 1)
+
+
+def _send_sigterm_under(register):
+    """Install the drain handler after `register(loop, callback)` set up the server's own; raise SIGTERM."""
+    async def run():
+        lifecycle, server_saw = Lifecycle(), []
+        register(asyncio.get_running_loop(), lambda *args: server_saw.append(True))
+        lifecycle.install_signal_handlers()
+        os.kill(os.getpid(), signal.SIGTERM)
+        for _ in range(100):
+            if server_saw and lifecycle.draining:
+                break
+            await asyncio.sleep(0.01)
+        return server_saw, lifecycle.draining
+
+    return asyncio.run(run())
+
+
+def test_signal_reaches_a_loop_handler_as_uvicorn_0_25_installs(restore_signal_handlers):
+    def register(loop, callback):
+        loop.add_signal_handler(signal.SIGTERM, callback)
+
+    assert _send_sigterm_under(register) == ([True], True)
+
+
+def test_signal_reaches_a_plain_handler_as_newer_servers_install(restore_signal_handlers):
+    def register(loop, callback):
+        signal.signal(signal.SIGTERM, callback)
+
+    assert _send_sigterm_under(register) == ([True], True)
+
+
+def test_readiness_flips_while_in_flight_chats_finish(api, server):
+    assert api.get("/api/health/ready").status_code == 200
+    api.fake.latency = 0.3
+
+    async def run():
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://testserver") as client:
+            chat = asyncio.create_task(client.post("/api/chat", json={"message": f"Payslip? {uuid.uuid4().hex}"}))
+            while not server.lifecycle.metrics()["in_flight"]:
+                await asyncio.sleep(0.01)
+            server.lifecycle.begin_drain()
+            ready = await client.get("/api/health/ready")
+            refused = await client.post("/api/chat", json={"message": "Payslip?"})
+            await server.lifecycle.wait_drained()
+            return await chat, ready, refused
+
+    chat, ready, refused = api.portal.call(run)
+    assert chat.status_code == 200
+    assert ready.status_code == 503
+    assert ready.json()["checks"]["draining"] is True
+    assert refused.status_code == 503
+    assert refused.headers["Retry-After"] == "1"
+    assert server.lifecycle.metrics()["drained"] == 1
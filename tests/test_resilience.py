@@ -0,0 +1,160 @@
+import asyncio
+
+import pytest
+
+import resilience
+from resilience import CircuitBreaker, CircuitOpen, RetryBudget, backoff_delay, first_completed
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(resilience.time, "monotonic", clock)
+    return clock
+
+
+def test_breaker_opens_after_consecutive_failures(clock):
+    breaker = CircuitBreaker(failure_threshold=3, cooldown=10)
+    for _ in range(2):
+        breaker.before_call()
+        breaker.record_failure()
+    assert breaker.state == "closed"
+
+    breaker.before_call()
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert breaker.times_opened == 1
+    with pytest.raises(CircuitOpen) as excinfo:
+        breaker.before_call()
+    assert excinfo.value.retry_after == pytest.approx(10)
+
+
+def test_breaker_success_resets_failure_count(clock):
+    breaker = CircuitBreaker(failure_threshold=2, cooldown=10)
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state == "closed"
+    assert breaker.failures == 1
+
+
+def test_breaker_half_open_lets_one_probe_through(clock):
+    breaker = CircuitBreaker(failure_threshold=1, cooldown=10)
+    breaker.record_failure()
+    clock.now += 10
+
+    breaker.before_call()
+    assert breaker.state == "half_open"
+    with pytest.raises(CircuitOpen):
+        breaker.before_call()
+
+    breaker.record_success()
+    assert breaker.state == "closed"
+    breaker.before_call()
+
+
+def test_breaker_failed_probe_reopens(clock):
+    breaker = CircuitBreaker(failure_threshold=5, cooldown=10)
+    for _ in range(5):
+        breaker.record_failure()
+    clock.now += 10
+    breaker.before_call()
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert breaker.times_opened == 2
+    with pytest.raises(CircuitOpen):
+        breaker.before_call()
+
+
+def test_breaker_release_frees_the_probe_without_a_verdict(clock):
+    breaker = CircuitBreaker(failure_threshold=1, cooldown=10)
+    breaker.record_failure()
+    clock.now += 10
+    breaker.before_call()
+    breaker.release()
+    assert breaker.state == "half_open"
+    breaker.before_call()
+
+
+def test_retry_budget_starts_with_min_tokens_and_refills_by_ratio():
+    budget = RetryBudget(ratio=0.5, min_tokens=1, max_tokens=2)
+    assert budget.try_withdraw()
+    assert not budget.try_withdraw()
+
+    budget.record_request()
+    assert not budget.try_withdraw()
+    budget.record_request()
+    assert budget.try_withdraw()
+
+
+def test_retry_budget_is_capped():
+    budget = RetryBudget(ratio=1, min_tokens=0, max_tokens=3)
+    for _ in range(10):
+        budget.record_request()
+    assert budget.tokens == 3
+
+
+def test_backoff_delay_stays_under_the_cap():
+    for attempt in range(10):
+        delay = backoff_delay(attempt, base=0.1, cap=1.0)
+        assert 0 <= delay <= min(1.0, 0.1 * 2 ** attempt)
+
+
+async def _reply(value, after: float):
+    await asyncio.sleep(after)
+    return value
+
+
+async def _fail(after: float):
+    await asyncio.sleep(after)
+    raise ValueError("failed")
+
+
+def test_first_completed_returns_a_fast_primary_without_hedging():
+    hedges = []
+
+    async def run():
+        return await first_completed(_reply("primary", 0), lambda: hedges.append(1) or _reply("hedge", 0), 0.5)
+
+    assert asyncio.run(run()) == ("primary", False, False)
+    assert hedges == []
+
+
+def test_first_completed_hedge_wins_over_a_slow_primary():
+    async def run():
+        return await first_completed(_reply("primary", 1), lambda: _reply("hedge", 0), 0.01)
+
+    assert asyncio.run(run()) == ("hedge", True, True)
+
+
+def test_first_completed_falls_back_to_primary_when_hedge_fails():
+    async def run():
+        return await first_completed(_reply("primary", 0.05), lambda: _fail(0), 0.01)
+
+    assert asyncio.run(run()) == ("primary", True, False)
+
+
+def test_first_completed_raises_when_both_attempts_fail():
+    async def run():
+        await first_completed(_fail(0.05), lambda: _fail(0), 0.01)
+
+    with pytest.raises(ValueError):
+        asyncio.run(run())
+
+
+def test_first_completed_cancels_the_losing_attempt():
+    async def run():
+        primary = asyncio.ensure_future(_reply("primary", 1))
+        result = await first_completed(primary, lambda: _reply("hedge", 0), 0.01)
+        await asyncio.sleep(0)
+        return result, primary.cancelled()
+
+    assert asyncio.run(run()) == (("hedge", True, True), True)
@@ -0,0 +1,91 @@
+import gzip
+
+import pytest
+from starlette.applications import Starlette
+from starlette.responses import PlainTextResponse, Response, StreamingResponse
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+import responses
+from responses import CompressionMiddleware, choose_encoding
+
+BIG = "Employees accrue 2.08 vacation days per month. " * 100
+
+
+@pytest.mark.parametrize("header, expected", [
+    ("gzip, deflate, br", "br"),
+    ("gzip", "gzip"),
+    ("br;q=0, gzip;q=0.5", "gzip"),
+    ("br; q=0.0, gzip; q=0", None),
+    ("*", "br"),
+    ("*;q=0", None),
+    ("GZIP;Q=1.0", "gzip"),
+    ("gzip;q=bogus", "gzip"),
+    ("deflate, identity", None),
+    ("", None),
+])
+def test_choose_encoding(header, expected):
+    assert choose_encoding(header) == expected
+
+
+def test_gzip_is_chosen_without_brotli(monkeypatch):
+    monkeypatch.setattr(responses, "brotli", None)
+    assert choose_encoding("br, gzip") == "gzip"
+    assert choose_encoding("br") is None
+
+
+async def stream():
+    for _ in range(3):
+        yield BIG
+
+
+@pytest.fixture
+def client():
+    app = Starlette(routes=[
+        Route("/big", lambda request: PlainTextResponse(BIG)),
+        Route("/small", lambda request: PlainTextResponse("ok")),
+        Route("/chunked", lambda request: StreamingResponse(stream(), media_type="text/plain")),
+        Route("/events", lambda request: PlainTextResponse(BIG, media_type="text/event-stream")),
+        Route("/encoded", lambda request: Response(gzip.compress(BIG.encode()), media_type="text/plain",
+                                                   headers={"Content-Encoding": "gzip"})),
+    ])
+    return TestClient(CompressionMiddleware(app, minimum_size=1024, enabled=True))
+
+
+@pytest.mark.parametrize("encoding", ["gzip", "br"])
+def test_large_body_is_compressed(client, encoding):
+    response = client.get("/big", headers={"Accept-Encoding": encoding})
+    assert response.headers["Content-Encoding"] == encoding
+    assert int(response.headers["Content-Length"]) < len(BIG)
+    assert response.headers["Vary"] == "Accept-Encoding"
+    assert response.text == BIG
+
+
+def test_large_body_is_sent_as_is_when_no_coding_is_acceptable(client):
+    response = client.get("/big", headers={"Accept-Encoding": "gzip;q=0"})
+    assert "Content-Encoding" not in response.headers
+    # The body could have been compressed for another client, so caches must still vary on it
+    assert response.headers["Vary"] == "Accept-Encoding"
+    assert response.text == BIG
+
+
+def test_body_under_the_minimum_size_is_not_compressed(client):
+    response = client.get("/small", headers={"Accept-Encoding": "gzip"})
+    assert "Content-Encoding" not in response.headers
+    assert "Vary" not in response.headers
+    assert response.text == "ok"
+
+
+@pytest.mark.parametrize("path, encoding", [("/chunked", None), ("/events", None), ("/encoded", "gzip")])
+def test_streamed_and_encoded_bodies_pass_through(client, path, encoding):
+    response = client.get(path, headers={"Accept-Encoding": "br"})
+    assert response.headers.get("Content-Encoding") == encoding
+    assert "Vary" not in response.headers
+    assert BIG in response.text
+
+
+def test_disabled_middleware_does_nothing():
+    app = Starlette(routes=[Route("/big", lambda request: PlainTextResponse(BIG))])
+    client = TestClient(CompressionMiddleware(app, enabled=False))
+    response = client.get("/big", headers={"Accept-Encoding": "gzip"})
+    assert "Content-Encoding" not in response.headers
@@ -0,0 +1,156 @@
+"""Status check rollups and the backfill migration against an in-memory MongoDB (mongomock-motor)."""
+
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+
+mongomock_motor = pytest.importorskip("mongomock_motor")
+
+import migrate_status_rollups  # noqa: E402
+from rollups import BACKFILL_MARKER, StatusRollups, bucket_start, rollup_id  # noqa: E402
+
+# Recent, so the TTL indexes on status_rollups leave the buckets alone
+HOUR = bucket_start(datetime.utcnow() - timedelta(days=1), "hour")
+
+
+def checks(*specs):
+    """Status check documents from (client_name, minutes after HOUR) pairs."""
+    return [
+        {"id": f"check-{n}", "client_name": client_name, "timestamp": HOUR + timedelta(minutes=minutes)}
+        for n, (client_name, minutes) in enumerate(specs)
+    ]
+
+
+def test_bucket_start_and_id():
+    timestamp = datetime(2025, 3, 1, 12, 34, 56, 789)
+    assert bucket_start(timestamp, "minute") == datetime(2025, 3, 1, 12, 34)
+    assert bucket_start(timestamp, "hour") == datetime(2025, 3, 1, 12, 0)
+    assert rollup_id("hour", "probe", datetime(2025, 3, 1, 12, 0)) == "hour:probe:202503011200"
+
+
+def test_recorded_checks_are_counted_per_client_and_bucket():
+    async def run():
+        db = mongomock_motor.AsyncMongoMockClient()["rollups"]
+        rollups = StatusRollups(db)
+        rollups.record(checks(("a", 0.1), ("a", 0.9), ("a", 1.5), ("b", 59.5)))
+        await rollups.flush()
+        # A second flush adds to the buckets written by the first
+        rollups.record(checks(("a", 0.5)))
+        await rollups.flush()
+        minutes = await rollups.buckets("minute", HOUR, HOUR + timedelta(hours=1), None, 100)
+        hours = await rollups.buckets("hour", HOUR, HOUR + timedelta(hours=1), "a", 100)
+        clients = await rollups.clients("minute", HOUR, HOUR + timedelta(hours=1))
+        return minutes, hours, clients, rollups.metrics()
+
+    minutes, hours, clients, metrics = asyncio.run(run())
+    assert [(row["clientName"], row["bucket"], row["count"]) for row in minutes] == [
+        ("a", HOUR, 3), ("a", HOUR + timedelta(minutes=1), 1), ("b", HOUR + timedelta(minutes=59), 1),
+    ]
+    assert minutes[0]["lastSeen"] == HOUR + timedelta(minutes=0.9)
+    assert [(row["clientName"], row["count"]) for row in hours] == [("a", 4)]
+    assert [(row["clientName"], row["count"]) for row in clients] == [("a", 4), ("b", 1)]
+    assert metrics["recorded"] == 5
+    assert metrics["pending_buckets"] == 0
+
+
+def test_failed_flush_keeps_the_counts_for_the_next_one():
+    async def run():
+        db = mongomock_motor.AsyncMongoMockClient()["rollups"]
+        rollups = StatusRollups(db)
+        rollups.record(checks(("a", 0), ("a", 1)))
+        write = rollups.collection.bulk_write
+
+        async def unavailable(*args, **kwargs):
+            raise ConnectionError("MongoDB unavailable")
+
+        rollups.collection.bulk_write = unavailable
+        await rollups.flush()
+        rollups.record(checks(("a", 2)))
+        rollups.collection.bulk_write = write
+        await rollups.flush()
+        return await rollups.clients("hour", HOUR, HOUR + timedelta(hours=1)), rollups.stats
+
+    clients, stats = asyncio.run(run())
+    assert [(row["clientName"], row["count"]) for row in clients] == [("a", 3)]
+    assert stats["flush_errors"] == 1
+
+
+def test_backfill_rebuilds_buckets_and_can_be_rerun():
+    async def run():
+        db = mongomock_motor.AsyncMongoMockClient()["rollups"]
+        await db.status_checks.insert_many(checks(("a", 5), ("a", 5.5), ("b", 70), ("a", 130)))
+        rollups = StatusRollups(db)
+        first = await rollups.backfill(HOUR, HOUR + timedelta(hours=3), step=timedelta(hours=1))
+        again = await rollups.backfill(HOUR, HOUR + timedelta(hours=3), step=timedelta(hours=1))
+        hours = await rollups.buckets("hour", HOUR, HOUR + timedelta(hours=3), None, 100)
+        minutes = await rollups.buckets("minute", HOUR, HOUR + timedelta(hours=3), "a", 100)
+        return first, again, hours, minutes
+
+    first, again, hours, minutes = asyncio.run(run())
+    assert first == again == 4
+    assert [(row["clientName"], row["bucket"], row["count"]) for row in hours] == [
+        ("a", HOUR, 2), ("b", HOUR + timedelta(hours=1), 1), ("a", HOUR + timedelta(hours=2), 1),
+    ]
+    assert [(row["bucket"], row["count"]) for row in minutes] == [
+        (HOUR + timedelta(minutes=5), 2), (HOUR + timedelta(minutes=130), 1),
+    ]
+
+
+def test_migration_backfills_history_and_marks_it_done(monkeypatch):
+    client = mongomock_motor.AsyncMongoMockClient()
+    monkeypatch.setenv("MONGO_URL", "mongodb://localhost:27017")
+    monkeypatch.setenv("DB_NAME", "migration")
+    monkeypatch.setattr(migrate_status_rollups, "AsyncIOMotorClient", lambda url: client)
+    monkeypatch.setattr(client, "close", lambda: None)
+    db = client["migration"]
+
+    async def run():
+        await db.status_checks.insert_many(checks(("a", 1), ("b", 2), ("a", 65), ("a", 200)))
+        # The hour the migration runs in is left to the server
+        await migrate_status_rollups.migrate(None, HOUR + timedelta(hours=3), step_hours=1, retention=False, dry_run=False)
+        rollups = StatusRollups(db)
+        clients = await rollups.clients("hour", HOUR, HOUR + timedelta(hours=4))
+        return clients, await rollups.backfilled(), await db.migrations.find_one({"_id": BACKFILL_MARKER})
+
+    clients, backfilled, marker = asyncio.run(run())
+    assert [(row["clientName"], row["count"]) for row in clients] == [("a", 2), ("b", 1)]
+    assert backfilled
+    assert marker["until"] == HOUR + timedelta(hours=3)
+
+
+def test_migration_dry_run_writes_nothing(monkeypatch):
+    client = mongomock_motor.AsyncMongoMockClient()
+    monkeypatch.setenv("MONGO_URL", "mongodb://localhost:27017")
+    monkeypatch.setenv("DB_NAME", "migration")
+    monkeypatch.setattr(migrate_status_rollups, "AsyncIOMotorClient", lambda url: client)
+    monkeypatch.setattr(client, "close", lambda: None)
+    db = client["migration"]
+
+    async def run():
+        await db.status_checks.insert_many(checks(("a", 1)))
+        await migrate_status_rollups.migrate(None, HOUR + timedelta(hours=1), step_hours=1, retention=False, dry_run=True)
+        return await db.status_rollups.count_documents({}), await StatusRollups(db).backfilled()
+
+    assert asyncio.run(run()) == (0, False)
+
+
+def test_backfill_flushes_pending_counts_before_replacing():
+    async def run():
+        db = mongomock_motor.AsyncMongoMockClient()["rollups"]
+        documents = checks(("a", 1), ("a", 2))
+        await db.status_checks.insert_many([dict(doc) for doc in documents])
+        rollups = StatusRollups(db)
+        # Stored and counted, but not flushed yet
+        rollups.record(documents)
+        await rollups.backfill(HOUR, HOUR + timedelta(hours=1), step=timedelta(hours=1))
+        await rollups.flush()
+        return await rollups.clients("hour", HOUR, HOUR + timedelta(hours=1))
+
+    assert [(row["clientName"], row["count"]) for row in asyncio.run(run())] == [("a", 2)]
+
+
+def test_backfill_stops_short_of_buckets_servers_still_write():
+    now = datetime(2025, 3, 1, 12, 3)
+    assert migrate_status_rollups.latest_until(now) == datetime(2025, 3, 1, 11, 0)
+    assert migrate_status_rollups.latest_until(now + timedelta(minutes=10)) == datetime(2025, 3, 1, 12, 0)
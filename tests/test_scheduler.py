@@ -0,0 +1,122 @@
+import asyncio
+
+from scheduler import PRIORITY_BATCH, PRIORITY_INTERACTIVE, FairScheduler, parse_client_weights, set_request_class
+
+
+async def _job(scheduler, priority, client, grants, hold=0.01):
+    set_request_class(priority, client)
+    granted = await scheduler.acquire()
+    grants.append((priority, client))
+    await asyncio.sleep(hold)
+    scheduler.release(granted)
+
+
+def test_parse_client_weights():
+    assert parse_client_weights("10.0.0.7=4, 10.0.0.9=0.5,") == {"10.0.0.7": 4.0, "10.0.0.9": 0.5}
+    assert parse_client_weights("") == {}
+
+
+def test_grants_at_once_while_there_is_room():
+    async def run():
+        scheduler = FairScheduler(2, "test")
+        set_request_class(PRIORITY_INTERACTIVE, "a")
+        assert scheduler.has_room()
+        first = await scheduler.acquire()
+        second = await scheduler.acquire()
+        assert not scheduler.has_room()
+        scheduler.release(first)
+        scheduler.release(second)
+        return scheduler.metrics()
+
+    metrics = asyncio.run(run())
+    assert metrics["granted_interactive"] == 2
+    assert metrics["queued_interactive"] == 0
+    assert metrics["active_interactive"] == 0
+
+
+def test_batch_never_takes_the_interactive_reserve():
+    async def run():
+        scheduler = FairScheduler(4, "test", interactive_reserve=0.5)
+        grants = []
+        tasks = [asyncio.create_task(_job(scheduler, PRIORITY_BATCH, "bulk", grants, hold=0.05)) for _ in range(6)]
+        await asyncio.sleep(0.01)
+        active_batch = scheduler.active[PRIORITY_BATCH]
+        set_request_class(PRIORITY_INTERACTIVE, "user")
+        room_for_interactive = scheduler.has_room()
+        await asyncio.gather(*tasks)
+        return scheduler.batch_limit, active_batch, room_for_interactive
+
+    assert asyncio.run(run()) == (2, 2, True)
+
+
+def test_waiting_classes_share_slots_by_weight():
+    async def run():
+        scheduler = FairScheduler(1, "test", interactive_weight=3, batch_weight=1, interactive_reserve=0)
+        grants = []
+        set_request_class(PRIORITY_BATCH, "holder")
+        held = await scheduler.acquire()
+        tasks = [asyncio.create_task(_job(scheduler, PRIORITY_BATCH, "bulk", grants, hold=0)) for _ in range(20)]
+        tasks += [asyncio.create_task(_job(scheduler, PRIORITY_INTERACTIVE, "user", grants, hold=0)) for _ in range(20)]
+        await asyncio.sleep(0)
+        scheduler.release(held)
+        await asyncio.gather(*tasks)
+        return grants
+
+    # 3:1 while both classes wait, give or take the phase the holder's grant left behind
+    first = [priority for priority, _ in asyncio.run(run())[:16]]
+    assert 11 <= first.count(PRIORITY_INTERACTIVE) <= 13
+
+
+def test_clients_within_a_class_are_served_fairly():
+    async def run():
+        scheduler = FairScheduler(1, "test")
+        grants = []
+        set_request_class(PRIORITY_INTERACTIVE, "holder")
+        held = await scheduler.acquire()
+        tasks = [asyncio.create_task(_job(scheduler, PRIORITY_INTERACTIVE, "busy", grants, hold=0)) for _ in range(30)]
+        await asyncio.sleep(0)
+        tasks += [asyncio.create_task(_job(scheduler, PRIORITY_INTERACTIVE, "quiet", grants, hold=0)) for _ in range(3)]
+        await asyncio.sleep(0)
+        scheduler.release(held)
+        await asyncio.gather(*tasks)
+        return [client for _, client in grants]
+
+    order = asyncio.run(run())
+    # The quiet client alternates with the busy one instead of waiting for its whole backlog
+    assert order[:6].count("quiet") == 3
+
+
+def test_client_weights_scale_the_share():
+    async def run():
+        scheduler = FairScheduler(1, "test", client_weights={"heavy": 3})
+        grants = []
+        set_request_class(PRIORITY_INTERACTIVE, "holder")
+        held = await scheduler.acquire()
+        tasks = [asyncio.create_task(_job(scheduler, PRIORITY_INTERACTIVE, client, grants, hold=0))
+                 for client in ("heavy", "light") for _ in range(20)]
+        await asyncio.sleep(0)
+        scheduler.release(held)
+        await asyncio.gather(*tasks)
+        return [client for _, client in grants[:16]]
+
+    first = asyncio.run(run())
+    assert first.count("heavy") == 12
+
+
+def test_cancelled_waiter_leaves_the_queue():
+    async def run():
+        scheduler = FairScheduler(1, "test")
+        set_request_class(PRIORITY_INTERACTIVE, "a")
+        held = await scheduler.acquire()
+        try:
+            await asyncio.wait_for(scheduler.acquire(), 0.01)
+        except asyncio.TimeoutError:
+            pass
+        queued = scheduler.queued
+        scheduler.release(held)
+        return queued, scheduler.metrics()
+
+    queued, metrics = asyncio.run(run())
+    assert queued == 0
+    assert metrics["abandoned"] == 1
+    assert metrics["active_interactive"] == 0
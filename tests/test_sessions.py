@@ -0,0 +1,95 @@
+import asyncio
+import uuid
+from datetime import datetime
+
+import pytest
+
+import sessions
+from sessions import SessionNotFound, SessionRegistry
+
+mongomock_motor = pytest.importorskip("mongomock_motor")
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(sessions.time, "monotonic", lambda: now[0])
+    return now
+
+
+def registry(**options):
+    return SessionRegistry(mongomock_motor.AsyncMongoMockClient()["sessions"]["chat_sessions"], **options)
+
+
+def test_issued_token_resolves_to_its_conversation_on_any_worker():
+    async def run():
+        first = registry()
+        token = await first.create("projects/1/conversations/abc", title="How many vacation days?")
+        second = SessionRegistry(first.collection)
+        return token, await first.conversation_for(token), await second.conversation_for(token), first.stats, second.stats
+
+    token, here, elsewhere, first_stats, second_stats = asyncio.run(run())
+    assert here == elsewhere == "projects/1/conversations/abc"
+    assert not sessions.is_legacy_session(token) and len(token) == 16
+    assert (first_stats["hits"], second_stats["loads"]) == (1, 1)
+
+
+def test_unknown_token_is_not_found():
+    with pytest.raises(SessionNotFound):
+        asyncio.run(registry().get("no-such-token"))
+
+
+def test_idle_entries_are_reloaded_and_expired_sessions_are_gone(clock):
+    async def run():
+        store = registry(idle_seconds=60)
+        token = await store.create("projects/1/conversations/abc", title="q")
+        # Dropped from MongoDB (its retention TTL), but still fresh in memory
+        await store.collection.delete_one({"_id": token})
+        cached = await store.conversation_for(token)
+        clock[0] += 61
+        with pytest.raises(SessionNotFound):
+            await store.get(token)
+        return cached, store.metrics()
+
+    cached, metrics = asyncio.run(run())
+    assert cached == "projects/1/conversations/abc"
+    assert (metrics["not_found"], metrics["cached"]) == (1, 0)
+
+
+def test_recent_turns_keep_the_newest_ones(clock):
+    async def run():
+        store = registry(recent_turns=4)
+        token = await store.create("projects/1/conversations/abc", title="q")
+        for n in range(3):
+            await store.record_turn(token, f"question {n}", f"answer {n}", datetime.utcnow())
+        return await store.get(token)
+
+    session = asyncio.run(run())
+    assert session["turn_count"] == 3
+    assert [turn["content"] for turn in session["turns"]] == ["question 1", "answer 1", "question 2", "answer 2"]
+
+
+def test_follow_up_continues_the_conversation_behind_the_token(api):
+    first = api.post("/api/chat", json={"message": f"How many vacation days? {uuid.uuid4().hex}"}).json()
+    follow_up = api.post("/api/chat", json={"message": "And sick days?", "sessionId": first["sessionId"]})
+    assert follow_up.status_code == 200
+    assert follow_up.json()["sessionId"] == first["sessionId"]
+
+    session = api.get(f"/api/sessions/{first['sessionId']}").json()
+    assert session["turnCount"] == 2
+    assert [turn["role"] for turn in session["recentTurns"]] == ["user", "bot", "user", "bot"]
+
+
+def test_unknown_session_is_a_404_without_calling_upstream(api):
+    response = api.post("/api/chat", json={"message": "And sick days?", "sessionId": "unknown-token"})
+    assert response.status_code == 404
+    assert response.json()["detail"] == "Unknown or expired session"
+    assert api.get("/api/sessions/unknown-token").status_code == 404
+    assert api.fake.calls == 0
+
+
+def test_legacy_conversation_names_are_still_accepted(api):
+    name = "projects/1/locations/global/collections/default_collection/dataStores/hr/conversations/legacy"
+    response = api.post("/api/chat", json={"message": "And sick days?", "sessionId": name})
+    assert response.status_code == 200
+    assert response.json()["sessionId"] == name
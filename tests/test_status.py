@@ -0,0 +1,91 @@
+"""GET /api/status paging against an in-memory MongoDB (mongomock-motor)."""
+
+from datetime import datetime, timedelta
+
+import pytest
+
+mongomock_motor = pytest.importorskip("mongomock_motor")
+
+from fastapi import HTTPException  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+
+
+@pytest.fixture(scope="module")
+def client(server):
+    # GridFS (attachments) only accepts real databases unless patched
+    with mongomock_motor.enabled_gridfs_integration(), TestClient(server.app) as client:
+        # Recent enough not to fall under the status_checks TTL index
+        started = datetime.utcnow().replace(microsecond=0) - timedelta(hours=1)
+        client.post("/api/status/bulk", json=[
+            {"client_name": f"probe-{n % 3}"} for n in range(25)
+        ])
+        # Give the checks distinct, known timestamps; two share one to exercise the id tie-break
+        docs = server.db.status_checks
+        ids = [doc["id"] for doc in client.get("/api/status", params={"limit": 25}).json()]
+        for n, doc_id in enumerate(sorted(ids)):
+            timestamp = started + timedelta(seconds=min(n, 23))
+            client.portal.call(docs.update_one, {"id": doc_id}, {"$set": {"timestamp": timestamp}})
+        yield client
+
+
+def test_cursor_round_trips(server):
+    timestamp = datetime(2025, 3, 1, 12, 30, 15, 123000)
+    cursor = server.encode_cursor(timestamp, "d1b2-id|with-pipe")
+    assert server.decode_cursor(cursor) == (timestamp, "d1b2-id|with-pipe")
+
+
+@pytest.mark.parametrize("cursor", ["not base64!", "bm8tc2VwYXJhdG9y", "bm90LWEtZGF0ZXxpZA==", "/w=="])
+def test_malformed_cursor_is_a_client_error(server, cursor):
+    with pytest.raises(HTTPException) as excinfo:
+        server.decode_cursor(cursor)
+    assert excinfo.value.status_code == 400
+
+
+def test_invalid_cursor_returns_400(client):
+    response = client.get("/api/status", params={"cursor": "bm90LWEtZGF0ZXxpZA=="})
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Invalid cursor"
+
+
+@pytest.mark.parametrize("limit", [0, -1, 1001])
+def test_limit_out_of_bounds_is_rejected(client, limit):
+    assert client.get("/api/status", params={"limit": limit}).status_code == 422
+
+
+def test_limit_bounds_are_accepted(client):
+    assert len(client.get("/api/status", params={"limit": 1}).json()) == 1
+    assert len(client.get("/api/status", params={"limit": 1000}).json()) == 25
+
+
+def test_pages_cover_every_check_once_newest_first(client):
+    seen, cursor = [], None
+    while True:
+        params = {"limit": 7, **({"cursor": cursor} if cursor else {})}
+        response = client.get("/api/status", params=params)
+        assert response.status_code == 200
+        page = response.json()
+        assert len(page) <= 7
+        seen += page
+        cursor = response.headers.get("X-Next-Cursor")
+        if cursor is None:
+            break
+
+    assert len(seen) == len({check["id"] for check in seen}) == 25
+    keys = [(check["timestamp"], check["id"]) for check in seen]
+    assert keys == sorted(keys, reverse=True)
+
+
+def test_last_full_page_has_no_next_cursor(client):
+    response = client.get("/api/status", params={"limit": 25})
+    assert len(response.json()) == 25
+    assert "X-Next-Cursor" not in response.headers
+
+
+def test_filters_combine_with_the_cursor(client):
+    first = client.get("/api/status", params={"client_name": "probe-0", "limit": 3})
+    rest = client.get("/api/status", params={
+        "client_name": "probe-0", "limit": 100, "cursor": first.headers["X-Next-Cursor"],
+    })
+    names = {check["client_name"] for check in first.json() + rest.json()}
+    assert names == {"probe-0"}
+    assert len(first.json()) + len(rest.json()) == 9
@@ -0,0 +1,99 @@
+import os
+import subprocess
+import sys
+import uuid
+from pathlib import Path
+
+import pytest
+
+from tracing import MemoryExporter, Tracer, make_exporter
+
+TRACE_ID = "4bf92f3577b34da6a3ce929d0e0e4736"
+PARENT_ID = "00f067aa0ba902b7"
+
+
+@pytest.fixture
+def traces(server, monkeypatch):
+    """In-memory traces readable through /api/traces with the admin token "secret"."""
+    exporter = MemoryExporter()
+    monkeypatch.setattr(server.tracer, "exporter", exporter)
+    monkeypatch.setattr(server.tracer, "sample_rate", 0.0)
+    monkeypatch.setattr(server, "ADMIN_TOKEN", "secret")
+    return exporter
+
+
+ADMIN = {"Authorization": "Bearer secret"}
+
+
+def test_exporter_defaults_to_none_so_nothing_is_kept():
+    env = {key: value for key, value in os.environ.items() if key != "TRACE_EXPORTER"}
+    backend = Path(__file__).parent.parent / "backend"
+    result = subprocess.run([sys.executable, "-c", "import tracing; print(tracing.tracer.exporter)"],
+                            cwd=backend, env=env, capture_output=True, text=True, check=True)
+    assert result.stdout.strip() == "None"
+    assert make_exporter("none") is None
+
+
+def test_nothing_is_sampled_without_an_exporter():
+    tracer = Tracer(sample_rate=1.0, exporter=None)
+    span = tracer.start_trace("GET /", f"00-{TRACE_ID}-{PARENT_ID}-01")
+    assert (span.trace_id, span.sampled) == (TRACE_ID, False)
+    assert span.traceparent.endswith("-00")
+
+
+def test_incoming_traceparent_is_continued_down_to_the_upstream_call(api, traces):
+    response = api.post("/api/chat", json={"message": f"Payslip? {uuid.uuid4().hex}"},
+                        headers={"traceparent": f"00-{TRACE_ID}-{PARENT_ID}-01"})
+    version, trace_id, span_id, flags = response.headers["traceparent"].split("-")
+    assert (version, trace_id, flags) == ("00", TRACE_ID, "01")
+    assert span_id != PARENT_ID
+
+    spans = api.get(f"/api/traces/{TRACE_ID}", headers=ADMIN).json()["spans"]
+    by_name = {span["name"]: span for span in spans}
+    assert by_name["POST /api/chat"]["parentSpanId"] == PARENT_ID
+    assert by_name["POST /api/chat"]["spanId"] == span_id
+    assert {"chat_with_agentspace", "agentspace.rpc"} <= set(by_name)
+    assert {span["traceId"] for span in spans} == {TRACE_ID}
+
+    otlp = api.get(f"/api/traces/{TRACE_ID}", params={"format": "otlp"}, headers=ADMIN).json()
+    assert len(otlp["resourceSpans"][0]["scopeSpans"][0]["spans"]) == len(spans)
+
+
+def test_unsampled_request_still_gets_correlation_headers(api, traces):
+    response = api.get("/api/health", headers={"traceparent": f"00-{TRACE_ID}-{PARENT_ID}-00"})
+    assert response.headers["traceparent"].startswith(f"00-{TRACE_ID}-")
+    assert response.headers["traceparent"].endswith("-00")
+    assert response.headers["X-Request-ID"] == TRACE_ID
+    assert api.get(f"/api/traces/{TRACE_ID}", headers=ADMIN).status_code == 404
+
+
+@pytest.mark.parametrize("sent, echoed", [("req-42", True), ("has spaces", False), ("x" * 129, False)])
+def test_request_id_is_echoed_when_valid_and_the_trace_id_otherwise(api, traces, sent, echoed):
+    response = api.get("/api/health", headers={"X-Request-ID": sent})
+    trace_id = response.headers["traceparent"].split("-")[1]
+    assert response.headers["X-Request-ID"] == (sent if echoed else trace_id)
+
+
+def test_malformed_traceparent_starts_a_new_trace(api, traces):
+    response = api.get("/api/health", headers={"traceparent": f"00-{'0' * 32}-{PARENT_ID}-01"})
+    trace_id = response.headers["traceparent"].split("-")[1]
+    assert trace_id not in ("0" * 32, TRACE_ID) and len(trace_id) == 32
+
+
+def test_traces_need_the_admin_token(api, server, traces, monkeypatch):
+    api.get("/api/health", headers={"traceparent": f"00-{TRACE_ID}-{PARENT_ID}-01", "X-Request-ID": "req-7"})
+    assert api.get("/api/traces").status_code == 401
+    assert api.get("/api/traces", headers={"Authorization": "Bearer wrong"}).status_code == 401
+    listing = api.get("/api/traces", headers=ADMIN)
+    assert listing.status_code == 200
+    assert (listing.json()[0]["traceId"], listing.json()[0]["requestId"]) == (TRACE_ID, "req-7")
+
+    monkeypatch.setattr(server, "ADMIN_TOKEN", "")
+    assert api.get("/api/traces", headers=ADMIN).status_code == 404
+
+
+def test_traces_are_404_unless_kept_in_memory(api, server, traces, monkeypatch):
+    monkeypatch.setattr(server.tracer, "exporter", None)
+    response = api.get("/api/traces", headers=ADMIN)
+    assert response.status_code == 404
+    assert "TRACE_EXPORTER=memory" in response.json()["detail"]